@@ -0,0 +1,213 @@
+"""
+Admission control for /api/call/incoming.
+
+A misbehaving dialer or a caller stuck in a loop should not be able to create
+unbounded help requests and supervisor pings, and an overloaded process
+should refuse work quickly rather than back up every request thread.
+
+- `TokenBucketLimiter`: token buckets keyed by caller phone (and one global
+  key). Each key costs one (tokens, last refill) pair. A bucket idle long
+  enough to refill completely behaves exactly like a new one, so such keys
+  are dropped, oldest first, on every call.
+- `AdmissionController`: combines the per-caller and global limiters with
+  load shedding on in-flight requests and database latency (an EWMA fed by
+  engine execute events on the request path, decaying with wall-clock time).
+
+Every rejection carries a Retry-After in seconds.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Hashable, Iterator, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import Config
+
+
+class TokenBucketLimiter:
+    """
+    `rate` tokens per second refill up to `burst`; each admitted request takes one.
+    Keys are kept least-recently-used first so full (idle) buckets can be evicted in O(1).
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = Config.RATE_LIMIT_MAX_KEYS):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        # Seconds after which an untouched bucket is full again
+        self.idle_seconds = burst / rate if rate > 0 else math.inf
+        self._buckets: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def acquire(self, key: Hashable, now: Optional[float] = None) -> float:
+        """Take a token for `key`. Returns 0.0 if admitted, else seconds until a token is available."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._evict_idle(now)
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1.0:
+                self._buckets[key] = (tokens - 1.0, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1.0 - tokens) / self.rate if self.rate > 0 else math.inf
+
+    def refund(self, key: Hashable):
+        """Give back the token an admitted `acquire` took (the request was rejected further on)."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                self._buckets[key] = (min(self.burst, bucket[0] + 1.0), bucket[1])
+
+    def _evict_idle(self, now: float):
+        while self._buckets:
+            _, (_, updated) = next(iter(self._buckets.items()))
+            if now - updated < self.idle_seconds and len(self._buckets) < self.max_keys:
+                break
+            # Full again (or over the key cap): forgetting it only ever makes the limiter more lenient
+            self._buckets.popitem(last=False)
+
+
+class LatencyTracker:
+    """
+    Exponentially weighted moving average of database statement latency.
+
+    Only statements run inside `measure()` (by admitted requests) count, so
+    background work (retention batches, hit and stats flushes) cannot trigger
+    load shedding. The average also decays toward zero with wall-clock time,
+    halving every `half_life_seconds` without new statements: once shedding
+    stops all request traffic it still recovers and lets requests through.
+    """
+
+    def __init__(self, alpha: float = 0.2, half_life_seconds: float = Config.CALL_SHED_LATENCY_HALF_LIFE_SECONDS):
+        self.alpha = alpha
+        self.half_life_seconds = half_life_seconds
+        # (average, monotonic time it was last updated), replaced as a whole
+        self._state: Tuple[float, float] = (0.0, time.monotonic())
+        self._scope = threading.local()
+
+    def value_at(self, now: Optional[float] = None) -> float:
+        value, updated = self._state
+        now = time.monotonic() if now is None else now
+        if self.half_life_seconds <= 0 or now <= updated:
+            return value
+        return value * 0.5 ** ((now - updated) / self.half_life_seconds)
+
+    @property
+    def ewma_ms(self) -> float:
+        return self.value_at()
+
+    def observe(self, elapsed_ms: float, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        value = self.value_at(now)
+        self._state = (value + self.alpha * (elapsed_ms - value), now)
+
+    @contextmanager
+    def measure(self) -> Iterator[None]:
+        """Count statements run by this thread while inside the block."""
+        previous = getattr(self._scope, "active", False)
+        self._scope.active = True
+        try:
+            yield
+        finally:
+            self._scope.active = previous
+
+    def attach(self, engine: Engine):
+        """Time statements executed on `engine` inside `measure()`."""
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _start(conn, cursor, statement, parameters, context, executemany):
+            if getattr(self._scope, "active", False):
+                conn.info.setdefault("admission_started", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _stop(conn, cursor, statement, parameters, context, executemany):
+            started = conn.info.get("admission_started")
+            if started:
+                self.observe((time.perf_counter() - started.pop()) * 1000.0)
+
+        @event.listens_for(engine, "handle_error")
+        def _failed(context):
+            started = context.connection.info.get("admission_started") if context.connection else None
+            if started:
+                started.pop()
+
+
+@dataclass
+class Decision:
+    admitted: bool
+    reason: Optional[str] = None
+    retry_after: int = 0
+
+
+class AdmissionController:
+    """Rate limits per caller and globally, and sheds load when the process is saturated."""
+
+    def __init__(
+        self,
+        per_caller: Optional[TokenBucketLimiter] = None,
+        global_limit: Optional[TokenBucketLimiter] = None,
+        latency: Optional[LatencyTracker] = None,
+        max_inflight: int = Config.CALL_MAX_INFLIGHT,
+        shed_latency_ms: float = Config.CALL_SHED_DB_LATENCY_MS,
+        shed_retry_after: int = Config.CALL_SHED_RETRY_AFTER_SECONDS,
+    ):
+        if per_caller is None:
+            per_caller = TokenBucketLimiter(Config.CALL_RATE_PER_CALLER_PER_MINUTE / 60.0, Config.CALL_BURST_PER_CALLER)
+        if global_limit is None:
+            global_limit = TokenBucketLimiter(Config.CALL_RATE_GLOBAL_PER_SECOND, Config.CALL_BURST_GLOBAL)
+        self.per_caller = per_caller
+        self.global_limit = global_limit
+        self.latency = latency or LatencyTracker()
+        self.max_inflight = max_inflight
+        self.shed_latency_ms = shed_latency_ms
+        self.shed_retry_after = shed_retry_after
+        self.inflight = 0
+        self._lock = threading.Lock()
+
+    def check(self, caller_key: Hashable, now: Optional[float] = None) -> Decision:
+        """
+        Decide whether to serve one request from `caller_key`. Cheapest checks first.
+        A request the global limit rejects gets its caller token back, so callers
+        aren't charged for load they didn't cause.
+        """
+        if self.inflight >= self.max_inflight:
+            return Decision(False, "overloaded", self.shed_retry_after)
+        if self.latency.value_at(now) >= self.shed_latency_ms:
+            return Decision(False, "db_slow", self.shed_retry_after)
+        wait = self.per_caller.acquire(caller_key, now)
+        if wait:
+            return Decision(False, "caller_rate_limited", math.ceil(wait))
+        wait = self.global_limit.acquire("*", now)
+        if wait:
+            self.per_caller.refund(caller_key)
+            return Decision(False, "rate_limited", math.ceil(wait))
+        return Decision(True)
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        """Count a request as in flight, and time its statements, while it is being served."""
+        with self._lock:
+            self.inflight += 1
+        try:
+            with self.latency.measure():
+                yield
+        finally:
+            with self._lock:
+                self.inflight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "inflight": self.inflight,
+            "db_latency_ms": round(self.latency.ewma_ms, 2),
+            "tracked_callers": len(self.per_caller),
+        }
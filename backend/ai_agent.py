@@ -3,68 +3,207 @@ AI Agent logic: prompt composition, KB consultation, and decision to respond or
 This module is intentionally simple and deterministic for the coding assignment.
 """
 
-import json
+import asyncio
 import os
-from typing import Dict, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Any, Optional
+from .business_info import BusinessIntents, tenant_info_path
 from .config import Config
 from .services.kb_services import KBService
 from .services.help_request_service import HelpRequestService
 from .services.notification_service import NotificationService
+from .services.stats_service import get_stats_recorder
 from .db import SessionLocal
-from .models import Customer
+from .models import DEFAULT_TENANT, Customer
+from .records import CustomerRecord
 
 # Correct file path handling
 PROMPTS_PATH = os.path.join(os.path.dirname(__file__), "..", "prompts", "salon_business_info.json")
-RESPONSE_TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), "..", "prompts", "response_template.txt")
 
 
 class AIAgent:
-    """Simple deterministic AI Agent for handling customer interactions."""
+    """
+    Simple deterministic AI Agent for handling customer interactions.
+    Serves every tenant (business location): KB and business info are looked
+    up per tenant, the default tenant using `business_info_path`.
+    """
 
-    def __init__(self, db_session_factory=SessionLocal):
-        self.kb = KBService(db_session_factory)
+    def __init__(
+        self,
+        db_session_factory=SessionLocal,
+        business_info_path: str = PROMPTS_PATH,
+        tenants_dir: str = Config.TENANTS_DIR,
+    ):
+        self.db_session_factory = db_session_factory
+        self.tenants_dir = tenants_dir
         self.help_svc = HelpRequestService(db_session_factory)
         self.notifier = NotificationService()
+        self.stats = get_stats_recorder(db_session_factory)
 
-        # Load static business info and response template
-        with open(PROMPTS_PATH, "r") as f:
-            self.business_info = json.load(f)
+        # Per-tenant KB services (cheap; their indexes live in the shared LRU registry)
+        # and business info compiled into intent tables (hot-reloaded on change)
+        self._tenant_lock = threading.Lock()
+        self._kbs: Dict[str, KBService] = {}
+        self._business: Dict[str, BusinessIntents] = {DEFAULT_TENANT: BusinessIntents(business_info_path)}
+        self.kb = self.kb_for(DEFAULT_TENANT)
+        self.business = self._business[DEFAULT_TENANT]
 
-        with open(RESPONSE_TEMPLATE_PATH, "r") as f:
-            self.response_template = f.read()
+    @property
+    def business_info(self) -> Dict[str, Any]:
+        return self.business.data
 
-    def handle_incoming(self, caller: Dict[str, str], question: str) -> Dict[str, Any]:
+    def kb_for(self, tenant_id: str) -> KBService:
+        kb = self._kbs.get(tenant_id)
+        if kb is None:
+            with self._tenant_lock:
+                kb = self._kbs.setdefault(tenant_id, KBService(self.db_session_factory, tenant_id=tenant_id))
+        return kb
+
+    def business_for(self, tenant_id: str) -> BusinessIntents:
+        """Tenant's business info; raises ValueError for a malformed tenant id."""
+        business = self._business.get(tenant_id)
+        if business is None:
+            path = tenant_info_path(tenant_id, self.tenants_dir)
+            with self._tenant_lock:
+                business = self._business.get(tenant_id)
+                if business is None:
+                    business = self._business[tenant_id] = BusinessIntents(path, required=False)
+        return business
+
+    def _business_answer(self, question: str, tenant_id: str = DEFAULT_TENANT) -> Optional[Dict[str, Any]]:
+        intent = self.business_for(tenant_id).lookup(question)
+        if intent is None:
+            return None
+        return {"answer_text": intent.answer, "source": "business_info", "intent": intent.name}
+
+    def find_answer(
+        self, question: str, tenant_id: str = DEFAULT_TENANT, record_hit: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        """
+        KB exact and fuzzy matching first, then the business-info intent table
+        (hours, prices, policies) when the KB has no answer; all within the tenant.
+        Speculative lookups pass record_hit=False and call `record_kb_hit` if the answer is used.
+        """
+        return self.kb_for(tenant_id).find_answer(
+            question, fallback=partial(self._business_answer, tenant_id=tenant_id), record_hit=record_hit
+        )
+
+    def record_kb_hit(self, match: Optional[Dict[str, Any]], tenant_id: str = DEFAULT_TENANT):
+        self.kb_for(tenant_id).count_hit(match)
+
+    def handle_incoming(
+        self, caller: Dict[str, str], question: str, tenant_id: str = DEFAULT_TENANT
+    ) -> Dict[str, Any]:
         """
         Main entry point:
-        - Consult the Knowledge Base (KB)
+        - Consult the Knowledge Base (KB) and the static business info
         - Respond if a match is found
-        - Otherwise, create a help request and notify a supervisor
+        - Otherwise, create a help request and notify a supervisor, or join an
+          identical pending request without pinging the supervisor again
         Returns a dictionary with the action taken.
         """
 
-        # 1️⃣ Consult KB
-        match = self.kb.find_answer(question)
+        # 1️⃣ Consult KB / business info
+        match = self.find_answer(question, tenant_id)
+        self.record_call(tenant_id, answered=bool(match))
         if match:
             answer = match["answer_text"]
             self.notifier.notify_customer(caller, answer)
             return {"action": "responded", "answer": answer}
 
-        # 2️⃣ Create or get customer
-        db = SessionLocal()
+        return self.escalate(caller, question, tenant_id)
+
+    def record_call(self, tenant_id: str, answered: bool):
+        """Count an incoming question for the analytics rollups."""
+        self.stats.add(tenant_id, calls=1, kb_answered=1 if answered else 0)
+
+    def get_or_create_customer(self, caller: Dict[str, str], tenant_id: str = DEFAULT_TENANT) -> CustomerRecord:
+        """The tenant's customer with the caller's phone number, created on first contact."""
+        db = self.db_session_factory()
         try:
-            customer = db.query(Customer).filter(Customer.phone == caller.get("phone")).first()
-            if not customer:
-                customer = Customer(name=caller.get("name"), phone=caller.get("phone"))
-                db.add(customer)
-                db.commit()
-                db.refresh(customer)
+            row = db.query(*CustomerRecord.columns()).filter(
+                Customer.phone == caller.get("phone"), Customer.tenant_id == tenant_id
+            ).first()
+            if row:
+                return CustomerRecord.from_row(row)
+            customer = Customer(tenant_id=tenant_id, name=caller.get("name"), phone=caller.get("phone"))
+            db.add(customer)
+            db.commit()
+            return CustomerRecord.from_orm(customer)
         finally:
             db.close()
 
-        # 3️⃣ Create help request
-        hr = self.help_svc.create_help_request(customer.id, question)
+    def escalate(self, caller: Dict[str, str], question: str, tenant_id: str = DEFAULT_TENANT) -> Dict[str, Any]:
+        """
+        Escalate a question to a supervisor without consulting the KB
+        (used directly by the voice agent's escalate tool).
+        """
+        # 2️⃣ Create or get customer
+        customer = self.get_or_create_customer(caller, tenant_id)
+
+        # 3️⃣ Create help request (or subscribe to a matching pending one)
+        hr, created = self.help_svc.create_or_join_help_request(customer.id, question, tenant_id)
+        if not created:
+            return {"action": "escalated", "request_id": hr.id, "coalesced": True}
 
         # 4️⃣ Notify supervisor
         self.notifier.notify_supervisor(hr)
 
         return {"action": "escalated", "request_id": hr.id}
+
+
+class AsyncAIAgent:
+    """
+    Event-loop-friendly facade over AIAgent for async callers (LiveKit voice sessions).
+    KB matching (CPU-bound) and escalation (blocking SQLAlchemy) run on separate
+    bounded thread pools, and webhooks are posted from a background thread,
+    so one slow lookup never stalls other sessions on the loop.
+    """
+
+    def __init__(
+        self,
+        agent: Optional[AIAgent] = None,
+        db_workers: int = Config.AGENT_DB_WORKERS,
+        match_workers: int = Config.AGENT_MATCH_WORKERS,
+    ):
+        self.agent = agent or AIAgent()
+        self.agent.notifier.enable_background_dispatch()
+        self._db_pool = ThreadPoolExecutor(max_workers=db_workers, thread_name_prefix="agent-db")
+        self._match_pool = ThreadPoolExecutor(max_workers=match_workers, thread_name_prefix="agent-match")
+
+    async def find_answer(
+        self, question: str, tenant_id: str = DEFAULT_TENANT, record_hit: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._match_pool, self.agent.find_answer, question, tenant_id, record_hit)
+
+    async def escalate(self, caller: Dict[str, str], question: str, tenant_id: str = DEFAULT_TENANT) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._db_pool, partial(self.agent.escalate, caller, question, tenant_id))
+
+    async def handle_incoming(
+        self, caller: Dict[str, str], question: str, tenant_id: str = DEFAULT_TENANT
+    ) -> Dict[str, Any]:
+        """Async equivalent of AIAgent.handle_incoming."""
+        return await self.complete(caller, question, await self.find_answer(question, tenant_id), tenant_id)
+
+    async def complete(
+        self,
+        caller: Dict[str, str],
+        question: str,
+        match: Optional[Dict[str, Any]],
+        tenant_id: str = DEFAULT_TENANT,
+    ) -> Dict[str, Any]:
+        """Respond with an already-computed KB match, or escalate if there was none."""
+        self.agent.record_call(tenant_id, answered=bool(match))
+        if match:
+            answer = match["answer_text"]
+            self.agent.notifier.notify_customer(caller, answer)
+            return {"action": "responded", "answer": answer}
+        return await self.escalate(caller, question, tenant_id)
+
+    def shutdown(self):
+        self._db_pool.shutdown(wait=False)
+        self._match_pool.shutdown(wait=False)
@@ -0,0 +1,58 @@
+"""
+Alembic environment.
+
+Uses the connection passed in by `backend.migrations.upgrade_database`
+(config.attributes["connection"]) or else connects to Config.DB_URL.
+Each revision runs in its own transaction so revisions can step outside it
+(`autocommit_block`) for online index builds and batched backfills.
+"""
+
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine
+
+from backend.config import Config
+from backend.models import Base
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+
+def _configure(**kwargs):
+    context.configure(target_metadata=target_metadata, transaction_per_migration=True, **kwargs)
+
+
+def run_migrations_offline():
+    _configure(url=Config.DB_URL, literal_binds=True, dialect_opts={"paramstyle": "named"})
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def _run(connection):
+    # SQLite can't ALTER most things in place; batch mode rebuilds the table when needed
+    _configure(connection=connection, render_as_batch=connection.dialect.name == "sqlite")
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _run(connection)
+        return
+    engine = create_engine(Config.DB_URL)
+    try:
+        with engine.connect() as connection:
+            _run(connection)
+    finally:
+        engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
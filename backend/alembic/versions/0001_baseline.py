@@ -0,0 +1,259 @@
+"""Baseline: the schema as of the move to Alembic
+
+Creates every table with explicit DDL frozen at this revision (it never reads
+the current models, so later model changes can't leak into it). A database
+created before Alembic is adopted in place: missing tables are created, and
+tables that exist only get the baseline columns and indexes they lack.
+Added tenant_id columns default old rows to "default", and pending requests
+get their priority backfilled.
+
+The hot-path indexes (help_requests (state, timeout_at) / (state, created_at),
+customers.phone, knowledge_base.question_hash) belong to 0002, which builds
+them online.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+from alembic import context, op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Priority formula and defaults as they were at this revision (frozen here so
+# later changes to the service or Config can't change what this revision does)
+REPEAT_CALLER_SECONDS = 300.0
+WAITING_CALLER_SECONDS = 600.0
+SUPERVISOR_TTL_SECONDS = 1800
+EPOCH = datetime(1970, 1, 1)
+BACKFILL_BATCH_SIZE = 500
+
+
+def _tables():
+    """Baseline schema: (table, columns and constraints, indexes, table options), in dependency order."""
+    return [
+        ("customers", [
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("tenant_id", sa.String(64), server_default="default"),
+            sa.Column("name", sa.String(128)),
+            sa.Column("phone", sa.String(64)),
+            sa.Column("created_at", sa.DateTime),
+        ], [
+            ("ix_customers_id", ["id"]),
+            ("ix_customers_tenant_id", ["tenant_id"]),
+        ], {}),
+        ("supervisors", [
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("name", sa.String(128)),
+            sa.Column("email", sa.String(128)),
+        ], [
+            ("ix_supervisors_id", ["id"]),
+        ], {}),
+        ("help_requests", [
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("tenant_id", sa.String(64), server_default="default"),
+            sa.Column("customer_id", sa.Integer, sa.ForeignKey("customers.id")),
+            sa.Column("question_text", sa.Text),
+            sa.Column("created_at", sa.DateTime),
+            sa.Column("state", sa.String(32)),
+            sa.Column("assigned_supervisor_id", sa.Integer, sa.ForeignKey("supervisors.id"), nullable=True),
+            sa.Column("response_text", sa.Text, nullable=True),
+            sa.Column("response_at", sa.DateTime, nullable=True),
+            sa.Column("timeout_at", sa.DateTime, nullable=True),
+            sa.Column("lease_expires_at", sa.DateTime, nullable=True),
+            sa.Column("priority", sa.Float, nullable=True),
+        ], [
+            ("ix_help_requests_id", ["id"]),
+            ("ix_help_requests_tenant_id", ["tenant_id"]),
+            ("ix_help_requests_lease_expires_at", ["lease_expires_at"]),
+            ("ix_help_requests_state_priority", ["state", "priority"]),
+        ], {}),
+        ("help_request_events", [
+            sa.Column("seq", sa.Integer, primary_key=True, autoincrement=True),
+            sa.Column("help_request_id", sa.Integer),
+            sa.Column("tenant_id", sa.String(64), server_default="default"),
+            sa.Column("event_type", sa.String(32)),
+            sa.Column("from_state", sa.String(32), nullable=True),
+            sa.Column("to_state", sa.String(32), nullable=True),
+            sa.Column("supervisor_id", sa.Integer, nullable=True),
+            sa.Column("data", sa.Text, nullable=True),
+            sa.Column("created_at", sa.DateTime),
+        ], [
+            ("ix_help_request_events_help_request_id", ["help_request_id"]),
+            ("ix_help_request_events_tenant_id", ["tenant_id"]),
+        ], {"sqlite_autoincrement": True}),
+        ("help_requests_archive", [
+            sa.Column("id", sa.Integer, primary_key=True, autoincrement=False),
+            sa.Column("tenant_id", sa.String(64), server_default="default"),
+            sa.Column("customer_id", sa.Integer),
+            sa.Column("question_text", sa.Text),
+            sa.Column("created_at", sa.DateTime),
+            sa.Column("state", sa.String(32)),
+            sa.Column("assigned_supervisor_id", sa.Integer, nullable=True),
+            sa.Column("response_text", sa.Text, nullable=True),
+            sa.Column("response_at", sa.DateTime, nullable=True),
+            sa.Column("timeout_at", sa.DateTime, nullable=True),
+            sa.Column("subscriber_customer_ids", sa.Text, nullable=True),
+            sa.Column("archived_at", sa.DateTime),
+        ], [
+            ("ix_help_requests_archive_tenant_id", ["tenant_id"]),
+        ], {}),
+        ("help_request_subscribers", [
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("help_request_id", sa.Integer, sa.ForeignKey("help_requests.id")),
+            sa.Column("customer_id", sa.Integer, sa.ForeignKey("customers.id")),
+            sa.Column("question_text", sa.Text),
+            sa.Column("created_at", sa.DateTime),
+        ], [
+            ("ix_help_request_subscribers_id", ["id"]),
+            ("ix_help_request_subscribers_help_request_id", ["help_request_id"]),
+        ], {}),
+        ("knowledge_base", [
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("tenant_id", sa.String(64), server_default="default"),
+            sa.Column("question_text", sa.Text),
+            sa.Column("question_hash", sa.String(40), nullable=True),
+            sa.Column("answer_text", sa.Text),
+            sa.Column("source_request_id", sa.Integer, nullable=True),
+            sa.Column("created_by", sa.String(128), nullable=True),
+            sa.Column("created_at", sa.DateTime),
+            sa.Column("version", sa.Integer),
+            sa.Column("tags", sa.String(256), nullable=True),
+            sa.Column("confidence", sa.String(16), nullable=True),
+            sa.Column("hit_count", sa.Integer, server_default="0"),
+            sa.Column("last_hit_at", sa.DateTime, nullable=True),
+        ], [
+            ("ix_knowledge_base_id", ["id"]),
+            ("ix_knowledge_base_tenant_id", ["tenant_id"]),
+            ("ix_knowledge_base_tenant_hits", ["tenant_id", "hit_count"]),
+        ], {}),
+        ("knowledge_base_aliases", [
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("entry_id", sa.Integer, sa.ForeignKey("knowledge_base.id")),
+            sa.Column("question_text", sa.Text),
+            sa.Column("question_hash", sa.String(40)),
+            sa.Column("created_at", sa.DateTime),
+        ], [
+            ("ix_knowledge_base_aliases_id", ["id"]),
+            ("ix_knowledge_base_aliases_entry_id", ["entry_id"]),
+            ("ix_knowledge_base_aliases_question_hash", ["question_hash"]),
+        ], {}),
+        ("stats_rollups", [
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("tenant_id", sa.String(64)),
+            sa.Column("granularity", sa.String(8)),
+            sa.Column("bucket_start", sa.DateTime),
+            sa.Column("calls", sa.Integer),
+            sa.Column("kb_answered", sa.Integer),
+            sa.Column("escalated", sa.Integer),
+            sa.Column("coalesced", sa.Integer),
+            sa.Column("resolved", sa.Integer),
+            sa.Column("timed_out", sa.Integer),
+            sa.Column("resolution_seconds", sa.Float),
+            sa.UniqueConstraint("tenant_id", "granularity", "bucket_start", name="uq_stats_rollups_bucket"),
+        ], [
+            ("ix_stats_rollups_id", ["id"]),
+        ], {}),
+        ("idempotency_keys", [
+            sa.Column("key", sa.String(320), primary_key=True),
+            sa.Column("fingerprint", sa.String(40)),
+            sa.Column("status_code", sa.Integer, nullable=True),
+            sa.Column("response_body", sa.Text, nullable=True),
+            sa.Column("created_at", sa.DateTime),
+            sa.Column("expires_at", sa.DateTime),
+        ], [
+            ("ix_idempotency_keys_expires_at", ["expires_at"]),
+        ], {}),
+    ]
+
+
+def _backfill_priority(bind):
+    """
+    Priority for pending requests written before the column existed: credit for
+    the caller's earlier requests and extra waiting callers, minus the deadline
+    in epoch seconds. Caller history and waiters are counted in SQL, one batch
+    of requests at a time.
+    """
+    requests = sa.table(
+        "help_requests",
+        sa.column("id", sa.Integer), sa.column("customer_id", sa.Integer), sa.column("state", sa.String),
+        sa.column("created_at", sa.DateTime), sa.column("timeout_at", sa.DateTime), sa.column("priority", sa.Float),
+    )
+    earlier = sa.table("help_requests", sa.column("id", sa.Integer), sa.column("customer_id", sa.Integer)).alias("earlier")
+    subscribers = sa.table("help_request_subscribers", sa.column("help_request_id", sa.Integer))
+    prior_count = (
+        sa.select(sa.func.count()).select_from(earlier)
+        .where(earlier.c.customer_id == requests.c.customer_id, earlier.c.id < requests.c.id)
+        .scalar_subquery()
+    )
+    waiting_count = (
+        sa.select(sa.func.count()).select_from(subscribers)
+        .where(subscribers.c.help_request_id == requests.c.id)
+        .scalar_subquery()
+    )
+    set_priority = requests.update().where(requests.c.id == sa.bindparam("row_id")).values(priority=sa.bindparam("value"))
+
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(
+                requests.c.id, requests.c.created_at, requests.c.timeout_at,
+                prior_count.label("prior"), waiting_count.label("waiting"),
+            )
+            .where(
+                requests.c.state == "pending",
+                requests.c.priority.is_(None),
+                requests.c.id > last_id,
+                sa.or_(requests.c.timeout_at.isnot(None), requests.c.created_at.isnot(None)),
+            )
+            .order_by(requests.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        params = []
+        for row in rows:
+            deadline = row.timeout_at or (row.created_at + timedelta(seconds=SUPERVISOR_TTL_SECONDS))
+            value = (
+                row.prior * REPEAT_CALLER_SECONDS
+                + row.waiting * WAITING_CALLER_SECONDS
+                - (deadline - EPOCH).total_seconds()
+            )
+            params.append({"row_id": row.id, "value": value})
+        bind.execute(set_priority, params)
+        last_id = rows[-1].id
+
+
+def upgrade():
+    if context.is_offline_mode():
+        raise RuntimeError("the baseline revision inspects the live schema to adopt older databases")
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    existing = set(inspector.get_table_names())
+
+    for table, columns, indexes, options in _tables():
+        if table not in existing:
+            op.create_table(table, *columns, **options)
+            present = set()
+        else:
+            have = {c["name"] for c in inspector.get_columns(table)}
+            for column in columns:
+                if isinstance(column, sa.Column) and column.name not in have:
+                    op.add_column(table, column)
+            present = {ix["name"] for ix in inspector.get_indexes(table)}
+        for name, index_columns in indexes:
+            if name not in present:
+                op.create_index(name, table, index_columns)
+
+    if "help_requests" in existing:
+        _backfill_priority(bind)
+
+
+def downgrade():
+    raise RuntimeError("cannot downgrade past the baseline revision")
@@ -0,0 +1,64 @@
+"""Hot-path indexes and batched question-hash backfill
+
+- help_requests(state, timeout_at): the timeout sweep
+- help_requests(state, created_at): pending-match scan and state listings
+- customers(phone): caller lookup on every escalation
+- knowledge_base(question_hash): exact KB lookups (databases from before
+  Alembic may already have it)
+
+Indexes are built outside a transaction: CONCURRENTLY on PostgreSQL (no
+write lock on the table), and on SQLite each CREATE INDEX is its own short
+transaction. Rows still missing a question hash are backfilled in batches,
+one transaction per batch.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+from backend.migrations import backfill_question_hash
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_help_requests_state_timeout_at", "help_requests", ["state", "timeout_at"]),
+    ("ix_help_requests_state_created_at", "help_requests", ["state", "created_at"]),
+    ("ix_customers_phone", "customers", ["phone"]),
+]
+KB_HASH_INDEX = ("ix_knowledge_base_question_hash", "knowledge_base", ["question_hash"])
+
+
+def _drop_if_invalid(name: str, table: str):
+    """An interrupted CREATE INDEX CONCURRENTLY leaves an invalid index that IF NOT EXISTS would keep."""
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+    invalid = bind.execute(
+        sa.text(
+            "SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ),
+        {"name": name},
+    ).first()
+    if invalid:
+        op.drop_index(name, table_name=table, postgresql_concurrently=True)
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES + [KB_HASH_INDEX]:
+            _drop_if_invalid(name, table)
+            op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=True)
+        backfill_question_hash(op.get_bind().engine)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in INDEXES:
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
@@ -0,0 +1,39 @@
+"""help_requests.question_hash for escalation coalescing
+
+Escalations look up a pending duplicate by (tenant_id, state, question_hash)
+before any fuzzy matching. The column is added nullable, the index is built
+outside a transaction like 0002's, and existing rows are backfilled in
+batches, one transaction per batch.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+from backend.migrations import backfill_question_hash
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+HASH_INDEX = ("ix_help_requests_tenant_state_hash", "help_requests", ["tenant_id", "state", "question_hash"])
+
+
+def upgrade():
+    op.add_column("help_requests", sa.Column("question_hash", sa.String(40), nullable=True))
+    name, table, columns = HASH_INDEX
+    with op.get_context().autocommit_block():
+        op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=True)
+        backfill_question_hash(op.get_bind().engine, table_name="help_requests")
+
+
+def downgrade():
+    name, table, _ = HASH_INDEX
+    with op.get_context().autocommit_block():
+        op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
+    with op.batch_alter_table("help_requests") as batch:
+        batch.drop_column("question_hash")
@@ -1,6 +1,6 @@
 from flask import Flask, request, jsonify, abort
 from flask_cors import CORS
-from datetime import datetime
+from datetime import datetime, timedelta
 import threading
 import time
 import logging
@@ -15,28 +15,43 @@ from .models import (
     HelpRequest,
     KnowledgeBaseEntry,
     HelpRequestState,
+    DEFAULT_TENANT,
 )
-from .services.kb_services import KBService
-from .services.help_request_service import HelpRequestService
+from .admission import AdmissionController
+from .business_info import valid_tenant_id
+from .idempotency import IdempotencyStore, idempotent
+from .serializers import HELP_REQUEST, HELP_REQUEST_CLAIMED, ORJSON_AVAILABLE, OrjsonProvider
+from .services.help_request_service import HelpRequestService, priority_score
 from .services.notification_service import NotificationService
+from .services.retention_service import RetentionService
+from .services.event_log import EventLogService
+from .services.stats_service import StatsService
 from .ai_agent import AIAgent
 from .livekit_integration import LiveKitWrapper
+from .migrations import check_schema
 
-# Create database tables if not exist
-Base.metadata.create_all(bind=engine)
+# Schema changes are applied by `python -m backend.migrations`, not at startup
+check_schema(engine)
 
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend integration
+if Config.JSON_USE_ORJSON and ORJSON_AVAILABLE:
+    app.json = OrjsonProvider(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("backend")
 
 # Initialize core services
-kb_service = KBService()
 help_service = HelpRequestService()
 notifier = NotificationService()
+retention = RetentionService()
+events = EventLogService()
+stats = StatsService()
 agent = AIAgent()
 livekit = LiveKitWrapper()
+admission = AdmissionController()
+admission.latency.attach(engine)
+idempotency = IdempotencyStore(db_session_factory=SessionLocal if Config.IDEMPOTENCY_STORE == "table" else None)
 
 
 def timeout_worker():
@@ -45,16 +60,10 @@ def timeout_worker():
         try:
             expired = help_service.check_and_mark_timeouts()
             for r in expired:
-                db = SessionLocal()
-                try:
-                    cust = db.query(Customer).filter(Customer.id == r.customer_id).first()
-                    if cust:
-                        notifier.notify_customer(
-                            {"name": cust.name, "phone": cust.phone},
-                            "Sorry, we couldn't resolve your question in time. We'll follow up soon.",
-                        )
-                finally:
-                    db.close()
+                notifier.notify_customers(
+                    help_service.waiting_callers(r.id),
+                    "Sorry, we couldn't resolve your question in time. We'll follow up soon.",
+                )
             time.sleep(10)
         except Exception as e:
             logger.exception("timeout_worker error")
@@ -67,6 +76,7 @@ worker.start()
 
 
 @app.route("/api/call/incoming", methods=["POST"])
+@idempotent(idempotency)
 def incoming_call():
     """Handles incoming customer questions."""
     data = request.get_json()
@@ -75,11 +85,21 @@ def incoming_call():
 
     caller = data.get("caller", {})
     question = data.get("question", "")
+    tenant_id = data.get("tenant_id") or DEFAULT_TENANT
 
     if not caller.get("phone") or not question:
         return jsonify({"error": "missing fields"}), 400
+    if not valid_tenant_id(tenant_id):
+        return jsonify({"error": "invalid tenant_id"}), 400
 
-    result = agent.handle_incoming(caller, question)
+    decision = admission.check((tenant_id, caller["phone"]))
+    if not decision.admitted:
+        response = jsonify({"error": decision.reason, "retry_after": decision.retry_after})
+        response.headers["Retry-After"] = str(decision.retry_after)
+        return response, 429
+
+    with admission.track():
+        result = agent.handle_incoming(caller, question, tenant_id)
     return jsonify(result)
 
 
@@ -87,39 +107,65 @@ def incoming_call():
 def list_requests():
     """List help requests by state."""
     state = request.args.get("state")
-    rows = help_service.list_requests(state=state)
+    rows = help_service.list_requests(state=state, tenant_id=request.args.get("tenant_id"))
+    return jsonify([
+        {**HELP_REQUEST(r), "priority": priority_score(r) if r.state == HelpRequestState.PENDING else None}
+        for r in rows
+    ])
+
+
+@app.route("/api/requests/claim", methods=["POST"])
+def claim_requests():
+    """Lease the next pending requests to a supervisor (least-loaded one if not given)."""
+    data = request.get_json(silent=True) or {}
+    supervisor_id = data.get("supervisor_id")
+    try:
+        limit = int(data.get("limit", 1))
+    except (TypeError, ValueError):
+        return jsonify({"error": "limit must be an integer"}), 400
+    if limit < 1:
+        return jsonify({"error": "limit must be at least 1"}), 400
+
+    supervisor_id, claimed = help_service.claim_requests(
+        supervisor_id=supervisor_id, limit=limit, tenant_id=data.get("tenant_id")
+    )
+    if supervisor_id is None:
+        if data.get("supervisor_id") is not None:
+            return jsonify({"error": "supervisor not found"}), 404
+        return jsonify({"error": "no supervisors"}), 409
+
+    return jsonify({
+        "supervisor_id": supervisor_id,
+        "requests": [{**HELP_REQUEST_CLAIMED(r), "priority": priority_score(r)} for r in claimed],
+    })
+
 
-    out = []
-    for r in rows:
-        out.append({
-            "id": r.id,
-            "customer_id": r.customer_id,
-            "question_text": r.question_text,
-            "created_at": r.created_at.isoformat(),
-            "state": r.state,
-            "response_text": r.response_text,
-        })
-    return jsonify(out)
+@app.route("/api/requests/<int:request_id>/release", methods=["POST"])
+def release_request(request_id):
+    """Supervisor hands a claimed request back to the queue."""
+    data = request.get_json(silent=True) or {}
+    if data.get("supervisor_id") is None:
+        return jsonify({"error": "missing supervisor_id"}), 400
+    if not help_service.release_request(request_id, data["supervisor_id"]):
+        return jsonify({"error": "not claimed by this supervisor"}), 409
+    return jsonify({"status": "ok"})
 
 
 @app.route("/api/requests/<int:request_id>", methods=["GET"])
 def get_request(request_id):
-    """Get a specific help request."""
+    """Get a specific help request (falls back to the archive for old closed requests)."""
     r = help_service.get_request(request_id)
     if not r:
-        abort(404)
+        archived = retention.get_archived(request_id)
+        if not archived:
+            abort(404)
+        return jsonify({**archived, "archived": True})
 
-    return jsonify({
-        "id": r.id,
-        "customer_id": r.customer_id,
-        "question_text": r.question_text,
-        "created_at": r.created_at.isoformat(),
-        "state": r.state,
-        "response_text": r.response_text,
-    })
+    return jsonify(HELP_REQUEST(r))
 
 
 @app.route("/api/requests/<int:request_id>/respond", methods=["POST"])
+@idempotent(idempotency)
 def respond_request(request_id):
     """Supervisor responds to a help request."""
     payload = request.get_json()
@@ -134,47 +180,90 @@ def respond_request(request_id):
 
     hr = help_service.resolve_request(request_id, answer, supervisor_id)
     if not hr:
-        return jsonify({"error": "request not found"}), 404
+        if help_service.get_request(request_id) is None:
+            return jsonify({"error": "request not found"}), 404
+        return jsonify({"error": "request is not pending or is claimed by another supervisor"}), 409
 
-    # Create KB entry
-    kb = kb_service.create_entry(
+    # Create KB entry for the request's tenant
+    kb = agent.kb_for(hr.tenant_id or DEFAULT_TENANT).create_entry(
         hr.question_text,
         answer,
         source_request_id=hr.id,
         created_by=f"supervisor:{supervisor_id}",
     )
 
-    # Notify customer
-    db = SessionLocal()
-    try:
-        cust = db.query(Customer).filter(Customer.id == hr.customer_id).first()
-        if cust:
-            notifier.notify_customer({"name": cust.name, "phone": cust.phone}, answer)
-    finally:
-        db.close()
+    # Notify every customer waiting on this question in one batch
+    notifier.notify_customers(help_service.waiting_callers(hr.id), answer)
 
     return jsonify({"status": "ok", "kb_id": kb.id})
 
 
 @app.route("/api/kb", methods=["GET", "POST"])
 def kb_routes():
-    """Knowledge Base routes."""
+    """Knowledge Base routes (per tenant; `tenant_id` query or body field)."""
     if request.method == "GET":
-        entries = kb_service.list_entries()
+        tenant_id = request.args.get("tenant_id") or DEFAULT_TENANT
+        if not valid_tenant_id(tenant_id):
+            return jsonify({"error": "invalid tenant_id"}), 400
+        entries = agent.kb_for(tenant_id).list_entries()
         return jsonify(entries)
 
     data = request.get_json()
     if not data:
         return jsonify({"error": "bad payload"}), 400
+    tenant_id = data.get("tenant_id") or DEFAULT_TENANT
+    if not valid_tenant_id(tenant_id):
+        return jsonify({"error": "invalid tenant_id"}), 400
 
     q = data.get("question_text")
     a = data.get("answer_text")
     created_by = data.get("created_by")
 
-    kb = kb_service.create_entry(q, a, created_by=created_by)
+    kb = agent.kb_for(tenant_id).create_entry(q, a, created_by=created_by)
     return jsonify({"status": "ok", "id": kb.id})
 
 
+@app.route("/api/events", methods=["GET"])
+def list_events():
+    """
+    Tail help-request state changes: events with seq > `after`, oldest first.
+    Optional `limit` (max 1000), `tenant_id`, `request_id`, and `wait` (seconds, max 30) to long-poll.
+    """
+    try:
+        after = int(request.args.get("after", 0))
+        limit = min(int(request.args.get("limit", 100)), 1000)
+        wait = min(float(request.args.get("wait", 0)), 30.0)
+        request_id = request.args.get("request_id", type=int)
+    except ValueError:
+        return jsonify({"error": "after, limit and wait must be numbers"}), 400
+
+    rows = events.list_events(
+        after=after, limit=limit, tenant_id=request.args.get("tenant_id"),
+        request_id=request_id, wait_seconds=wait,
+    )
+    return jsonify({"events": rows, "last_seq": rows[-1]["seq"] if rows else after})
+
+
+@app.route("/api/stats", methods=["GET"])
+def get_stats():
+    """
+    Call outcome rollups: per-bucket counters and rates plus totals.
+    Optional `granularity` (hour|day), `since`/`until` (ISO timestamps, default last 24h), `tenant_id`.
+    """
+    try:
+        since = request.args.get("since")
+        until = request.args.get("until")
+        since = datetime.fromisoformat(since) if since else datetime.utcnow() - timedelta(hours=24)
+        until = datetime.fromisoformat(until) if until else None
+        result = stats.rollups(
+            granularity=request.args.get("granularity", "hour"),
+            since=since, until=until, tenant_id=request.args.get("tenant_id"),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
+
 @app.route("/api/simulate/timeout", methods=["POST"])
 def simulate_timeout():
     """Simulate timeout for testing."""
@@ -216,6 +305,30 @@ def generate_voice_token():
         return jsonify({"error": "failed to generate token"}), 500
 
 
+@app.route("/api/voice/tokens", methods=["POST"])
+def generate_voice_tokens():
+    """Mint access tokens for a batch of participants in one request."""
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "bad payload"}), 400
+
+    participants = data.get("participants")
+    if not isinstance(participants, list) or not participants:
+        return jsonify({"error": "missing participants"}), 400
+    if len(participants) > Config.LIVEKIT_TOKEN_BATCH_MAX:
+        return jsonify({"error": f"at most {Config.LIVEKIT_TOKEN_BATCH_MAX} participants per batch"}), 400
+
+    room_name = data.get("room_name")
+    for i, p in enumerate(participants):
+        if not isinstance(p, dict) or not p.get("participant_id"):
+            return jsonify({"error": f"participants[{i}] must be an object with a participant_id"}), 400
+        if not (p.get("room_name") or room_name):
+            return jsonify({"error": f"missing room_name for participants[{i}]"}), 400
+
+    tokens = livekit.generate_tokens(room_name, participants)
+    return jsonify({"tokens": tokens, "url": livekit.url})
+
+
 @app.route("/api/voice/rooms", methods=["GET"])
 def list_voice_rooms():
     """List all active voice rooms."""
@@ -248,7 +361,8 @@ def health_check():
             "help_requests": "active",
             "notifications": "active",
             "voice_ai": "configured" if livekit.client else "not_configured"
-        }
+        },
+        "admission": admission.stats(),
     })
 
 
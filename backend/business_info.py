@@ -0,0 +1,186 @@
+"""
+Answers derived from the static business-info JSON (hours, prices, policies).
+
+The JSON is compiled once into a keyword -> intent table with every answer
+pre-rendered, so a lookup is a handful of dict probes over the question's
+words. The file is re-read when its mtime changes (checked at most every
+BUSINESS_INFO_RELOAD_SECONDS), so edits apply without a restart.
+Each tenant (business location) has its own file and table.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from string import Template
+from typing import Any, Dict, Optional, Set
+
+from .config import Config
+from .services.kb_search import normalize_question
+
+logger = logging.getLogger("business_info")
+
+# Tenant ids name files under TENANTS_DIR, so keep them to a safe charset
+_TENANT_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Answer templates, compiled once
+HOURS_TEMPLATE = Template("We're open $hours.")
+ADDRESS_TEMPLATE = Template("We're located at $address.")
+PHONE_TEMPLATE = Template("You can reach us at $phone.")
+PRICE_TEMPLATE = Template("A $service costs $price.")
+OFFER_TEMPLATE = Template("Yes, we offer $service. Pricing is $price.")
+
+HOURS_WORDS = {"hours", "open", "opening", "close", "closing", "closed"}
+# Questions about specific days or dates we have no data for must still be escalated:
+# the weekly hours are the wrong answer for "Are you open on Thanksgiving?"
+DATE_BLOCKERS = (
+    "today", "tomorrow", "tonight", "this weekend", "next week", "holiday", "holidays", "public holiday",
+    "bank holiday", "new year", "new years", "new year s", "christmas", "christmas eve", "xmas", "boxing day",
+    "thanksgiving", "black friday", "easter", "good friday", "halloween", "valentine", "valentines",
+    "valentine s", "mother s day", "mothers day", "father s day", "fathers day", "memorial day",
+    "labor day", "labour day", "independence day", "fourth of july", "july 4", "diwali", "holi", "eid",
+    "ramadan", "hanukkah", "passover", "lunar new year", "chinese new year",
+)
+_MONTHS = r"jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec"
+# Matched against the normalized question (punctuation already replaced by spaces)
+_DATE_RE = re.compile(
+    r"\b(?:" + "|".join(re.escape(p) for p in DATE_BLOCKERS) + r")\b"
+    r"|\b\d{1,2}(?:st|nd|rd|th)\b"
+    r"|\b(?:" + _MONTHS + r")[a-z]* \d{1,2}\b"
+    r"|\b\d{1,2} (?:of )?(?:" + _MONTHS + r")"
+)
+# Matched against the raw question: 12/25, 25-12-2024
+_NUMERIC_DATE_RE = re.compile(r"\b\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?\b")
+ADDRESS_WORDS = {"address", "located", "location", "directions"}
+PHONE_WORDS = {"phone number", "contact number", "call you"}
+PRICE_WORDS = {"price", "prices", "pricing", "cost", "costs", "much", "charge", "rate", "rates", "fee"}
+OFFER_WORDS = {"offer", "provide", "do", "have"}
+SERVICE_SYNONYMS = {
+    "haircut": {"hair cut", "haircuts"},
+    "color": {"colour", "coloring", "colouring", "hair color"},
+}
+POLICY_SYNONYMS = {
+    "cancellation": {"cancel", "cancelling", "canceling", "reschedule", "refund"},
+    "walkin": {"walk in", "walk ins", "walkins"},
+}
+
+
+@dataclass(frozen=True)
+class Intent:
+    name: str
+    answer: str
+
+
+def valid_tenant_id(tenant_id: str) -> bool:
+    return bool(tenant_id) and bool(_TENANT_ID_RE.match(tenant_id))
+
+
+def tenant_info_path(tenant_id: str, tenants_dir: str = Config.TENANTS_DIR) -> str:
+    if not valid_tenant_id(tenant_id):
+        raise ValueError(f"invalid tenant id: {tenant_id!r}")
+    return os.path.join(tenants_dir, f"{tenant_id}.json")
+
+
+def _phrases(question: str) -> Set[str]:
+    words = normalize_question(question).split()
+    return set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+
+def mentions_date(question: str) -> bool:
+    """True if the question is about a specific day (holiday, relative day or calendar date)."""
+    return bool(_DATE_RE.search(normalize_question(question)) or _NUMERIC_DATE_RE.search(question or ""))
+
+
+class BusinessIntents:
+    """Keyword -> pre-rendered answer table built from salon_business_info.json."""
+
+    def __init__(
+        self,
+        path: str,
+        reload_interval: float = Config.BUSINESS_INFO_RELOAD_SECONDS,
+        required: bool = True,
+    ):
+        """With required=False a missing file just yields no intents until it appears."""
+        self.path = path
+        self.reload_interval = reload_interval
+        self.required = required
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self.data: Dict[str, Any] = {}
+        self._table: Dict[str, Any] = self._compile({})
+        self.reload()
+
+    def reload(self) -> bool:
+        """Re-read the JSON if its mtime changed. Returns True if the table was rebuilt."""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if not self.required and not os.path.exists(self.path):
+                return False
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+                if mtime == self._mtime:
+                    return False
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                # Keep serving the previous table (e.g. the file is mid-write)
+                logger.error(f"Failed to load business info from {self.path}: {e}")
+                if not self.data and self.required:
+                    raise
+                return False
+            self.data = data
+            self._table = self._compile(data)
+            self._mtime = mtime
+            logger.info(f"Loaded business info ({len(self._table['services'])} services)")
+            return True
+
+    def _compile(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        services, offers = {}, {}
+        for name, price in (data.get("services") or {}).items():
+            price_answer = Intent(f"price:{name}", PRICE_TEMPLATE.substitute(service=name, price=price))
+            offer_answer = Intent(f"offer:{name}", OFFER_TEMPLATE.substitute(service=name, price=price))
+            for word in {name, f"{name}s"} | SERVICE_SYNONYMS.get(name, set()):
+                services[word] = price_answer
+                offers[word] = offer_answer
+
+        policies = {}
+        for key, text in (data.get("policies") or {}).items():
+            for word in {key} | POLICY_SYNONYMS.get(key, set()):
+                policies[word] = Intent(f"policy:{key}", text)
+
+        table: Dict[str, Any] = {"services": services, "offers": offers, "policies": policies}
+        table["hours"] = Intent("hours", HOURS_TEMPLATE.substitute(hours=data["hours"])) if data.get("hours") else None
+        table["address"] = Intent("address", ADDRESS_TEMPLATE.substitute(address=data["address"])) if data.get("address") else None
+        table["phone"] = Intent("phone", PHONE_TEMPLATE.substitute(phone=data["phone"])) if data.get("phone") else None
+        return table
+
+    def _maybe_reload(self):
+        if time.monotonic() - self._checked_at >= self.reload_interval:
+            self.reload()
+
+    def lookup(self, question: str) -> Optional[Intent]:
+        """Intent answering the question, or None if the static info doesn't cover it."""
+        self._maybe_reload()
+        table = self._table
+        phrases = _phrases(question)
+
+        for p in phrases:
+            if p in table["services"]:
+                if phrases & PRICE_WORDS:
+                    return table["services"][p]
+                if phrases & OFFER_WORDS:
+                    return table["offers"][p]
+        for p in phrases:
+            if p in table["policies"]:
+                return table["policies"][p]
+        if table["hours"] and phrases & HOURS_WORDS and not mentions_date(question):
+            return table["hours"]
+        if table["address"] and phrases & ADDRESS_WORDS:
+            return table["address"]
+        if table["phone"] and phrases & PHONE_WORDS:
+            return table["phone"]
+        return None
@@ -10,18 +10,113 @@ class Config:
     LIVEKIT_API_KEY = os.getenv("LIVEKIT_API_KEY", "")
     LIVEKIT_API_SECRET = os.getenv("LIVEKIT_API_SECRET", "")
     LIVEKIT_URL = os.getenv("LIVEKIT_URL", "ws://localhost:7880")
+    LIVEKIT_ROOM_CACHE_SECONDS = float(os.getenv("LIVEKIT_ROOM_CACHE_SECONDS", "2"))
+    LIVEKIT_TOKEN_CACHE_SECONDS = float(os.getenv("LIVEKIT_TOKEN_CACHE_SECONDS", "60"))
+    LIVEKIT_TOKEN_CACHE_SIZE = int(os.getenv("LIVEKIT_TOKEN_CACHE_SIZE", "10000"))
+    LIVEKIT_TOKEN_BATCH_MAX = int(os.getenv("LIVEKIT_TOKEN_BATCH_MAX", "100"))
 
     # Supervisor configuration
     SUPERVISOR_TTL_SECONDS = int(os.getenv("SUPERVISOR_TTL_SECONDS", "1800"))
 
+    # Supervisor work queue: claimed requests are leased, and each supervisor holds at most this many
+    CLAIM_LEASE_SECONDS = int(os.getenv("CLAIM_LEASE_SECONDS", "300"))
+    CLAIM_MAX_ACTIVE_PER_SUPERVISOR = int(os.getenv("CLAIM_MAX_ACTIVE_PER_SUPERVISOR", "5"))
+
+    # Help-request priority: seconds of deadline credit per prior request from the same caller,
+    # and per extra caller waiting on the same question
+    PRIORITY_REPEAT_CALLER_SECONDS = float(os.getenv("PRIORITY_REPEAT_CALLER_SECONDS", "300"))
+    PRIORITY_WAITING_CALLER_SECONDS = float(os.getenv("PRIORITY_WAITING_CALLER_SECONDS", "600"))
+
+    # Unknown questions this similar to a pending request join it instead of escalating again
+    HELP_COALESCE_THRESHOLD = float(os.getenv("HELP_COALESCE_THRESHOLD", "0.85"))
+
+    # Retention: closed help requests older than this are moved to the archive in batches
+    RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "30"))
+    RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+    RETENTION_BATCH_PAUSE_SECONDS = float(os.getenv("RETENTION_BATCH_PAUSE_SECONDS", "0.2"))
+    RETENTION_SINK = os.getenv("RETENTION_SINK", "table")  # "table" or "ndjson"
+    RETENTION_ARCHIVE_DIR = os.getenv("RETENTION_ARCHIVE_DIR", "./archive")
+
+    # Analytics rollups: outcome counters are buffered in memory and flushed this often
+    STATS_FLUSH_SECONDS = float(os.getenv("STATS_FLUSH_SECONDS", "5"))
+
+    # Idempotency-Key replay window; "table" also stores keys in the database (shared by workers, survives restarts)
+    IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+    IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+    IDEMPOTENCY_STORE = os.getenv("IDEMPOTENCY_STORE", "memory")
+
+    # Admission control on /api/call/incoming: token buckets per caller phone and
+    # globally, plus load shedding on in-flight requests and DB latency (429 + Retry-After)
+    CALL_RATE_PER_CALLER_PER_MINUTE = float(os.getenv("CALL_RATE_PER_CALLER_PER_MINUTE", "6"))
+    CALL_BURST_PER_CALLER = float(os.getenv("CALL_BURST_PER_CALLER", "3"))
+    CALL_RATE_GLOBAL_PER_SECOND = float(os.getenv("CALL_RATE_GLOBAL_PER_SECOND", "50"))
+    CALL_BURST_GLOBAL = float(os.getenv("CALL_BURST_GLOBAL", "100"))
+    CALL_MAX_INFLIGHT = int(os.getenv("CALL_MAX_INFLIGHT", "32"))
+    CALL_SHED_DB_LATENCY_MS = float(os.getenv("CALL_SHED_DB_LATENCY_MS", "500"))
+    CALL_SHED_LATENCY_HALF_LIFE_SECONDS = float(os.getenv("CALL_SHED_LATENCY_HALF_LIFE_SECONDS", "5"))
+    CALL_SHED_RETRY_AFTER_SECONDS = int(os.getenv("CALL_SHED_RETRY_AFTER_SECONDS", "2"))
+    RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
     # Optional notification webhook
     NOTIFICATION_WEBHOOK_URL = os.getenv("NOTIFICATION_WEBHOOK_URL", "")
 
+    # Multi-tenant: per-tenant business info lives in TENANTS_DIR/<tenant_id>.json
+    TENANTS_DIR = os.getenv("TENANTS_DIR", os.path.join(os.path.dirname(__file__), "..", "prompts", "tenants"))
+
+    # Business-info JSON is re-read when its mtime changes (checked at most this often)
+    BUSINESS_INFO_RELOAD_SECONDS = float(os.getenv("BUSINESS_INFO_RELOAD_SECONDS", "1"))
+
+    # Async agent path (voice): bounded thread pools for DB work and KB matching
+    AGENT_DB_WORKERS = int(os.getenv("AGENT_DB_WORKERS", "8"))
+    AGENT_MATCH_WORKERS = int(os.getenv("AGENT_MATCH_WORKERS", "4"))
+
+    # Voice: speculative KB lookups on interim transcripts
+    VOICE_PREFETCH_MIN_CHARS = int(os.getenv("VOICE_PREFETCH_MIN_CHARS", "12"))
+    VOICE_PREFETCH_MAX_HYPOTHESES = int(os.getenv("VOICE_PREFETCH_MAX_HYPOTHESES", "8"))
+    # Callers tracked at once, and how long an idle caller's speculations are kept
+    VOICE_PREFETCH_MAX_CALLERS = int(os.getenv("VOICE_PREFETCH_MAX_CALLERS", "1000"))
+    VOICE_PREFETCH_TTL_SECONDS = float(os.getenv("VOICE_PREFETCH_TTL_SECONDS", "120"))
+
+    # Voice: cached TTS phrases for frequently spoken answers.
+    # TTS_ENGINE is "openai" (speech endpoint, needs OPENAI_API_KEY) or "local" (offline test tones)
+    TTS_ENGINE = os.getenv("TTS_ENGINE", "openai").lower()
+    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+    TTS_MODEL = os.getenv("TTS_MODEL", "tts-1")
+    TTS_TIMEOUT_SECONDS = float(os.getenv("TTS_TIMEOUT_SECONDS", "15"))
+    TTS_VOICE = os.getenv("TTS_VOICE", "nova")
+    TTS_FORMAT = os.getenv("TTS_FORMAT", "wav")
+    TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "./tts_cache")
+    TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
     # Flask server configuration
     FLASK_PORT = int(os.getenv("FLASK_PORT", "8000"))
+    # Encode JSON responses with orjson when it is installed
+    JSON_USE_ORJSON = os.getenv("JSON_USE_ORJSON", "true").lower() == "true"
 
     # Database configuration
     DB_URL = os.getenv("DB_URL", "sqlite:///./local.db")
 
     # Knowledge Base (similarity threshold)
     KB_FUZZY_THRESHOLD = float(os.getenv("KB_FUZZY_THRESHOLD", "0.6"))
+
+    # Knowledge Base retrieval pipeline
+    KB_CANDIDATE_LIMIT = int(os.getenv("KB_CANDIDATE_LIMIT", "20"))
+    KB_SHORT_CIRCUIT_SCORE = float(os.getenv("KB_SHORT_CIRCUIT_SCORE", "0.9"))
+    KB_LEXICAL_WEIGHT = float(os.getenv("KB_LEXICAL_WEIGHT", "0.6"))
+    # Writes made by this process update the search snapshot directly; changes made
+    # by other processes are picked up by a background check at most this often
+    KB_SNAPSHOT_CHECK_SECONDS = float(os.getenv("KB_SNAPSHOT_CHECK_SECONDS", "2"))
+
+    # Per-tenant KB indexes are evicted least-recently-used beyond this (approximate) size
+    KB_INDEX_MEMORY_BUDGET_MB = float(os.getenv("KB_INDEX_MEMORY_BUDGET_MB", "64"))
+
+    # KB hit counters are buffered and flushed in batches; the most-hit entries
+    # form a small hot tier that is searched before the full index. A hot-tier
+    # match below KB_HOT_TIER_MIN_SCORE falls through to the full index.
+    KB_HIT_FLUSH_SECONDS = float(os.getenv("KB_HIT_FLUSH_SECONDS", "5"))
+    KB_HOT_TIER_SIZE = int(os.getenv("KB_HOT_TIER_SIZE", "50"))
+    KB_HOT_TIER_REFRESH_SECONDS = float(os.getenv("KB_HOT_TIER_REFRESH_SECONDS", "60"))
+    KB_HOT_TIER_MIN_SCORE = float(os.getenv("KB_HOT_TIER_MIN_SCORE", "0.85"))
+
+    # Near-duplicate KB questions (trigram Jaccard) are merged into one entry with aliases
+    KB_DEDUP_THRESHOLD = float(os.getenv("KB_DEDUP_THRESHOLD", "0.85"))
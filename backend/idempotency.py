@@ -0,0 +1,215 @@
+"""
+Idempotency-Key support for replayable POST endpoints.
+
+Telephony retries and double-submits replay `/api/call/incoming` and
+`/api/requests/<id>/respond`. A client that sends an `Idempotency-Key` header
+gets the stored response back for any replay within IDEMPOTENCY_TTL_SECONDS,
+and the view (KB matching, row inserts, notifications) is not run again.
+
+Keys are scoped by path and bound to a fingerprint of the request body;
+reusing a key with a different body is a 422. A replay that arrives while
+the first request is still running gets a 409. Only 2xx responses are
+stored, so a failed request can be retried with the same key.
+
+Entries live in memory, evicted by TTL (insertion order is expiry order) and
+by IDEMPOTENCY_MAX_KEYS. With IDEMPOTENCY_STORE=table they are also written
+to `idempotency_keys`, which makes keys survive restarts and be shared by
+every worker on the same database.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+from typing import NamedTuple, Optional, Tuple
+
+from flask import current_app, jsonify, make_response, request
+from sqlalchemy.exc import IntegrityError
+
+from .config import Config
+from .models import IdempotencyKey
+
+logger = logging.getLogger("idempotency")
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+PROCEED = "proceed"
+REPLAY = "replay"
+IN_PROGRESS = "in_progress"
+MISMATCH = "mismatch"
+
+
+class _Entry(NamedTuple):
+    expires_at: float
+    fingerprint: str
+    # None while the first request is still running
+    status_code: Optional[int]
+    body: Optional[bytes]
+
+
+class IdempotencyStore:
+    """TTL-evicted key -> stored response map, optionally backed by a database table."""
+
+    def __init__(
+        self,
+        ttl_seconds: float = Config.IDEMPOTENCY_TTL_SECONDS,
+        max_keys: int = Config.IDEMPOTENCY_MAX_KEYS,
+        db_session_factory=None,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self.db_session_factory = db_session_factory
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def begin(self, key: str, fingerprint: str) -> Tuple[str, Optional[_Entry]]:
+        """
+        Claim `key` for a new request, or report why it can't be run:
+        PROCEED (claimed), REPLAY (entry holds the stored response), IN_PROGRESS or MISMATCH.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                return self._outcome(entry, fingerprint), entry
+            if self.db_session_factory is None:
+                self._entries[key] = _Entry(now + self.ttl_seconds, fingerprint, None, None)
+                return PROCEED, None
+
+        state, entry = self._begin_in_table(key, fingerprint)
+        if state in (PROCEED, REPLAY):
+            with self._lock:
+                self._entries[key] = entry or _Entry(now + self.ttl_seconds, fingerprint, None, None)
+        return state, entry
+
+    def complete(self, key: str, status_code: int, body: bytes):
+        """Store the response for `key`; later replays get it back."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = entry._replace(status_code=status_code, body=body)
+        if self.db_session_factory is not None:
+            db = self.db_session_factory()
+            try:
+                db.query(IdempotencyKey).filter(IdempotencyKey.key == key).update(
+                    {IdempotencyKey.status_code: status_code, IdempotencyKey.response_body: body.decode("utf-8")},
+                    synchronize_session=False,
+                )
+                db.commit()
+            finally:
+                db.close()
+
+    def release(self, key: str):
+        """Forget an unfinished claim (the request failed), so the key can be retried."""
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.db_session_factory is not None:
+            db = self.db_session_factory()
+            try:
+                db.query(IdempotencyKey).filter(
+                    IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None)
+                ).delete(synchronize_session=False)
+                db.commit()
+            finally:
+                db.close()
+
+    @staticmethod
+    def _outcome(entry: _Entry, fingerprint: str) -> str:
+        if entry.fingerprint != fingerprint:
+            return MISMATCH
+        return IN_PROGRESS if entry.status_code is None else REPLAY
+
+    def _evict(self, now: float):
+        while self._entries:
+            _, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now and len(self._entries) <= self.max_keys:
+                break
+            self._entries.popitem(last=False)
+
+    def _begin_in_table(self, key: str, fingerprint: str) -> Tuple[str, Optional[_Entry]]:
+        """Claim the key with an INSERT; the primary key arbitrates between workers."""
+        now = datetime.utcnow()
+        db = self.db_session_factory()
+        try:
+            self._purge_expired(db, now)
+            for _ in range(2):
+                db.add(IdempotencyKey(
+                    key=key, fingerprint=fingerprint, created_at=now,
+                    expires_at=now + timedelta(seconds=self.ttl_seconds),
+                ))
+                try:
+                    db.commit()
+                    return PROCEED, None
+                except IntegrityError:
+                    db.rollback()
+                row = db.get(IdempotencyKey, key)
+                if row is None:
+                    continue
+                if row.expires_at <= now:
+                    db.delete(row)
+                    db.commit()
+                    continue
+                body = row.response_body.encode("utf-8") if row.response_body is not None else None
+                remaining = (row.expires_at - now).total_seconds()
+                entry = _Entry(time.monotonic() + remaining, row.fingerprint, row.status_code, body)
+                return self._outcome(entry, fingerprint), entry
+            return IN_PROGRESS, None
+        finally:
+            db.close()
+
+    def _purge_expired(self, db, now: datetime):
+        """Delete expired rows, at most once a minute."""
+        if time.monotonic() - self._last_purge < 60:
+            return
+        self._last_purge = time.monotonic()
+        db.query(IdempotencyKey).filter(IdempotencyKey.expires_at <= now).delete(synchronize_session=False)
+        db.commit()
+
+
+def idempotent(store: IdempotencyStore):
+    """Flask view decorator: replay stored 2xx responses for a repeated Idempotency-Key."""
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            raw_key = request.headers.get(HEADER)
+            if not raw_key:
+                return view(*args, **kwargs)
+            if len(raw_key) > MAX_KEY_LENGTH:
+                return jsonify({"error": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters"}), 400
+
+            key = f"{request.path}:{raw_key}"
+            fingerprint = hashlib.sha1(request.get_data()).hexdigest()
+            state, entry = store.begin(key, fingerprint)
+            if state == REPLAY:
+                response = current_app.response_class(entry.body, status=entry.status_code, mimetype="application/json")
+                response.headers["Idempotent-Replayed"] = "true"
+                return response
+            if state == IN_PROGRESS:
+                return jsonify({"error": "a request with this Idempotency-Key is still in progress"}), 409
+            if state == MISMATCH:
+                return jsonify({"error": "Idempotency-Key was already used with a different request body"}), 422
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                store.release(key)
+                raise
+            if 200 <= response.status_code < 300:
+                store.complete(key, response.status_code, response.get_data())
+            else:
+                store.release(key)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -1,9 +1,13 @@
 import json
 import requests
 import logging
-from typing import Dict, Any, Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
 from .config import Config
+from .livekit_rooms import LIVEKIT_API_AVAILABLE, BackgroundLoop, RoomServiceClient
 
 try:
     from livekit import api
@@ -18,10 +22,29 @@ logger = logging.getLogger("livekit")
 class LiveKitWrapper:
     """Wrapper for LiveKit API with real room and token management."""
 
-    def __init__(self, api_key: str = Config.LIVEKIT_API_KEY, api_secret: str = Config.LIVEKIT_API_SECRET):
+    def __init__(
+        self,
+        api_key: str = Config.LIVEKIT_API_KEY,
+        api_secret: str = Config.LIVEKIT_API_SECRET,
+        url: Optional[str] = None,
+    ):
         self.api_key = api_key or ""
         self.api_secret = api_secret or ""
-        self.url = Config.LIVEKIT_URL if hasattr(Config, 'LIVEKIT_URL') else "ws://localhost:7880"
+        self.url = url or (Config.LIVEKIT_URL if hasattr(Config, 'LIVEKIT_URL') else "ws://localhost:7880")
+
+        # Room service client and its event loop are created on first use and kept for the process
+        self._rooms: Optional[RoomServiceClient] = None
+        self._loop: Optional[BackgroundLoop] = None
+        self._rooms_lock = threading.Lock()
+        self._room_cache: Optional[Dict[str, Any]] = None
+        self._room_cache_at = 0.0
+        self.room_cache_seconds = Config.LIVEKIT_ROOM_CACHE_SECONDS
+
+        # Recently minted tokens: key -> (jwt, reuse_until monotonic time), LRU-bounded
+        self._token_cache: "OrderedDict[Tuple, Tuple[str, float]]" = OrderedDict()
+        self._token_lock = threading.Lock()
+        self.token_cache_seconds = Config.LIVEKIT_TOKEN_CACHE_SECONDS
+        self.token_cache_size = Config.LIVEKIT_TOKEN_CACHE_SIZE
         
         logger.info(f"LiveKit Init - API Key: {self.api_key[:10] if self.api_key else 'None'}..., Has Secret: {bool(self.api_secret)}")
         
@@ -60,60 +83,136 @@ class LiveKitWrapper:
         room_name: str,
         participant_identity: str,
         participant_name: Optional[str] = None,
-        ttl_seconds: int = 3600
+        ttl_seconds: int = 3600,
+        can_publish: bool = True,
+        can_subscribe: bool = True,
     ) -> Optional[str]:
-        """Generate access token for a participant to join a room."""
+        """
+        Generate access token for a participant to join a room.
+        Identical requests reuse a recently signed token for up to
+        LIVEKIT_TOKEN_CACHE_SECONDS (and never past half its TTL), so a
+        cached token always has most of its lifetime left.
+        """
         if not LIVEKIT_AVAILABLE or not self.api_key or not self.api_secret:
             logger.error("Cannot generate token: LiveKit not properly configured")
             return None
-        
+
+        name = participant_name or participant_identity
+        key = (room_name, participant_identity, name, ttl_seconds, can_publish, can_subscribe)
+        now = time.monotonic()
+        with self._token_lock:
+            cached = self._token_cache.get(key)
+            if cached and cached[1] > now:
+                self._token_cache.move_to_end(key)
+                return cached[0]
+
         try:
-            from livekit import api as lk_api
-            
-            token = lk_api.AccessToken(self.api_key, self.api_secret)
-            token.with_identity(participant_identity)
-            token.with_name(participant_name or participant_identity)
-            token.with_grants(
-                lk_api.VideoGrants(
-                    room_join=True,
-                    room=room_name,
-                    can_publish=True,
-                    can_subscribe=True,
+            jwt = (
+                api.AccessToken(self.api_key, self.api_secret)
+                .with_identity(participant_identity)
+                .with_name(name)
+                .with_grants(
+                    api.VideoGrants(
+                        room_join=True,
+                        room=room_name,
+                        can_publish=can_publish,
+                        can_subscribe=can_subscribe,
+                    )
                 )
+                .with_ttl(timedelta(seconds=ttl_seconds))
+                .to_jwt()
             )
-            token.with_ttl(timedelta(seconds=ttl_seconds))
-            
-            return token.to_jwt()
         except Exception as e:
             logger.error(f"Failed to generate token: {e}")
             return None
 
+        reuse_for = min(self.token_cache_seconds, ttl_seconds / 2)
+        if reuse_for > 0:
+            with self._token_lock:
+                self._token_cache[key] = (jwt, now + reuse_for)
+                self._token_cache.move_to_end(key)
+                while len(self._token_cache) > self.token_cache_size:
+                    self._token_cache.popitem(last=False)
+        return jwt
+
+    def generate_tokens(self, room_name: str, participants: List[Dict[str, Any]], ttl_seconds: int = 3600) -> List[Dict[str, Any]]:
+        """Mint tokens for several participants; each item may override room_name."""
+        out = []
+        for p in participants:
+            if not isinstance(p, dict):
+                out.append({"participant_id": None, "error": "participant must be an object"})
+                continue
+            room = p.get("room_name") or room_name
+            identity = p.get("participant_id")
+            if not room or not identity:
+                out.append({"participant_id": identity, "error": "missing room_name or participant_id"})
+                continue
+            token = self.generate_token(room, identity, p.get("participant_name"), ttl_seconds)
+            if token:
+                out.append({"participant_id": identity, "room_name": room, "token": token})
+            else:
+                out.append({"participant_id": identity, "room_name": room, "error": "failed to generate token"})
+        return out
+
+    def _room_service(self) -> Optional[RoomServiceClient]:
+        """Long-lived room service client bound to a background event loop."""
+        if not self.api_key or not self.api_secret or not LIVEKIT_API_AVAILABLE:
+            return None
+        if self._rooms is None:
+            with self._rooms_lock:
+                if self._rooms is None:
+                    self._loop = BackgroundLoop()
+                    self._rooms = RoomServiceClient(self.url, self.api_key, self.api_secret)
+        return self._rooms
+
     def list_rooms(self) -> Dict[str, Any]:
-        """List all active rooms (simplified version)."""
-        if not self.client or not self.api_key or not self.api_secret:
+        """List all active rooms (cached for LIVEKIT_ROOM_CACHE_SECONDS)."""
+        rooms_api = self._room_service()
+        if not rooms_api:
             return {"error": "LiveKit not configured", "rooms": []}
-        
-        # For Flask sync context, we can't easily list rooms without async
-        # Return a helpful message instead
-        return {
-            "status": "info",
-            "message": "Room listing requires async context. Use LiveKit dashboard to view active rooms.",
-            "dashboard_url": "https://cloud.livekit.io/",
-            "rooms": []
+
+        now = time.monotonic()
+        cached = self._room_cache
+        if cached is not None and now - self._room_cache_at < self.room_cache_seconds:
+            return dict(cached, cached=True)
+
+        try:
+            rooms = self._loop.run(rooms_api.list_rooms(), timeout=rooms_api.timeout + 1)
+        except Exception as e:
+            logger.error(f"Failed to list rooms: {e}")
+            return {"error": f"failed to list rooms: {e}", "rooms": []}
+
+        result = {
+            "status": "success",
+            "rooms": [
+                {
+                    "name": r.name,
+                    "sid": r.sid,
+                    "num_participants": r.num_participants,
+                    "max_participants": r.max_participants,
+                    "creation_time": r.creation_time,
+                }
+                for r in rooms
+            ],
         }
+        self._room_cache, self._room_cache_at = result, now
+        return dict(result, cached=False)
 
     def delete_room(self, room_name: str) -> Dict[str, Any]:
-        """Delete a room (simplified version)."""
-        if not self.client or not self.api_key or not self.api_secret:
+        """Delete a room."""
+        rooms_api = self._room_service()
+        if not rooms_api:
             return {"error": "LiveKit not configured"}
-        
-        # For Flask sync context, recommend using dashboard
-        return {
-            "status": "info",
-            "message": "Room deletion requires async context. Use LiveKit dashboard to delete rooms.",
-            "dashboard_url": "https://cloud.livekit.io/",
-            "room_name": room_name
-        }
+
+        try:
+            self._loop.run(rooms_api.delete_room(room_name), timeout=rooms_api.timeout + 1)
+        except Exception as e:
+            logger.error(f"Failed to delete room {room_name}: {e}")
+            return {"error": f"failed to delete room: {e}", "room_name": room_name}
+        finally:
+            self._room_cache = None
+
+        return {"status": "success", "room_name": room_name}
 
     def placeholder(self) -> Dict[str, Any]:
         """Return a placeholder response (used for local testing)."""
@@ -0,0 +1,72 @@
+"""
+LiveKit RoomService access on a dedicated background event loop.
+
+Room management goes through the server SDK (`livekit.api.LiveKitAPI`), which
+signs admin tokens and speaks the Twirp protocol. The SDK client and its HTTP
+connection pool are created once, on a background loop thread, and reused for
+every call. Flask routes reach it through the synchronous `run` bridge.
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Any, Coroutine, List, Optional
+
+try:
+    import aiohttp
+    from livekit import api
+    LIVEKIT_API_AVAILABLE = True
+except ImportError:
+    LIVEKIT_API_AVAILABLE = False
+
+logger = logging.getLogger("livekit")
+
+
+class BackgroundLoop:
+    """An asyncio event loop running forever on a daemon thread."""
+
+    def __init__(self, name: str = "livekit-api"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the loop and block the calling (sync) thread for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+
+class RoomServiceClient:
+    """Long-lived SDK client for the LiveKit RoomService; use only from its background loop."""
+
+    def __init__(self, url: str, api_key: str, api_secret: str, timeout: float = 5.0):
+        if not LIVEKIT_API_AVAILABLE:
+            raise RuntimeError("livekit-api is required for LiveKit room management")
+        self.url = url
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.timeout = timeout
+        self._api: Optional["api.LiveKitAPI"] = None
+
+    def _client(self) -> "api.LiveKitAPI":
+        # Created lazily so its HTTP session belongs to the loop it is used on
+        if self._api is None:
+            self._api = api.LiveKitAPI(
+                self.url, self.api_key, self.api_secret, timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._api
+
+    async def list_rooms(self, names: Optional[List[str]] = None) -> List["api.Room"]:
+        response = await self._client().room.list_rooms(api.ListRoomsRequest(names=names or []))
+        return list(response.rooms)
+
+    async def delete_room(self, room_name: str) -> None:
+        await self._client().room.delete_room(api.DeleteRoomRequest(room=room_name))
+
+    async def close(self):
+        if self._api is not None:
+            await self._api.aclose()
+            self._api = None
@@ -0,0 +1,96 @@
+"""
+Schema migrations.
+
+The schema is managed by the Alembic chain in backend/alembic and upgraded
+by an explicit command, never at process start:
+
+    python -m backend.migrations      (or: alembic upgrade head)
+
+`upgrade_database` runs the chain programmatically; `check_schema` only
+reports whether a database is behind. Revisions carry their own DDL; the
+helpers here are for data steps that revisions share, and only touch the
+columns they name (never the current models).
+"""
+
+import logging
+import os
+from typing import Set, Tuple
+
+import sqlalchemy as sa
+from alembic import command
+from alembic.config import Config as AlembicConfig
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy.engine import Engine
+
+from .services.kb_search import question_hash
+
+logger = logging.getLogger("migrations")
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+
+
+def backfill_question_hash(engine: Engine, batch_size: int = 500, table_name: str = "knowledge_base") -> int:
+    """Populate `table_name`.question_hash for rows written before the column existed, one batch per transaction."""
+    table = sa.table(table_name, sa.column("id"), sa.column("question_text"), sa.column("question_hash"))
+    updated = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                sa.select(table.c.id, table.c.question_text)
+                .where(table.c.question_hash.is_(None))
+                .limit(batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            conn.execute(
+                table.update().where(table.c.id == sa.bindparam("row_id")).values(question_hash=sa.bindparam("qhash")),
+                [{"row_id": r.id, "qhash": question_hash(r.question_text or "")} for r in rows],
+            )
+        updated += len(rows)
+    if updated:
+        logger.info(f"backfilled question_hash for {updated} {table_name} rows")
+    return updated
+
+
+def alembic_config() -> AlembicConfig:
+    cfg = AlembicConfig(ALEMBIC_INI)
+    # Keep the caller's logging setup
+    cfg.attributes["configure_logger"] = False
+    return cfg
+
+
+def upgrade_database(engine: Engine, revision: str = "head"):
+    """Run the Alembic chain against `engine` up to `revision`."""
+    cfg = alembic_config()
+    with engine.connect() as conn:
+        cfg.attributes["connection"] = conn
+        command.upgrade(cfg, revision)
+        conn.commit()
+
+
+def schema_revisions(engine: Engine) -> Tuple[Set[str], Set[str]]:
+    """(revisions the database is at, head revisions of the chain)."""
+    with engine.connect() as conn:
+        current = set(MigrationContext.configure(conn).get_current_heads())
+    return current, set(ScriptDirectory.from_config(alembic_config()).get_heads())
+
+
+def check_schema(engine: Engine) -> bool:
+    """Log a warning (instead of migrating) when the database is not at the head revision."""
+    current, heads = schema_revisions(engine)
+    if current == heads:
+        return True
+    logger.warning(
+        "database schema is at %s but the code expects %s; run `python -m backend.migrations`",
+        ", ".join(sorted(current)) or "no revision", ", ".join(sorted(heads)),
+    )
+    return False
+
+
+if __name__ == "__main__":
+    from .db import engine
+
+    logging.basicConfig(level=logging.INFO)
+    upgrade_database(engine)
+    print("Migrations complete.")
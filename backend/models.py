@@ -1,16 +1,20 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Float, Index, UniqueConstraint
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
 
+# Tenant (business location) assigned to rows written before multi-tenant support
+DEFAULT_TENANT = "default"
+
 
 class Customer(Base):
     __tablename__ = "customers"
 
     id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(String(64), index=True, default=DEFAULT_TENANT)
     name = Column(String(128))
-    phone = Column(String(64), unique=False)
+    phone = Column(String(64), unique=False, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     # Relationships
@@ -36,24 +40,92 @@ class HelpRequest(Base):
     __tablename__ = "help_requests"
 
     id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(String(64), index=True, default=DEFAULT_TENANT)
     customer_id = Column(Integer, ForeignKey("customers.id"))
     question_text = Column(Text)
+    # sha1 of the normalized question (see services.kb_search.question_hash), for coalescing
+    question_hash = Column(String(40), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     state = Column(String(32), default=HelpRequestState.PENDING)
     assigned_supervisor_id = Column(Integer, ForeignKey("supervisors.id"), nullable=True)
     response_text = Column(Text, nullable=True)
     response_at = Column(DateTime, nullable=True)
     timeout_at = Column(DateTime, nullable=True)
+    # While PENDING, assigned_supervisor_id is a claim that lapses at lease_expires_at
+    lease_expires_at = Column(DateTime, nullable=True, index=True)
+    # Higher is served first (see services.help_request_service.priority_key)
+    priority = Column(Float, nullable=True)
+
+    __table_args__ = (
+        Index("ix_help_requests_state_priority", "state", "priority"),
+        Index("ix_help_requests_state_timeout_at", "state", "timeout_at"),
+        Index("ix_help_requests_state_created_at", "state", "created_at"),
+        Index("ix_help_requests_tenant_state_hash", "tenant_id", "state", "question_hash"),
+    )
 
     # Relationships
     customer = relationship("Customer", back_populates="requests")
+    subscribers = relationship("HelpRequestSubscriber", back_populates="help_request")
+
+
+class HelpRequestEvent(Base):
+    """Append-only log of help-request state transitions; `seq` only ever increases."""
+    __tablename__ = "help_request_events"
+    # AUTOINCREMENT so SQLite never reuses a sequence number
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    help_request_id = Column(Integer, index=True)
+    tenant_id = Column(String(64), index=True, default=DEFAULT_TENANT)
+    event_type = Column(String(32))
+    from_state = Column(String(32), nullable=True)
+    to_state = Column(String(32), nullable=True)
+    supervisor_id = Column(Integer, nullable=True)
+    # JSON object with event-specific details
+    data = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class HelpRequestArchive(Base):
+    """A closed help request moved out of `help_requests` by the retention job (same id)."""
+    __tablename__ = "help_requests_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    tenant_id = Column(String(64), index=True, default=DEFAULT_TENANT)
+    customer_id = Column(Integer)
+    question_text = Column(Text)
+    created_at = Column(DateTime)
+    state = Column(String(32))
+    assigned_supervisor_id = Column(Integer, nullable=True)
+    response_text = Column(Text, nullable=True)
+    response_at = Column(DateTime, nullable=True)
+    timeout_at = Column(DateTime, nullable=True)
+    # JSON list of coalesced subscriber customer ids
+    subscriber_customer_ids = Column(Text, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
+class HelpRequestSubscriber(Base):
+    """Another caller waiting on the same pending question (coalesced into one escalation)."""
+    __tablename__ = "help_request_subscribers"
+
+    id = Column(Integer, primary_key=True, index=True)
+    help_request_id = Column(Integer, ForeignKey("help_requests.id"), index=True)
+    customer_id = Column(Integer, ForeignKey("customers.id"))
+    question_text = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    help_request = relationship("HelpRequest", back_populates="subscribers")
 
 
 class KnowledgeBaseEntry(Base):
     __tablename__ = "knowledge_base"
 
     id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(String(64), index=True, default=DEFAULT_TENANT)
     question_text = Column(Text)
+    # sha1 of the normalized question (see services.kb_search.question_hash)
+    question_hash = Column(String(40), index=True, nullable=True)
     answer_text = Column(Text)
     source_request_id = Column(Integer, nullable=True)
     created_by = Column(String(128), nullable=True)
@@ -61,3 +133,53 @@ class KnowledgeBaseEntry(Base):
     version = Column(Integer, default=1)
     tags = Column(String(256), nullable=True)
     confidence = Column(String(16), nullable=True)
+    # Lookup hits, flushed in batches by services.kb_hits (not updated per call)
+    hit_count = Column(Integer, default=0)
+    last_hit_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_knowledge_base_tenant_hits", "tenant_id", "hit_count"),
+    )
+
+
+class KnowledgeBaseAlias(Base):
+    """Alternate phrasing of a KB question, kept when near-duplicate entries are merged."""
+    __tablename__ = "knowledge_base_aliases"
+
+    id = Column(Integer, primary_key=True, index=True)
+    entry_id = Column(Integer, ForeignKey("knowledge_base.id"), index=True)
+    question_text = Column(Text)
+    question_hash = Column(String(40), index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class StatsRollup(Base):
+    """Pre-aggregated outcome counters per tenant and hour/day bucket (UTC)."""
+    __tablename__ = "stats_rollups"
+    __table_args__ = (
+        UniqueConstraint("tenant_id", "granularity", "bucket_start", name="uq_stats_rollups_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(String(64), default=DEFAULT_TENANT)
+    granularity = Column(String(8))  # "hour" or "day"
+    bucket_start = Column(DateTime)
+    calls = Column(Integer, default=0)
+    kb_answered = Column(Integer, default=0)
+    escalated = Column(Integer, default=0)
+    coalesced = Column(Integer, default=0)
+    resolved = Column(Integer, default=0)
+    timed_out = Column(Integer, default=0)
+    resolution_seconds = Column(Float, default=0.0)
+
+
+class IdempotencyKey(Base):
+    """Stored response for an Idempotency-Key (see backend/idempotency.py); status_code is NULL while in progress."""
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(320), primary_key=True)
+    fingerprint = Column(String(40))
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, index=True)
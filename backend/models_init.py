@@ -1,7 +1,8 @@
 """
-Helper to create all tables when imported.
+Helper that reports (without changing anything) whether the database schema is
+at the Alembic head; upgrade with `python -m backend.migrations`.
 """
 from .db import engine
-from .models import Base
+from .migrations import check_schema
 
-Base.metadata.create_all(bind=engine)
+check_schema(engine)
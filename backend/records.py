@@ -0,0 +1,100 @@
+"""
+Immutable read models returned by the service layer.
+
+Services load these with explicit column selects (`db.query(*Record.columns())`)
+instead of returning ORM instances after the session closes. A record is a
+frozen dataclass with `__slots__`: no identity map, no instrumentation, no
+lazy relationships that query (or raise) once detached, and a fraction of the
+per-row memory. `dataclasses.replace` derives a changed copy.
+
+`__slots__` is spelled out (rather than `dataclass(slots=True)`) so the
+records work on every supported Python; fields therefore have no defaults.
+"""
+
+from dataclasses import dataclass, fields
+from datetime import datetime
+from typing import Any, ClassVar, Optional, Tuple
+
+from .models import Customer, HelpRequest, KnowledgeBaseEntry
+
+
+class _Record:
+    __slots__ = ()
+    model: ClassVar[Any] = None
+
+    @classmethod
+    def columns(cls) -> Tuple[Any, ...]:
+        """Model columns in field order, for `db.query(*Record.columns())`."""
+        cached = cls.__dict__.get("_columns")
+        if cached is None:
+            cached = tuple(getattr(cls.model, f.name) for f in fields(cls))
+            setattr(cls, "_columns", cached)
+        return cached
+
+    @classmethod
+    def from_row(cls, row):
+        """Build from a row selected with `columns()`."""
+        return cls(*row)
+
+    @classmethod
+    def from_orm(cls, obj):
+        """Copy the fields off an ORM instance (only while its session is open)."""
+        return cls(*(getattr(obj, f.name) for f in fields(cls)))
+
+
+@dataclass(frozen=True)
+class CustomerRecord(_Record):
+    __slots__ = ("id", "tenant_id", "name", "phone", "created_at")
+    model: ClassVar[Any] = Customer
+
+    id: int
+    tenant_id: str
+    name: Optional[str]
+    phone: Optional[str]
+    created_at: Optional[datetime]
+
+
+@dataclass(frozen=True)
+class HelpRequestRecord(_Record):
+    __slots__ = (
+        "id", "tenant_id", "customer_id", "question_text", "created_at", "state",
+        "assigned_supervisor_id", "response_text", "response_at", "timeout_at",
+        "lease_expires_at", "priority",
+    )
+    model: ClassVar[Any] = HelpRequest
+
+    id: int
+    tenant_id: str
+    customer_id: int
+    question_text: Optional[str]
+    created_at: Optional[datetime]
+    state: str
+    assigned_supervisor_id: Optional[int]
+    response_text: Optional[str]
+    response_at: Optional[datetime]
+    timeout_at: Optional[datetime]
+    lease_expires_at: Optional[datetime]
+    priority: Optional[float]
+
+
+@dataclass(frozen=True)
+class KBEntryRecord(_Record):
+    __slots__ = (
+        "id", "tenant_id", "question_text", "question_hash", "answer_text", "source_request_id",
+        "created_by", "created_at", "version", "tags", "confidence", "hit_count", "last_hit_at",
+    )
+    model: ClassVar[Any] = KnowledgeBaseEntry
+
+    id: int
+    tenant_id: str
+    question_text: Optional[str]
+    question_hash: Optional[str]
+    answer_text: Optional[str]
+    source_request_id: Optional[int]
+    created_by: Optional[str]
+    created_at: Optional[datetime]
+    version: Optional[int]
+    tags: Optional[str]
+    confidence: Optional[str]
+    hit_count: Optional[int]
+    last_hit_at: Optional[datetime]
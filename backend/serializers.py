@@ -0,0 +1,162 @@
+"""
+Shared row serializers and the optional orjson JSON provider.
+
+A `RowSerializer` is a fixed list of fields (attribute name plus an optional
+converter, e.g. datetimes to ISO strings, and an optional output key when it
+differs from the attribute). It only reads attributes, so the
+same serializer handles ORM instances, `Row` tuples from a column-projected
+query (`db.query(*serializer.columns)`) and `__slots__` records. Listings
+project just these columns and skip building ORM instances.
+
+With orjson installed (and JSON_USE_ORJSON on), `OrjsonProvider` replaces
+Flask's stdlib JSON encoder for responses.
+"""
+
+import json
+from datetime import date, datetime
+from operator import attrgetter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from flask.json.provider import DefaultJSONProvider
+
+from .models import HelpRequest, HelpRequestEvent, KnowledgeBaseEntry
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+Field = Union[
+    str,
+    Tuple[str, Optional[Callable[[Any], Any]]],
+    # (attribute, converter, output key)
+    Tuple[str, Optional[Callable[[Any], Any]], str],
+]
+
+
+def iso(value: Optional[Union[date, datetime]]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def zero_if_none(value: Optional[int]) -> int:
+    return value or 0
+
+
+def json_object(value: Optional[str]) -> Dict[str, Any]:
+    return json.loads(value) if value else {}
+
+
+class RowSerializer:
+    """Maps a row (anything with the field attributes) to a JSON-ready dict."""
+
+    __slots__ = ("names", "keys", "columns", "_get", "_converters")
+
+    def __init__(self, model, fields: Sequence[Field]):
+        specs = [(f, None) if isinstance(f, str) else f for f in fields]
+        self.names: Tuple[str, ...] = tuple(spec[0] for spec in specs)
+        self.keys: Tuple[str, ...] = tuple(spec[2] if len(spec) > 2 else spec[0] for spec in specs)
+        # Model columns to select for a projected query
+        self.columns = tuple(getattr(model, name) for name in self.names)
+        getter = attrgetter(*self.names)
+        # attrgetter returns a bare value for a single name; keep it a tuple
+        self._get = getter if len(self.names) > 1 else (lambda row: (getter(row),))
+        self._converters = tuple(spec[1] for spec in specs)
+
+    def __call__(self, row) -> Dict[str, Any]:
+        return {
+            key: convert(value) if convert else value
+            for key, convert, value in zip(self.keys, self._converters, self._get(row))
+        }
+
+    def many(self, rows: Iterable) -> List[Dict[str, Any]]:
+        return [self(row) for row in rows]
+
+
+HELP_REQUEST = RowSerializer(HelpRequest, [
+    "id",
+    "tenant_id",
+    "customer_id",
+    "question_text",
+    ("created_at", iso),
+    "state",
+    "response_text",
+])
+
+HELP_REQUEST_CLAIMED = RowSerializer(HelpRequest, [
+    "id",
+    "tenant_id",
+    "customer_id",
+    "question_text",
+    ("created_at", iso),
+    ("timeout_at", iso),
+    ("lease_expires_at", iso),
+])
+
+KB_ENTRY = RowSerializer(KnowledgeBaseEntry, [
+    "id",
+    "question_text",
+    "answer_text",
+    "source_request_id",
+    "created_by",
+    ("created_at", iso),
+    "version",
+    "tags",
+    "confidence",
+    ("hit_count", zero_if_none),
+    ("last_hit_at", iso),
+])
+
+HELP_REQUEST_EVENT = RowSerializer(HelpRequestEvent, [
+    "seq",
+    ("help_request_id", None, "request_id"),
+    "tenant_id",
+    ("event_type", None, "type"),
+    "from_state",
+    "to_state",
+    "supervisor_id",
+    ("data", json_object),
+    ("created_at", iso),
+])
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson. Keys are sorted like the default
+    provider; types orjson doesn't handle fall back to `DefaultJSONProvider.default`.
+    Unlike the default provider, datetimes are encoded as ISO 8601 (routes
+    already send ISO strings). `indent=2` and `sort_keys` map to orjson options;
+    any other `json.dumps`/`json.loads` argument falls back to the default provider.
+    """
+
+    option = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS if ORJSON_AVAILABLE else 0
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        option = self._dumps_option(kwargs)
+        if option is None:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=option).decode("utf-8")
+
+    def _dumps_option(self, kwargs: Dict[str, Any]) -> Optional[int]:
+        """orjson option for `dumps` arguments, or None if orjson can't honour them."""
+        option = self.option
+        for name, value in kwargs.items():
+            if name == "sort_keys":
+                option = option | orjson.OPT_SORT_KEYS if value else option & ~orjson.OPT_SORT_KEYS
+            elif name == "indent" and value in (None, 2):
+                option |= orjson.OPT_INDENT_2 if value else 0
+            else:
+                return None
+        return option
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=self.option) + b"\n",
+            mimetype=self.mimetype,
+        )
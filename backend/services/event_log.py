@@ -0,0 +1,141 @@
+"""
+Change stream of help-request state transitions.
+
+Every state change writes a `HelpRequestEvent` row in the same transaction
+as the change itself, so the log never disagrees with `help_requests`.
+Consumers tail it with `list_events(after=seq)`, an indexed range scan on the
+primary key; `wait_seconds` long-polls until this process commits a new event.
+Resuming from the last seq seen is only safe if events become visible in
+seq order. Sequence numbers are assigned at insert time, not at commit. On
+SQLite this holds because one writer holds the database lock from its first
+write until commit. On PostgreSQL a transaction could take seq N+1 and commit
+before N, and a consumer that had already moved past N+1 would skip N. So
+each event-writing transaction first takes a transaction-scoped advisory lock
+(`_order_writers`), which makes commit order match seq order. Other databases
+are rejected instead of silently losing events.
+"""
+
+import json
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..db import SessionLocal
+from ..models import HelpRequest, HelpRequestEvent
+from ..records import HelpRequestRecord
+from ..serializers import HELP_REQUEST_EVENT
+
+# Event types
+CREATED = "created"
+JOINED = "joined"
+CLAIMED = "claimed"
+RELEASED = "released"
+RESOLVED = "resolved"
+UNRESOLVED = "unresolved"
+TIMED_OUT = "timed_out"
+ARCHIVED = "archived"
+
+_new_events = threading.Condition()
+_last_published = 0
+
+# pg_advisory_xact_lock key held by event-writing transactions on PostgreSQL
+WRITER_LOCK_KEY = 0x6576656E74  # "event"
+_LOCKED_TXN = "event_log_locked_txn"
+
+
+def _order_writers(db: Session):
+    """Make this transaction's events commit in seq order relative to other writers."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        return
+    if dialect != "postgresql":
+        raise RuntimeError(f"the help-request event log needs commit-ordered seq values; {dialect} is not supported")
+    txn = db.get_transaction()
+    if txn is None or db.info.get(_LOCKED_TXN) is not txn:
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": WRITER_LOCK_KEY})
+        db.info[_LOCKED_TXN] = db.get_transaction()
+
+
+def record_event(
+    db: Session,
+    hr: Union[HelpRequest, HelpRequestRecord],
+    event_type: str,
+    from_state: Optional[str],
+    supervisor_id: Optional[int] = None,
+    **data: Any,
+) -> HelpRequestEvent:
+    """Add an event for `hr` (already in its new state) to the caller's transaction."""
+    _order_writers(db)
+    event = HelpRequestEvent(
+        help_request_id=hr.id,
+        tenant_id=hr.tenant_id,
+        event_type=event_type,
+        from_state=from_state,
+        to_state=hr.state,
+        supervisor_id=supervisor_id,
+        data=json.dumps(data) if data else None,
+    )
+    db.add(event)
+    return event
+
+
+def record_events(
+    db: Session,
+    requests: Iterable[Union[HelpRequest, HelpRequestRecord]],
+    event_type: str,
+    from_state: Optional[str],
+    **kwargs: Any,
+):
+    for hr in requests:
+        record_event(db, hr, event_type, from_state, **kwargs)
+
+
+def publish():
+    """Wake long-polling readers after a commit that added events."""
+    global _last_published
+    with _new_events:
+        _last_published += 1
+        _new_events.notify_all()
+
+
+def event_to_dict(event: HelpRequestEvent) -> Dict[str, Any]:
+    return HELP_REQUEST_EVENT(event)
+
+
+class EventLogService:
+    """Read side of the help-request event log."""
+
+    def __init__(self, db_session_factory=SessionLocal):
+        self.db_session_factory = db_session_factory
+
+    def list_events(
+        self,
+        after: int = 0,
+        limit: int = 100,
+        tenant_id: Optional[str] = None,
+        request_id: Optional[int] = None,
+        wait_seconds: float = 0,
+    ) -> List[Dict[str, Any]]:
+        """Events with seq > `after`, oldest first. Waits up to `wait_seconds` if there are none yet."""
+        with _new_events:
+            seen = _last_published
+        events = self._query(after, limit, tenant_id, request_id)
+        if events or wait_seconds <= 0:
+            return events
+        with _new_events:
+            _new_events.wait_for(lambda: _last_published != seen, timeout=wait_seconds)
+        return self._query(after, limit, tenant_id, request_id)
+
+    def _query(self, after, limit, tenant_id, request_id) -> List[Dict[str, Any]]:
+        db = self.db_session_factory()
+        try:
+            q = db.query(*HELP_REQUEST_EVENT.columns).filter(HelpRequestEvent.seq > after)
+            if tenant_id:
+                q = q.filter(HelpRequestEvent.tenant_id == tenant_id)
+            if request_id is not None:
+                q = q.filter(HelpRequestEvent.help_request_id == request_id)
+            return HELP_REQUEST_EVENT.many(q.order_by(HelpRequestEvent.seq).limit(limit))
+        finally:
+            db.close()
@@ -1,9 +1,120 @@
-from typing import Optional
+from typing import Optional, Dict, List, Tuple
 from datetime import datetime, timedelta
+import threading
+from sqlalchemy import and_, func, or_, select, update
 from sqlalchemy.orm import Session
-from ..models import HelpRequest, HelpRequestState
+from ..models import DEFAULT_TENANT, Customer, HelpRequest, HelpRequestState, HelpRequestSubscriber, Supervisor
 from ..db import SessionLocal
 from ..config import Config
+from ..records import HelpRequestRecord
+from . import event_log
+from .stats_service import get_stats_recorder
+from .kb_search import KBSearchIndex, lexical_ratio, normalize_question, question_hash
+
+# Serialize match-then-create per tenant so concurrent callers in this process coalesce
+_coalesce_locks: Dict[str, threading.Lock] = {}
+_coalesce_locks_guard = threading.Lock()
+
+# Pending-question trigram candidates at or above this Jaccard get the edit-distance score
+COALESCE_MIN_TRIGRAM_JACCARD = 0.5
+
+# Work-queue order: highest priority first (served by the (state, priority) index)
+CLAIM_ORDER = (HelpRequest.priority.desc(),)
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _epoch_seconds(value: datetime) -> float:
+    return (value - _EPOCH).total_seconds()
+
+
+def priority_key(timeout_at: datetime, repeat_count: int, waiting_callers: int) -> float:
+    """
+    Stored priority of a request (higher is served first): credit for repeat
+    callers and extra waiting callers, minus the deadline. Time-to-timeout
+    shrinks at the same rate for every request, so ordering by this value
+    never goes stale; `priority_score` adds the current time back.
+    """
+    return (
+        repeat_count * Config.PRIORITY_REPEAT_CALLER_SECONDS
+        + max(waiting_callers - 1, 0) * Config.PRIORITY_WAITING_CALLER_SECONDS
+        - _epoch_seconds(timeout_at)
+    )
+
+
+def priority_score(hr, now: Optional[datetime] = None) -> Optional[float]:
+    """Current score: credit seconds minus seconds left until timeout."""
+    if hr.priority is None:
+        return None
+    return round(hr.priority + _epoch_seconds(now or datetime.utcnow()), 1)
+
+
+def recompute_priorities(db: Session, requests: List[HelpRequest]):
+    """Set `priority` on the given requests from their deadline, caller history and subscribers."""
+    if not requests:
+        return
+    ids = [hr.id for hr in requests]
+    waiting = dict(
+        db.query(HelpRequestSubscriber.help_request_id, func.count(HelpRequestSubscriber.id))
+        .filter(HelpRequestSubscriber.help_request_id.in_(ids))
+        .group_by(HelpRequestSubscriber.help_request_id)
+    )
+    for hr in requests:
+        prior = db.query(func.count(HelpRequest.id)).filter(
+            HelpRequest.customer_id == hr.customer_id, HelpRequest.id < hr.id
+        ).scalar()
+        deadline = hr.timeout_at or (hr.created_at + timedelta(seconds=Config.SUPERVISOR_TTL_SECONDS))
+        hr.priority = priority_key(deadline, prior, 1 + waiting.get(hr.id, 0))
+
+
+def _coalesce_lock(tenant_id: str) -> threading.Lock:
+    lock = _coalesce_locks.get(tenant_id)
+    if lock is None:
+        with _coalesce_locks_guard:
+            lock = _coalesce_locks.setdefault(tenant_id, threading.Lock())
+    return lock
+
+
+class _PendingQuestions:
+    """
+    Trigram index over one tenant's PENDING questions. `sync` reconciles it
+    with the database by id, so only questions new since the last call are
+    read and indexed.
+    """
+
+    SYNC_BATCH_SIZE = 500
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index = KBSearchIndex()
+        self.created_at: Dict[int, datetime] = {}
+
+    def sync(self, db: Session, tenant_id: str):
+        self.created_at = dict(
+            db.query(HelpRequest.id, HelpRequest.created_at)
+            .filter(HelpRequest.state == HelpRequestState.PENDING, HelpRequest.tenant_id == tenant_id)
+        )
+        for request_id in [k for k in self.index.docs if k not in self.created_at]:
+            self.index.remove(request_id)
+        new_ids = [k for k in self.created_at if k not in self.index.docs]
+        for start in range(0, len(new_ids), self.SYNC_BATCH_SIZE):
+            batch = new_ids[start:start + self.SYNC_BATCH_SIZE]
+            for request_id, question in db.query(HelpRequest.id, HelpRequest.question_text).filter(
+                HelpRequest.id.in_(batch)
+            ):
+                self.index.add(request_id, question or "")
+
+
+def _claimable(now: datetime):
+    """PENDING and not held by a live lease."""
+    return and_(
+        HelpRequest.state == HelpRequestState.PENDING,
+        or_(
+            HelpRequest.assigned_supervisor_id.is_(None),
+            HelpRequest.lease_expires_at.is_(None),
+            HelpRequest.lease_expires_at < now,
+        ),
+    )
 
 
 class HelpRequestService:
@@ -11,88 +122,406 @@ class HelpRequestService:
 
     def __init__(self, db_session_factory=SessionLocal):
         self.db_session_factory = db_session_factory
+        self.coalesce_threshold = Config.HELP_COALESCE_THRESHOLD
+        self.stats = get_stats_recorder(db_session_factory)
+        self._pending_lock = threading.Lock()
+        self._pending: Dict[str, _PendingQuestions] = {}
 
-    def create_help_request(self, customer_id: int, question_text: str) -> HelpRequest:
+    def _records(self, db: Session):
+        """Query selecting just the HelpRequestRecord columns."""
+        return db.query(*HelpRequestRecord.columns())
+
+    def _load(self, db: Session, request_id: int) -> Optional[HelpRequestRecord]:
+        row = self._records(db).filter(HelpRequest.id == request_id).first()
+        return HelpRequestRecord.from_row(row) if row else None
+
+    def create_help_request(
+        self, customer_id: int, question_text: str, tenant_id: str = DEFAULT_TENANT
+    ) -> HelpRequestRecord:
         """Create a new help request for a customer."""
         db: Session = self.db_session_factory()
         try:
             timeout_at = datetime.utcnow() + timedelta(seconds=Config.SUPERVISOR_TTL_SECONDS)
+            prior = db.query(func.count(HelpRequest.id)).filter(HelpRequest.customer_id == customer_id).scalar()
             hr = HelpRequest(
+                tenant_id=tenant_id,
                 customer_id=customer_id,
                 question_text=question_text,
+                question_hash=question_hash(question_text),
                 state=HelpRequestState.PENDING,
-                timeout_at=timeout_at
+                timeout_at=timeout_at,
+                priority=priority_key(timeout_at, prior, 1),
             )
             db.add(hr)
+            db.flush()
+            event_log.record_event(db, hr, event_log.CREATED, None, customer_id=customer_id)
             db.commit()
-            db.refresh(hr)
-            return hr
+            event_log.publish()
+            self.stats.add(tenant_id, escalated=1)
+            return self._load(db, hr.id)
+        finally:
+            db.close()
+
+    def create_or_join_help_request(
+        self, customer_id: int, question_text: str, tenant_id: str = DEFAULT_TENANT
+    ) -> Tuple[HelpRequestRecord, bool]:
+        """
+        Coalesce duplicate escalations.
+        If a PENDING request of the same tenant asks (nearly) the same question,
+        subscribe the customer to it instead of creating a new one.
+        Returns (help_request, created).
+        """
+        with _coalesce_lock(tenant_id):
+            match = self.find_pending_match(question_text, tenant_id)
+            if match is None:
+                return self.create_help_request(customer_id, question_text, tenant_id), True
+
+            db: Session = self.db_session_factory()
+            try:
+                if match.customer_id != customer_id:
+                    already = db.query(HelpRequestSubscriber).filter(
+                        HelpRequestSubscriber.help_request_id == match.id,
+                        HelpRequestSubscriber.customer_id == customer_id,
+                    ).first()
+                    if not already:
+                        db.add(HelpRequestSubscriber(
+                            help_request_id=match.id,
+                            customer_id=customer_id,
+                            question_text=question_text,
+                        ))
+                        # One more caller waiting: move the request up the queue
+                        db.query(HelpRequest).filter(HelpRequest.id == match.id).update(
+                            {HelpRequest.priority: HelpRequest.priority + Config.PRIORITY_WAITING_CALLER_SECONDS},
+                            synchronize_session=False,
+                        )
+                        event_log.record_event(db, match, event_log.JOINED, match.state, customer_id=customer_id)
+                        db.commit()
+                        event_log.publish()
+                        self.stats.add(tenant_id, coalesced=1)
+                return match, False
+            finally:
+                db.close()
+
+    def _pending_for(self, tenant_id: str) -> _PendingQuestions:
+        pending = self._pending.get(tenant_id)
+        if pending is None:
+            with self._pending_lock:
+                pending = self._pending.setdefault(tenant_id, _PendingQuestions())
+        return pending
+
+    def find_pending_match(self, question_text: str, tenant_id: str = DEFAULT_TENANT) -> Optional[HelpRequestRecord]:
+        """
+        Oldest PENDING request of the tenant whose question is similar enough to join.
+        The same normalized question is found by hash; otherwise only trigram
+        candidates from the tenant's pending index get the edit-distance score.
+        """
+        db = self.db_session_factory()
+        try:
+            exact = (
+                db.query(HelpRequest.id)
+                .filter(
+                    HelpRequest.tenant_id == tenant_id,
+                    HelpRequest.state == HelpRequestState.PENDING,
+                    HelpRequest.question_hash == question_hash(question_text),
+                )
+                .order_by(HelpRequest.created_at)
+                .first()
+            )
+            if exact:
+                return self._load(db, exact.id)
+
+            text = normalize_question(question_text)
+            pending = self._pending_for(tenant_id)
+            with pending.lock:
+                pending.sync(db, tenant_id)
+                candidates = [
+                    request_id
+                    for request_id, jaccard in pending.index.candidates(question_text, len(pending.index))
+                    if jaccard >= COALESCE_MIN_TRIGRAM_JACCARD
+                ]
+                candidates.sort(key=lambda request_id: (pending.created_at[request_id] or _EPOCH, request_id))
+                for request_id in candidates:
+                    if lexical_ratio(text, pending.index.docs[request_id].text) >= self.coalesce_threshold:
+                        return self._load(db, request_id)
+            return None
+        finally:
+            db.close()
+
+    def waiting_callers(self, request_id: int) -> List[Dict[str, str]]:
+        """Every customer waiting on a request: the original caller plus coalesced subscribers."""
+        db = self.db_session_factory()
+        try:
+            owner = db.query(HelpRequest.customer_id).filter(HelpRequest.id == request_id).first()
+            if not owner:
+                return []
+            customer_ids = [owner.customer_id] + [
+                cid for (cid,) in db.query(HelpRequestSubscriber.customer_id)
+                .filter(HelpRequestSubscriber.help_request_id == request_id)
+                .order_by(HelpRequestSubscriber.id)
+            ]
+            customers = {
+                c.id: c for c in db.query(Customer.id, Customer.name, Customer.phone)
+                .filter(Customer.id.in_(set(customer_ids)))
+            }
+            callers, seen = [], set()
+            for cid in customer_ids:
+                cust = customers.get(cid)
+                if cust and cid not in seen:
+                    seen.add(cid)
+                    callers.append({"name": cust.name, "phone": cust.phone})
+            return callers
         finally:
             db.close()
 
-    def get_request(self, request_id: int) -> Optional[HelpRequest]:
+    def get_request(self, request_id: int) -> Optional[HelpRequestRecord]:
         """Retrieve a help request by ID."""
         db = self.db_session_factory()
         try:
-            return db.query(HelpRequest).filter(HelpRequest.id == request_id).first()
+            return self._load(db, request_id)
         finally:
             db.close()
 
-    def list_requests(self, state: Optional[str] = None):
-        """List all help requests, optionally filtered by state."""
+    def list_requests(self, state: Optional[str] = None, tenant_id: Optional[str] = None) -> List[HelpRequestRecord]:
+        """
+        List all help requests, optionally filtered by state and tenant.
+        Pending requests come highest priority first; other views newest first.
+        """
         db = self.db_session_factory()
         try:
-            q = db.query(HelpRequest).order_by(HelpRequest.created_at.desc())
+            q = self._records(db)
+            if state == HelpRequestState.PENDING:
+                q = q.order_by(*CLAIM_ORDER)
+            else:
+                q = q.order_by(HelpRequest.created_at.desc())
             if state:
                 q = q.filter(HelpRequest.state == state)
-            return q.all()
+            if tenant_id:
+                q = q.filter(HelpRequest.tenant_id == tenant_id)
+            return [HelpRequestRecord.from_row(row) for row in q]
         finally:
             db.close()
 
-    def resolve_request(self, request_id: int, response_text: str, supervisor_id: Optional[int] = None):
-        """Resolve a help request with a supervisor response."""
+    def resolve_request(
+        self, request_id: int, response_text: str, supervisor_id: Optional[int] = None
+    ) -> Optional[HelpRequestRecord]:
+        """
+        Resolve a PENDING help request with a supervisor response.
+        Only allowed while nobody else holds a live lease on it: it must be
+        unclaimed, claimed by `supervisor_id`, or its lease must have expired.
+        The check and the write are one conditional UPDATE, so a concurrent
+        resolve or timeout can't be overwritten.
+        Returns None if the request doesn't exist or can't be resolved.
+        """
         db = self.db_session_factory()
         try:
-            hr = db.query(HelpRequest).filter(HelpRequest.id == request_id).first()
-            if not hr:
+            now = datetime.utcnow()
+            resolvable = and_(
+                HelpRequest.id == request_id,
+                or_(
+                    _claimable(now),
+                    and_(
+                        HelpRequest.state == HelpRequestState.PENDING,
+                        HelpRequest.assigned_supervisor_id == supervisor_id,
+                    ),
+                ),
+            )
+            resolved = db.execute(
+                update(HelpRequest)
+                .where(resolvable)
+                .values(
+                    state=HelpRequestState.RESOLVED,
+                    response_text=response_text,
+                    response_at=now,
+                    assigned_supervisor_id=supervisor_id,
+                    lease_expires_at=None,
+                )
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not resolved:
+                db.rollback()
                 return None
-            hr.state = HelpRequestState.RESOLVED
-            hr.response_text = response_text
-            hr.response_at = datetime.utcnow()
-            hr.assigned_supervisor_id = supervisor_id
+            hr = self._load(db, request_id)
+            event_log.record_event(db, hr, event_log.RESOLVED, HelpRequestState.PENDING, supervisor_id=supervisor_id)
             db.commit()
-            db.refresh(hr)
+            event_log.publish()
+            self.stats.add(hr.tenant_id, resolved=1, resolution_seconds=(now - hr.created_at).total_seconds())
             return hr
         finally:
             db.close()
 
-    def mark_unresolved(self, request_id: int):
+    def claim_requests(
+        self,
+        supervisor_id: Optional[int] = None,
+        limit: int = 1,
+        lease_seconds: Optional[int] = None,
+        tenant_id: Optional[str] = None,
+    ) -> Tuple[Optional[int], List[HelpRequestRecord]]:
+        """
+        Atomically lease up to `limit` unclaimed PENDING requests to a supervisor,
+        highest priority first. Without `supervisor_id` the least-loaded
+        supervisor gets them; nobody holds more than CLAIM_MAX_ACTIVE_PER_SUPERVISOR
+        live leases (checked before the claim, so concurrent claims may briefly
+        overshoot by one batch).
+        The claim is a single UPDATE ... WHERE id IN (SELECT ... LIMIT n) RETURNING,
+        with FOR UPDATE SKIP LOCKED on PostgreSQL, so concurrent claimers never
+        receive the same request.
+        Returns (supervisor_id, claimed requests); supervisor_id is None if the
+        given supervisor does not exist or there are no supervisors.
+        """
+        lease_seconds = Config.CLAIM_LEASE_SECONDS if lease_seconds is None else lease_seconds
+        db = self.db_session_factory()
+        try:
+            now = datetime.utcnow()
+            loads = self._active_leases(db, now)
+            supervisor_ids = [sid for (sid,) in db.query(Supervisor.id).order_by(Supervisor.id)]
+            if supervisor_id is None:
+                if not supervisor_ids:
+                    return None, []
+                supervisor_id = min(supervisor_ids, key=lambda sid: (loads.get(sid, 0), sid))
+            elif supervisor_id not in supervisor_ids:
+                return None, []
+
+            limit = min(limit, Config.CLAIM_MAX_ACTIVE_PER_SUPERVISOR - loads.get(supervisor_id, 0))
+            if limit <= 0:
+                return supervisor_id, []
+
+            claimable = _claimable(now)
+            if tenant_id:
+                claimable = and_(claimable, HelpRequest.tenant_id == tenant_id)
+            pick = select(HelpRequest.id).where(claimable).order_by(*CLAIM_ORDER).limit(limit)
+            dialect = db.get_bind().dialect
+            if dialect.name == "postgresql":
+                pick = pick.with_for_update(skip_locked=True)
+
+            lease_expires_at = now + timedelta(seconds=lease_seconds)
+            stmt = (
+                update(HelpRequest)
+                .where(HelpRequest.id.in_(pick), claimable)
+                .values(assigned_supervisor_id=supervisor_id, lease_expires_at=lease_expires_at)
+                .execution_options(synchronize_session=False)
+            )
+            if dialect.update_returning:
+                claimed_ids = list(db.execute(stmt.returning(HelpRequest.id)).scalars())
+            else:
+                db.execute(stmt)
+                claimed_ids = [rid for (rid,) in db.query(HelpRequest.id).filter(
+                    HelpRequest.assigned_supervisor_id == supervisor_id,
+                    HelpRequest.lease_expires_at == lease_expires_at,
+                )]
+            if not claimed_ids:
+                db.commit()
+                return supervisor_id, []
+            claimed = [
+                HelpRequestRecord.from_row(row)
+                for row in self._records(db).filter(HelpRequest.id.in_(claimed_ids)).order_by(*CLAIM_ORDER)
+            ]
+            event_log.record_events(
+                db,
+                claimed,
+                event_log.CLAIMED,
+                HelpRequestState.PENDING,
+                supervisor_id=supervisor_id,
+                lease_expires_at=lease_expires_at.isoformat(),
+            )
+            db.commit()
+            event_log.publish()
+            return supervisor_id, claimed
+        finally:
+            db.close()
+
+    def _active_leases(self, db: Session, now: datetime) -> Dict[int, int]:
+        """supervisor_id -> number of PENDING requests it holds a live lease on."""
+        return dict(
+            db.query(HelpRequest.assigned_supervisor_id, func.count(HelpRequest.id))
+            .filter(
+                HelpRequest.state == HelpRequestState.PENDING,
+                HelpRequest.assigned_supervisor_id.isnot(None),
+                HelpRequest.lease_expires_at >= now,
+            )
+            .group_by(HelpRequest.assigned_supervisor_id)
+            .all()
+        )
+
+    def refresh_priorities(self, request_ids: List[int]):
+        """Recompute stored priorities, e.g. after a deadline was changed out of band."""
+        db = self.db_session_factory()
+        try:
+            recompute_priorities(db, db.query(HelpRequest).filter(HelpRequest.id.in_(request_ids)).all())
+            db.commit()
+        finally:
+            db.close()
+
+    def release_request(self, request_id: int, supervisor_id: int) -> bool:
+        """Give a claimed request back to the queue. Returns False if this supervisor doesn't hold it."""
+        db = self.db_session_factory()
+        try:
+            hr = db.query(HelpRequest).filter(
+                HelpRequest.id == request_id,
+                HelpRequest.state == HelpRequestState.PENDING,
+                HelpRequest.assigned_supervisor_id == supervisor_id,
+            ).first()
+            if not hr:
+                return False
+            hr.assigned_supervisor_id = None
+            hr.lease_expires_at = None
+            event_log.record_event(db, hr, event_log.RELEASED, hr.state, supervisor_id=supervisor_id)
+            db.commit()
+            event_log.publish()
+            return True
+        finally:
+            db.close()
+
+    def mark_unresolved(self, request_id: int) -> Optional[HelpRequestRecord]:
         """Mark a help request as unresolved."""
         db = self.db_session_factory()
         try:
             hr = db.query(HelpRequest).filter(HelpRequest.id == request_id).first()
             if not hr:
                 return None
+            from_state = hr.state
             hr.state = HelpRequestState.UNRESOLVED
+            event_log.record_event(db, hr, event_log.UNRESOLVED, from_state)
             db.commit()
-            db.refresh(hr)
-            return hr
+            event_log.publish()
+            return self._load(db, request_id)
         finally:
             db.close()
 
-    def check_and_mark_timeouts(self):
+    def check_and_mark_timeouts(self) -> List[HelpRequestRecord]:
         """
-        Check all pending requests and mark those that have timed out as unresolved.
+        Mark pending requests whose deadline has passed as unresolved.
+        One conditional UPDATE ... WHERE state = 'pending' (RETURNING the ids
+        where supported), so a request resolved concurrently is left alone.
         Returns a list of expired requests.
         """
         db = self.db_session_factory()
         try:
             now = datetime.utcnow()
-            pending = db.query(HelpRequest).filter(HelpRequest.state == HelpRequestState.PENDING).all()
-            expired = [r for r in pending if r.timeout_at and r.timeout_at < now]
-            for r in expired:
-                r.state = HelpRequestState.UNRESOLVED
+            overdue = and_(HelpRequest.state == HelpRequestState.PENDING, HelpRequest.timeout_at < now)
+            stmt = (
+                update(HelpRequest)
+                .where(overdue)
+                .values(state=HelpRequestState.UNRESOLVED)
+                .execution_options(synchronize_session=False)
+            )
+            if db.get_bind().dialect.update_returning:
+                expired_ids = list(db.execute(stmt.returning(HelpRequest.id)).scalars())
+            else:
+                expired_ids = [rid for (rid,) in db.query(HelpRequest.id).filter(overdue)]
+                if expired_ids:
+                    db.execute(stmt.where(HelpRequest.id.in_(expired_ids)))
+            if not expired_ids:
+                db.commit()
+                return []
+            expired = [
+                HelpRequestRecord.from_row(row)
+                for row in self._records(db).filter(HelpRequest.id.in_(expired_ids))
+            ]
+            event_log.record_events(db, expired, event_log.TIMED_OUT, HelpRequestState.PENDING)
             db.commit()
+            event_log.publish()
+            for r in expired:
+                self.stats.add(r.tenant_id, timed_out=1)
             return expired
         finally:
             db.close()
@@ -0,0 +1,105 @@
+"""
+Near-duplicate detection for KB questions.
+
+MinHash signatures over character trigrams, bucketed with LSH banding, give
+candidate pairs without comparing every question to every other one. Each
+candidate pair is then verified with the exact trigram Jaccard similarity and
+clusters are formed with union-find.
+"""
+
+import random
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set, Tuple
+
+from .kb_search import normalize_question, trigrams
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    union = len(a | b)
+    return len(a & b) / union if union else 1.0
+
+
+class MinHasher:
+    """Fixed-seed MinHash over sets of strings (deterministic across processes)."""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._perms = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, grams: Iterable[str]) -> Tuple[int, ...]:
+        hashes = [zlib.crc32(g.encode("utf-8")) for g in grams] or [0]
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._perms
+        )
+
+
+class LSHIndex:
+    """Bands MinHash signatures; items sharing any band bucket become candidate pairs."""
+
+    def __init__(self, num_perm: int = 64, bands: int = 16):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = defaultdict(list)
+
+    def add(self, key: int, signature: Tuple[int, ...]):
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows]
+            self.buckets[(band, chunk)].append(key)
+
+    def candidate_pairs(self) -> Set[Tuple[int, int]]:
+        pairs = set()
+        for keys in self.buckets.values():
+            if len(keys) < 2:
+                continue
+            for i, a in enumerate(keys):
+                for b in keys[i + 1:]:
+                    pairs.add((a, b) if a < b else (b, a))
+        return pairs
+
+
+def find_duplicate_clusters(
+    rows: Iterable[Tuple[int, str]],
+    threshold: float,
+    num_perm: int = 64,
+    bands: int = 16,
+) -> List[List[int]]:
+    """
+    Group (id, question) rows whose trigram Jaccard similarity is >= threshold.
+    Returns clusters of two or more ids, each sorted ascending.
+    """
+    hasher = MinHasher(num_perm)
+    lsh = LSHIndex(num_perm, bands)
+    grams: Dict[int, Set[str]] = {}
+    for key, question in rows:
+        grams[key] = trigrams(normalize_question(question))
+        lsh.add(key, hasher.signature(grams[key]))
+
+    parent = {key: key for key in grams}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in lsh.candidate_pairs():
+        if jaccard(grams[a], grams[b]) >= threshold:
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+
+    clusters: Dict[int, List[int]] = defaultdict(list)
+    for key in grams:
+        clusters[find(key)].append(key)
+    return [sorted(c) for c in clusters.values() if len(c) > 1]
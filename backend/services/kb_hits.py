@@ -0,0 +1,107 @@
+"""
+Per-entry KB hit counters.
+
+`find_answer` records the entry it returned here instead of updating the row
+on every call. Hits are summed in memory and written every
+KB_HIT_FLUSH_SECONDS by a background thread as one batched UPDATE that adds
+to `knowledge_base.hit_count` and sets `last_hit_at`, so no lookup waits on
+the write. Hits buffered since the last flush are lost if the process dies.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import bindparam, func
+
+from ..config import Config
+from ..db import SessionLocal
+from ..models import KnowledgeBaseEntry
+
+logger = logging.getLogger("kb")
+
+
+class KBHitRecorder:
+    """Buffers KB entry hits and flushes them in one executemany UPDATE."""
+
+    def __init__(self, db_session_factory=SessionLocal, flush_interval: float = Config.KB_HIT_FLUSH_SECONDS):
+        self.db_session_factory = db_session_factory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._hits: Counter = Counter()
+        self._last_hit: Dict[int, datetime] = {}
+        self._last_flush = time.monotonic()
+        self._flusher: Optional[threading.Thread] = None
+
+    def record(self, entry_id: int):
+        """Count one lookup answered by `entry_id`; the background flusher writes it later."""
+        with self._lock:
+            self._hits[entry_id] += 1
+            self._last_hit[entry_id] = datetime.utcnow()
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, name="kb-hit-flush", daemon=True)
+                self._flusher.start()
+
+    def _run(self):
+        while True:
+            # Floor the wait so a zero interval doesn't spin
+            time.sleep(max(0.1, self._last_flush + self.flush_interval - time.monotonic()))
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def pending(self) -> Dict[int, int]:
+        """Hits not yet written, by entry id."""
+        with self._lock:
+            return dict(self._hits)
+
+    def flush(self) -> int:
+        """Write buffered hits. Returns the number of entries updated."""
+        with self._lock:
+            hits, self._hits = self._hits, Counter()
+            last_hit, self._last_hit = self._last_hit, {}
+            self._last_flush = time.monotonic()
+        if not hits:
+            return 0
+
+        table = KnowledgeBaseEntry.__table__
+        stmt = (
+            table.update()
+            .where(table.c.id == bindparam("entry_id"))
+            .values(
+                hit_count=func.coalesce(table.c.hit_count, 0) + bindparam("hits"),
+                last_hit_at=bindparam("hit_at"),
+            )
+        )
+        params = [{"entry_id": i, "hits": n, "hit_at": last_hit[i]} for i, n in hits.items()]
+        db = self.db_session_factory()
+        try:
+            db.execute(stmt, params)
+            db.commit()
+            return len(params)
+        except Exception:
+            db.rollback()
+            # Keep the hits for the next attempt
+            with self._lock:
+                self._hits.update(hits)
+                for entry_id, at in last_hit.items():
+                    self._last_hit.setdefault(entry_id, at)
+            logger.exception("kb hit flush failed")
+            return 0
+        finally:
+            db.close()
+
+
+_recorders: Dict[Any, KBHitRecorder] = {}
+_recorders_lock = threading.Lock()
+
+
+def get_hit_recorder(db_session_factory=SessionLocal) -> KBHitRecorder:
+    """Process-wide recorder per database (keyed by session factory)."""
+    with _recorders_lock:
+        recorder = _recorders.get(db_session_factory)
+        if recorder is None:
+            recorder = _recorders[db_session_factory] = KBHitRecorder(db_session_factory)
+        return recorder
@@ -0,0 +1,463 @@
+"""
+In-memory retrieval structures for the Knowledge Base.
+
+`KBSearchIndex` holds a character-trigram inverted index (cheap lexical
+candidate generation) and per-entry term vectors (TF-IDF cosine scoring).
+`KBService.find_answer` drives the staged pipeline on top of it.
+
+Published indexes are treated as immutable: writers derive a new index with
+`KBSearchIndex.copy_with` and swap it in through a `KBSnapshotStore`, so
+readers never take a lock. Stores are kept per (database, tenant) in an LRU
+registry bounded by an approximate memory budget.
+"""
+
+import hashlib
+import itertools
+import math
+import re
+import sys
+import threading
+import time
+import weakref
+import difflib
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from ..config import Config
+
+try:
+    from rapidfuzz import fuzz
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    text = _PUNCT_RE.sub(" ", (text or "").lower())
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def question_hash(text: str) -> str:
+    """Stable key for exact matching: sha1 of the normalized question."""
+    return hashlib.sha1(normalize_question(text).encode("utf-8")).hexdigest()
+
+
+def trigrams(text: str) -> Set[str]:
+    """Character trigrams of a normalized string (padded so short words count)."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def lexical_ratio(a: str, b: str) -> float:
+    """Edit-based similarity in [0, 1]; rapidfuzz when installed, else difflib."""
+    if RAPIDFUZZ_AVAILABLE:
+        return fuzz.ratio(a, b) / 100.0
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+@dataclass
+class StageReport:
+    """Timing and candidate count for one retrieval stage."""
+    stage: str
+    elapsed_ms: float
+    candidates: int
+    hit: bool = False
+
+
+@dataclass
+class RetrievalTrace:
+    """Per-lookup record of the stages that ran and which one answered."""
+    stages: List[StageReport] = field(default_factory=list)
+    matched_stage: Optional[str] = None
+    score: Optional[float] = None
+
+    def record(self, stage: str, started: float, candidates: int, hit: bool = False):
+        self.stages.append(StageReport(stage, (time.perf_counter() - started) * 1000.0, candidates, hit))
+        if hit:
+            self.matched_stage = stage
+
+    @property
+    def total_ms(self) -> float:
+        return sum(s.elapsed_ms for s in self.stages)
+
+
+@dataclass
+class _IndexedQuestion:
+    key: Any
+    entry_id: int
+    text: str
+    grams: Set[str]
+    terms: Counter
+
+    def approx_bytes(self) -> int:
+        # Question text plus roughly one posting/term slot per trigram and term
+        return sys.getsizeof(self.text) + 64 * (len(self.grams) + len(self.terms)) + 200
+
+
+class KBSearchIndex:
+    """
+    Trigram inverted index plus TF-IDF term vectors over KB questions.
+    Documents are keyed by the entry id, or by ("alias", alias_id) for merged
+    alternate phrasings; `entry_id_for` maps either back to the KB entry.
+    """
+
+    def __init__(self):
+        self.docs: Dict[Any, _IndexedQuestion] = {}
+        self.postings: Dict[str, Set[Any]] = defaultdict(set)
+        self.doc_freq: Counter = Counter()
+        self.approx_bytes = 0
+        # Set on subsets so TF-IDF weights match the full index they were cut from
+        self.corpus_size: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def add(self, key: Any, question_text: str, entry_id: Optional[int] = None):
+        """Index (or re-index) a single KB question; `entry_id` defaults to `key`."""
+        if key in self.docs:
+            self.remove(key)
+        text = normalize_question(question_text)
+        doc = _IndexedQuestion(key, key if entry_id is None else entry_id, text, trigrams(text), Counter(text.split()))
+        self.docs[key] = doc
+        for g in doc.grams:
+            self.postings[g].add(key)
+        self.doc_freq.update(doc.terms.keys())
+        self.approx_bytes += doc.approx_bytes()
+
+    def remove(self, key: Any):
+        """Drop a question from the index."""
+        doc = self.docs.pop(key, None)
+        if not doc:
+            return
+        for g in doc.grams:
+            keys = self.postings.get(g)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self.postings[g]
+        self.doc_freq.subtract(doc.terms.keys())
+        self.approx_bytes -= doc.approx_bytes()
+
+    def entry_id_for(self, key: Any) -> int:
+        return self.docs[key].entry_id
+
+    def copy_with(
+        self,
+        added: Iterable[Tuple] = (),
+        removed: Iterable[Any] = (),
+    ) -> "KBSearchIndex":
+        """
+        Copy-on-write update: return a new index with `added` (key, question[, entry_id])
+        items (re)indexed and `removed` keys dropped. Untouched posting sets are
+        shared with this index, which is left unmodified.
+        """
+        added = [tuple(item) for item in added]
+        removed = list(removed)
+
+        new = KBSearchIndex()
+        new.docs = dict(self.docs)
+        new.postings = defaultdict(set, self.postings)
+        new.doc_freq = Counter(self.doc_freq)
+        new.approx_bytes = self.approx_bytes
+
+        touched: Set[str] = set()
+        for key in removed + [item[0] for item in added]:
+            doc = self.docs.get(key)
+            if doc:
+                touched |= doc.grams
+        for item in added:
+            touched |= trigrams(normalize_question(item[1]))
+        for g in touched:
+            new.postings[g] = set(self.postings.get(g, ()))
+
+        for key in removed:
+            new.remove(key)
+        for item in added:
+            new.add(*item)
+        return new
+
+    def subset(self, entry_ids: Iterable[int]) -> "KBSearchIndex":
+        """
+        Read-only index over the questions (entries and their aliases) of `entry_ids`.
+        Documents and document frequencies are shared with this index, so scores
+        are the same as a lookup against the full index.
+        """
+        entry_ids = set(entry_ids)
+        new = KBSearchIndex()
+        new.doc_freq = self.doc_freq
+        new.corpus_size = len(self.docs)
+        for key, doc in self.docs.items():
+            if doc.entry_id in entry_ids:
+                new.docs[key] = doc
+                for g in doc.grams:
+                    new.postings[g].add(key)
+        return new
+
+    def candidates(self, question_text: str, limit: int) -> List[Tuple[Any, float]]:
+        """
+        Lexical candidate generation.
+        Returns up to `limit` (doc key, trigram Jaccard) pairs, best first.
+        """
+        grams = trigrams(normalize_question(question_text))
+        overlap: Counter = Counter()
+        for g in grams:
+            for key in self.postings.get(g, ()):
+                overlap[key] += 1
+
+        scored = []
+        for key, shared in overlap.items():
+            union = len(grams) + len(self.docs[key].grams) - shared
+            scored.append((key, shared / union if union else 0.0))
+        scored.sort(key=lambda x: x[1], reverse=True)
+        return scored[:limit]
+
+    def _tfidf(self, terms: Counter) -> Dict[str, float]:
+        n = self.corpus_size or len(self.docs) or 1
+        return {t: c * (math.log((1 + n) / (1 + self.doc_freq.get(t, 0))) + 1.0) for t, c in terms.items()}
+
+    def vector_score(self, question_text: str, key: Any) -> float:
+        """Cosine similarity between TF-IDF term vectors."""
+        return self._cosine(self._tfidf(Counter(normalize_question(question_text).split())), key)
+
+    def _cosine(self, q: Dict[str, float], key: Any) -> float:
+        d = self._tfidf(self.docs[key].terms)
+        dot = sum(w * d.get(t, 0.0) for t, w in q.items())
+        norm = math.sqrt(sum(w * w for w in q.values())) * math.sqrt(sum(w * w for w in d.values()))
+        return dot / norm if norm else 0.0
+
+    def rerank(
+        self,
+        question_text: str,
+        candidate_keys: List[Any],
+        lexical_weight: float,
+    ) -> List[Tuple[Any, float]]:
+        """Fuse edit-distance and vector scores; returns (doc key, score), best first."""
+        text = normalize_question(question_text)
+        qvec = self._tfidf(Counter(text.split()))
+        scored = []
+        for key in candidate_keys:
+            lex = lexical_ratio(text, self.docs[key].text)
+            vec = self._cosine(qvec, key)
+            scored.append((key, lexical_weight * lex + (1.0 - lexical_weight) * vec))
+        scored.sort(key=lambda x: x[1], reverse=True)
+        return scored
+
+
+@dataclass(frozen=True, eq=False)
+class KBSnapshot:
+    """An immutable, versioned view of the KB search index."""
+    version: int
+    index: KBSearchIndex
+    # Database state the index was built from; None until first built
+    signature: Optional[Tuple[Any, ...]] = None
+
+
+class KBSnapshotStore:
+    """
+    Holds the current KBSnapshot.
+    Readers just read `current` (an atomic attribute load); writers serialize on
+    a lock, build the next snapshot and swap the reference. Superseded snapshots
+    are freed as soon as the last in-flight reader drops them.
+    """
+
+    def __init__(self, on_publish: Optional[Callable[["KBSnapshotStore"], None]] = None):
+        self._write_lock = threading.Lock()
+        self._live = weakref.WeakSet()
+        # Called after every published snapshot (the registry tracks index sizes with it)
+        self.on_publish = on_publish
+        # LRU clock value of the last lookup, set by the registry without locking
+        self.last_used = 0
+        self._current = self._track(KBSnapshot(version=0, index=KBSearchIndex()))
+        # Hot tier: subset index keyed by the snapshot version it was cut from
+        self._hot: Tuple[Optional[int], KBSearchIndex] = (None, KBSearchIndex())
+        self.hot_loaded_at: Optional[float] = None
+        self._hot_refreshing = threading.Lock()
+        # When the database was last compared against the current snapshot (see KBService._snapshot)
+        self.checked_at: Optional[float] = None
+        self._checking = threading.Lock()
+
+    def _track(self, snapshot: KBSnapshot) -> KBSnapshot:
+        self._live.add(snapshot)
+        return snapshot
+
+    @property
+    def current(self) -> KBSnapshot:
+        return self._current
+
+    @property
+    def approx_bytes(self) -> int:
+        return self._current.index.approx_bytes
+
+    def set_hot(self, entry_ids: Iterable[int]):
+        """Cut the hot-tier subset index for `entry_ids` from the current snapshot and publish it."""
+        snapshot = self._current
+        entry_ids = frozenset(entry_ids)
+        self._hot = (snapshot.version, snapshot.index.subset(entry_ids) if entry_ids else KBSearchIndex())
+        self.hot_loaded_at = time.monotonic()
+
+    def hot_index(self) -> Optional[KBSearchIndex]:
+        """The hot-tier index, or None if it was cut from an older snapshot (it needs a refresh)."""
+        version, index = self._hot
+        return index if version == self._current.version else None
+
+    def claim_hot_refresh(self) -> bool:
+        """True for exactly one caller until `release_hot_refresh`; keeps refreshes from piling up."""
+        return self._hot_refreshing.acquire(blocking=False)
+
+    def release_hot_refresh(self):
+        self._hot_refreshing.release()
+
+    def claim_check(self) -> bool:
+        """True for exactly one caller until `release_check`; one staleness check at a time."""
+        return self._checking.acquire(blocking=False)
+
+    def release_check(self):
+        self.checked_at = time.monotonic()
+        self._checking.release()
+
+    def live_versions(self) -> List[int]:
+        """Versions still referenced somewhere (the current one plus any held by readers)."""
+        return sorted(s.version for s in list(self._live))
+
+    def rebuild(
+        self,
+        load_rows: Callable[[], Iterable[Tuple]],
+        signature: Tuple[Any, ...],
+        blocking: bool = True,
+    ) -> Optional[KBSnapshot]:
+        """
+        Build a full index from `load_rows` and publish it.
+        With blocking=False, returns None instead of waiting if another writer is active.
+        """
+        if not self._write_lock.acquire(blocking=blocking):
+            return None
+        try:
+            if self._current.signature == signature:
+                return self._current
+            index = KBSearchIndex()
+            for item in load_rows():
+                index.add(*item)
+            self._current = self._track(KBSnapshot(self._current.version + 1, index, signature))
+            published = self._current
+        finally:
+            self._write_lock.release()
+        self._published()
+        return published
+
+    def apply(
+        self,
+        expected_signature: Tuple[Any, ...],
+        new_signature: Tuple[Any, ...],
+        added: Iterable[Tuple] = (),
+        removed: Iterable[Any] = (),
+    ) -> KBSnapshot:
+        """
+        Publish an incremental update for a write made by this process.
+        The new signature is only adopted if the current snapshot matched the
+        database before the write; otherwise the snapshot stays marked stale
+        and the next reader rebuilds it.
+        """
+        added = list(added)
+        removed = list(removed)
+        with self._write_lock:
+            current = self._current
+            index = current.index.copy_with(added, removed) if (added or removed) else current.index
+            in_sync = current.signature is not None and current.signature == expected_signature
+            signature = new_signature if in_sync else current.signature
+            self._current = self._track(KBSnapshot(current.version + 1, index, signature))
+            published = self._current
+        self._published()
+        return published
+
+    def _published(self):
+        if self.on_publish is not None:
+            self.on_publish(self)
+
+
+class SnapshotStoreRegistry:
+    """
+    Snapshot stores keyed by (database, tenant), created lazily and evicted
+    least-recently-used once their indexes exceed `budget_bytes` in total.
+    An evicted tenant's index is rebuilt from the database on its next lookup.
+
+    Looking up a resident store takes no lock: it is a dict read plus stamping
+    the store's `last_used`. The lock, the running byte total and eviction only
+    come into play when a store is created or publishes a new snapshot, which
+    are the only times the total can grow.
+    """
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self._stores: Dict[Any, KBSnapshotStore] = {}
+        self._sizes: Dict[Any, int] = {}
+        self._total = 0
+        self._clock = itertools.count(1)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: Any) -> KBSnapshotStore:
+        store = self._stores.get(key)
+        if store is None:
+            with self._lock:
+                store = self._stores.get(key)
+                if store is None:
+                    store = self._stores[key] = KBSnapshotStore(on_publish=partial(self._resized, key))
+                    self._sizes[key] = 0
+        store.last_used = next(self._clock)
+        return store
+
+    def _resized(self, key: Any, store: KBSnapshotStore):
+        with self._lock:
+            # An evicted store can still publish for a reader that held on to it
+            if self._stores.get(key) is not store:
+                return
+            size = store.approx_bytes
+            self._total += size - self._sizes[key]
+            self._sizes[key] = size
+            self._evict(keep=key)
+
+    def _evict(self, keep: Any):
+        # The store that just grew always stays, even if it alone exceeds the budget
+        while self._total > self.budget_bytes and len(self._stores) > 1:
+            victim = min((k for k in self._stores if k != keep), key=lambda k: self._stores[k].last_used)
+            del self._stores[victim]
+            self._total -= self._sizes.pop(victim)
+            self.evictions += 1
+
+    def resident(self) -> List[Any]:
+        """Keys with a resident store, least recently used first."""
+        with self._lock:
+            return sorted(self._stores, key=lambda k: self._stores[k].last_used)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "resident": len(self._stores),
+                "approx_bytes": self._total,
+                "budget_bytes": self.budget_bytes,
+                "evictions": self.evictions,
+            }
+
+
+_registry: Optional[SnapshotStoreRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_store_registry() -> SnapshotStoreRegistry:
+    """Process-wide registry; the budget comes from KB_INDEX_MEMORY_BUDGET_MB."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = SnapshotStoreRegistry(int(Config.KB_INDEX_MEMORY_BUDGET_MB * 1024 * 1024))
+        return _registry
+
+
+def get_snapshot_store(key: Any) -> KBSnapshotStore:
+    """Process-wide store per (session factory, tenant), shared by all KBService instances."""
+    return get_store_registry().get(key)
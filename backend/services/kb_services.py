@@ -1,17 +1,59 @@
-from typing import Optional, Dict, Any, List
+from typing import Callable, Optional, Dict, Any, List, Tuple
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from ..models import KnowledgeBaseEntry
+from ..models import DEFAULT_TENANT, KnowledgeBaseEntry, KnowledgeBaseAlias
 from ..db import SessionLocal
 from ..config import Config
-import difflib
+from .kb_search import (
+    KBSearchIndex, KBSnapshot, KBSnapshotStore, RetrievalTrace, get_snapshot_store, normalize_question, question_hash,
+)
+from .kb_dedup import find_duplicate_clusters
+from .kb_hits import KBHitRecorder, get_hit_recorder
+from ..records import KBEntryRecord
+from ..serializers import KB_ENTRY
+import logging
+import threading
+import time
+
+logger = logging.getLogger("kb")
 
 
 class KBService:
-    """Knowledge Base service with CRUD and fuzzy search."""
+    """Knowledge Base service with CRUD and fuzzy search, scoped to one tenant."""
 
-    def __init__(self, db_session_factory=SessionLocal):
+    def __init__(
+        self,
+        db_session_factory=SessionLocal,
+        snapshots: Optional[KBSnapshotStore] = None,
+        tenant_id: str = DEFAULT_TENANT,
+    ):
         self.db_session_factory = db_session_factory
+        self.tenant_id = tenant_id
         self.threshold = Config.KB_FUZZY_THRESHOLD
+        self.candidate_limit = Config.KB_CANDIDATE_LIMIT
+        self.short_circuit_score = Config.KB_SHORT_CIRCUIT_SCORE
+        self.lexical_weight = Config.KB_LEXICAL_WEIGHT
+        self.snapshot_check = Config.KB_SNAPSHOT_CHECK_SECONDS
+        self.dedup_threshold = Config.KB_DEDUP_THRESHOLD
+        self.hot_tier_size = Config.KB_HOT_TIER_SIZE
+        self.hot_tier_refresh = Config.KB_HOT_TIER_REFRESH_SECONDS
+        self.hot_tier_min_score = Config.KB_HOT_TIER_MIN_SCORE
+
+        # Versioned, copy-on-write search index shared by every KBService on this
+        # database and tenant; resolved per call so an evicted index reloads lazily
+        self._snapshots = snapshots
+
+    @property
+    def snapshots(self) -> KBSnapshotStore:
+        return self._snapshots or get_snapshot_store((self.db_session_factory, self.tenant_id))
+
+    @property
+    def hits(self) -> KBHitRecorder:
+        return get_hit_recorder(self.db_session_factory)
+
+    def _entries(self, db: Session, *columns):
+        """Query over this tenant's KB entries (whole rows, or just `columns`)."""
+        return db.query(*(columns or (KnowledgeBaseEntry,))).filter(KnowledgeBaseEntry.tenant_id == self.tenant_id)
 
     def create_entry(
         self,
@@ -21,12 +63,48 @@ class KBService:
         created_by: str = None,
         tags: str = None,
         confidence: str = None
-    ) -> KnowledgeBaseEntry:
-        """Create a new Knowledge Base entry."""
+    ) -> KBEntryRecord:
+        """
+        Create a new Knowledge Base entry.
+        If an entry with the same normalized question (or an alias of it) already
+        exists, it is updated in place (version bumped) instead of inserting a
+        duplicate. A near-duplicate question (trigram Jaccard >= KB_DEDUP_THRESHOLD)
+        whose entry already gives the same answer is kept as an alias of it; with a
+        different answer it is a separate entry ("within 24 hours" vs "within 48
+        hours"), left to the reviewed batch `deduplicate` job.
+        """
         db: Session = self.db_session_factory()
         try:
+            before = self._signature(db)
+            alias = None
+            entry = self._find_by_hash(db, question_hash(question_text))
+            if entry is None:
+                entry = self._find_near_duplicate(db, question_text, answer_text)
+                if entry is not None:
+                    alias = KnowledgeBaseAlias(
+                        entry_id=entry.id,
+                        question_text=question_text,
+                        question_hash=question_hash(question_text),
+                    )
+                    db.add(alias)
+
+            if entry:
+                if alias is None:
+                    self._bump(entry, answer_text=answer_text, source_request_id=source_request_id,
+                               created_by=created_by, tags=tags, confidence=confidence)
+                else:
+                    # Same answer already; only the new phrasing is recorded
+                    self._bump(entry)
+                db.commit()
+                db.refresh(entry)
+                added = [(("alias", alias.id), alias.question_text, entry.id)] if alias else []
+                self.snapshots.apply(before, self._signature(db), added=added)
+                return KBEntryRecord.from_orm(entry)
+
             entry = KnowledgeBaseEntry(
+                tenant_id=self.tenant_id,
                 question_text=question_text,
+                question_hash=question_hash(question_text),
                 answer_text=answer_text,
                 source_request_id=source_request_id,
                 created_by=created_by,
@@ -36,65 +114,427 @@ class KBService:
             db.add(entry)
             db.commit()
             db.refresh(entry)
+            self.snapshots.apply(before, self._signature(db), added=[(entry.id, entry.question_text)])
+            return KBEntryRecord.from_orm(entry)
+        finally:
+            db.close()
+
+    def update_entry(self, entry_id: int, **fields) -> Optional[KBEntryRecord]:
+        """
+        Update an entry's question/answer/metadata and bump its version.
+        Returns None if the entry does not exist.
+        """
+        db: Session = self.db_session_factory()
+        try:
+            entry = self._entries(db).filter(KnowledgeBaseEntry.id == entry_id).first()
+            if not entry:
+                return None
+            before = self._signature(db)
+            question_changed = "question_text" in fields and fields["question_text"] != entry.question_text
+            self._bump(entry, **fields)
+            db.commit()
+            db.refresh(entry)
+            added = [(entry.id, entry.question_text)] if question_changed else []
+            self.snapshots.apply(before, self._signature(db), added=added)
+            return KBEntryRecord.from_orm(entry)
+        finally:
+            db.close()
+
+    def _find_by_hash(self, db: Session, qhash: str) -> Optional[KnowledgeBaseEntry]:
+        """Entry whose question, or one of whose aliases, has this normalized hash."""
+        entry = (
+            self._entries(db)
+            .filter(KnowledgeBaseEntry.question_hash == qhash)
+            .order_by(KnowledgeBaseEntry.id)
+            .first()
+        )
+        if entry:
             return entry
+        return (
+            self._entries(db)
+            .join(KnowledgeBaseAlias, KnowledgeBaseAlias.entry_id == KnowledgeBaseEntry.id)
+            .filter(KnowledgeBaseAlias.question_hash == qhash)
+            .order_by(KnowledgeBaseEntry.id)
+            .first()
+        )
+
+    def _find_near_duplicate(self, db: Session, question_text: str, answer_text: str) -> Optional[KnowledgeBaseEntry]:
+        """
+        Entry with a question similar enough to count as the same one and the same
+        normalized answer. Similar questions can differ in the one word that
+        matters, so a different answer is never merged here.
+        """
+        index = self._snapshot(db).index
+        entry_ids = []
+        for key, score in index.candidates(question_text, self.candidate_limit):
+            if score < self.dedup_threshold:
+                break
+            entry_ids.append(index.entry_id_for(key))
+        if not entry_ids:
+            return None
+        answer = normalize_question(answer_text)
+        for entry in self._entries(db).filter(KnowledgeBaseEntry.id.in_(entry_ids)).order_by(KnowledgeBaseEntry.id):
+            if normalize_question(entry.answer_text) == answer:
+                return entry
+        return None
+
+    def deduplicate(self, threshold: Optional[float] = None, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Batch maintenance job: cluster near-duplicate entries (MinHash/LSH blocking,
+        verified by trigram Jaccard), then split each cluster by normalized answer,
+        the same rule `create_entry` applies online. Entries that share an answer
+        are merged into the oldest one, with the other questions kept as aliases.
+        Answers are never replaced. A cluster whose answers differ ("December
+        24th" vs "December 25th") is listed under `conflicts` for review.
+        Each merge runs in its own transaction.
+        Returns a report of how much the KB shrank.
+        """
+        threshold = self.dedup_threshold if threshold is None else threshold
+        db: Session = self.db_session_factory()
+        try:
+            rows = self._entries(
+                db, KnowledgeBaseEntry.id, KnowledgeBaseEntry.question_text, KnowledgeBaseEntry.answer_text
+            ).all()
+            answers = {r.id: normalize_question(r.answer_text or "") for r in rows}
+            clusters = find_duplicate_clusters(((r.id, r.question_text or "") for r in rows), threshold)
+
+            merges: List[List[int]] = []
+            conflicts: List[Dict[str, Any]] = []
+            for cluster in clusters:
+                by_answer: Dict[str, List[int]] = {}
+                for entry_id in sorted(cluster):
+                    by_answer.setdefault(answers[entry_id], []).append(entry_id)
+                merges.extend(ids for ids in by_answer.values() if len(ids) > 1)
+                if len(by_answer) > 1:
+                    conflicts.append({"entry_ids": sorted(cluster), "distinct_answers": len(by_answer)})
+
+            merged = sum(len(ids) - 1 for ids in merges)
+            aliases_added = 0
+            if not dry_run:
+                for ids in merges:
+                    aliases_added += self._merge_cluster(db, ids)
+                    db.commit()
+                if merges:
+                    self.snapshots.rebuild(lambda: self._index_rows(db), self._signature(db))
+
+            before = len(rows)
+            return {
+                "entries_before": before,
+                "entries_after": before - merged,
+                "clusters": len(merges),
+                "entries_merged": merged,
+                "aliases_added": aliases_added,
+                "conflicts": conflicts,
+                "shrink_pct": round(100.0 * merged / before, 1) if before else 0.0,
+                "dry_run": dry_run,
+            }
         finally:
             db.close()
 
+    def _merge_cluster(self, db: Session, entry_ids: List[int]) -> int:
+        """
+        Fold entries that give the same answer into the lowest-id one, keeping its
+        answer. Returns the number of aliases added.
+        """
+        members = (
+            self._entries(db)
+            .filter(KnowledgeBaseEntry.id.in_(entry_ids))
+            .order_by(KnowledgeBaseEntry.id)
+            .all()
+        )
+        if len(members) < 2:
+            return 0
+        canonical = members[0]
+        known = {canonical.question_hash}
+        known.update(h for (h,) in db.query(KnowledgeBaseAlias.question_hash).filter(
+            KnowledgeBaseAlias.entry_id == canonical.id
+        ))
+
+        added = 0
+        for member in members[1:]:
+            db.query(KnowledgeBaseAlias).filter(KnowledgeBaseAlias.entry_id == member.id).update(
+                {KnowledgeBaseAlias.entry_id: canonical.id}, synchronize_session=False
+            )
+            if member.question_hash not in known:
+                db.add(KnowledgeBaseAlias(
+                    entry_id=canonical.id,
+                    question_text=member.question_text,
+                    question_hash=member.question_hash,
+                ))
+                known.add(member.question_hash)
+                added += 1
+            db.delete(member)
+
+        canonical.version = max(m.version or 1 for m in members) + 1
+        return added
+
+    def _bump(self, entry: KnowledgeBaseEntry, **fields):
+        """Apply non-None field updates to an entry and increment its version."""
+        for name, value in fields.items():
+            if value is not None:
+                setattr(entry, name, value)
+        if fields.get("question_text") is not None:
+            entry.question_hash = question_hash(entry.question_text)
+        entry.version = (entry.version or 1) + 1
+
     def list_entries(self, limit: int = 100) -> List[Dict[str, Any]]:
         """List KB entries, ordered by most recent."""
         db = self.db_session_factory()
         try:
             rows = (
-                db.query(KnowledgeBaseEntry)
+                self._entries(db, *KB_ENTRY.columns)
                 .order_by(KnowledgeBaseEntry.created_at.desc())
                 .limit(limit)
                 .all()
             )
-            return [self._row_to_dict(r) for r in rows]
+            return KB_ENTRY.many(rows)
+        finally:
+            db.close()
+
+    def popular_entries(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Entries most likely to be asked again: most hit, then most re-answered, newest first."""
+        self.hits.flush()
+        db = self.db_session_factory()
+        try:
+            rows = (
+                self._entries(db, *KB_ENTRY.columns)
+                .order_by(
+                    KnowledgeBaseEntry.hit_count.desc(),
+                    KnowledgeBaseEntry.version.desc(),
+                    KnowledgeBaseEntry.created_at.desc(),
+                )
+                .limit(limit)
+                .all()
+            )
+            return KB_ENTRY.many(rows)
         finally:
             db.close()
 
     def _row_to_dict(self, row: KnowledgeBaseEntry) -> Dict[str, Any]:
         """Convert a KnowledgeBaseEntry row to a dictionary."""
-        return {
-            "id": row.id,
-            "question_text": row.question_text,
-            "answer_text": row.answer_text,
-            "source_request_id": row.source_request_id,
-            "created_by": row.created_by,
-            "created_at": row.created_at.isoformat(),
-            "version": row.version,
-            "tags": row.tags,
-            "confidence": row.confidence
-        }
-
-    def find_answer(self, question_text: str) -> Optional[Dict[str, Any]]:
+        return KB_ENTRY(row)
+
+    def _signature(self, db: Session) -> Tuple[Any, ...]:
+        """Cheap fingerprint of the KB table; changes on every insert, delete or version bump."""
+        return tuple(self._entries(
+            db,
+            func.count(KnowledgeBaseEntry.id),
+            func.max(KnowledgeBaseEntry.id),
+            func.sum(KnowledgeBaseEntry.version),
+        ).one())
+
+    def _index_rows(self, db: Session) -> List[Tuple]:
+        """(key, question[, entry_id]) items for a full index build: entries plus their aliases."""
+        rows: List[Tuple] = self._entries(db, KnowledgeBaseEntry.id, KnowledgeBaseEntry.question_text).all()
+        rows += [
+            (("alias", a.id), a.question_text, a.entry_id)
+            for a in db.query(KnowledgeBaseAlias.id, KnowledgeBaseAlias.question_text, KnowledgeBaseAlias.entry_id)
+            .join(KnowledgeBaseEntry, KnowledgeBaseAlias.entry_id == KnowledgeBaseEntry.id)
+            .filter(KnowledgeBaseEntry.tenant_id == self.tenant_id)
+        ]
+        return rows
+
+    def _snapshot(self, db: Session) -> KBSnapshot:
+        """
+        Return the current search snapshot without touching the database.
+        Writes through this service publish their own snapshot update; changes
+        made by other processes are found by a background check every
+        KB_SNAPSHOT_CHECK_SECONDS, which rebuilds off the read path.
+        The very first build is the only one a reader waits for.
+        """
+        store = self.snapshots
+        snapshot = store.current
+        if snapshot.signature is None:
+            return store.rebuild(lambda: self._index_rows(db), self._signature(db)) or store.current
+
+        checked_at = store.checked_at
+        if (checked_at is None or time.monotonic() - checked_at >= self.snapshot_check) and store.claim_check():
+            threading.Thread(target=self._check_snapshot_async, args=(store,), name="kb-snapshot", daemon=True).start()
+        return snapshot
+
+    def _check_snapshot_async(self, store: KBSnapshotStore):
+        db = self.db_session_factory()
+        try:
+            signature = self._signature(db)
+            if store.current.signature != signature:
+                store.rebuild(lambda: self._index_rows(db), signature)
+        except Exception:
+            logger.exception("kb snapshot check failed")
+        finally:
+            db.close()
+            store.release_check()
+
+    def refresh_hot_tier(self, db: Optional[Session] = None) -> List[int]:
+        """
+        Reload the hot tier: the KB_HOT_TIER_SIZE most-hit entries of this tenant,
+        read off the (tenant_id, hit_count) index after flushing buffered hits.
+        """
+        self.hits.flush()
+        own = db is None
+        db = db or self.db_session_factory()
+        try:
+            ids = [
+                r.id for r in self._entries(db, KnowledgeBaseEntry.id)
+                .filter(KnowledgeBaseEntry.hit_count > 0)
+                .order_by(KnowledgeBaseEntry.hit_count.desc())
+                .limit(self.hot_tier_size)
+            ]
+        finally:
+            if own:
+                db.close()
+        self.snapshots.set_hot(ids)
+        return ids
+
+    def _hot_index(self) -> Optional[KBSearchIndex]:
+        """
+        The hot-tier index, or None while there is none to search. A stale tier
+        (refresh interval passed, or cut from an older snapshot) is refreshed on
+        a background thread; lookups never wait for it.
+        """
+        if self.hot_tier_size <= 0:
+            return None
+        store = self.snapshots
+        index = store.hot_index()
+        loaded_at = store.hot_loaded_at
+        if (index is None or loaded_at is None or time.monotonic() - loaded_at >= self.hot_tier_refresh) \
+                and store.claim_hot_refresh():
+            threading.Thread(target=self._refresh_hot_tier_async, args=(store,), name="kb-hot-tier", daemon=True).start()
+        return index if index is not None and len(index) else None
+
+    def _refresh_hot_tier_async(self, store: KBSnapshotStore):
+        try:
+            self.refresh_hot_tier()
+        except Exception:
+            logger.exception("kb hot tier refresh failed")
+        finally:
+            store.release_hot_refresh()
+
+    def _match(
+        self,
+        index,
+        question_text: str,
+        trace: RetrievalTrace,
+        stage: str,
+        rerank_stage: Optional[str],
+        threshold: Optional[float] = None,
+    ):
+        """
+        Lexical candidates plus fused rerank against one index. The rerank is
+        traced as `rerank_stage`, or folded into `stage` when that is None.
+        A rerank score below `threshold` (default KB_FUZZY_THRESHOLD) is a miss.
+        Returns the matched entry id or None.
+        """
+        started = time.perf_counter()
+        candidates = index.candidates(question_text, self.candidate_limit)
+        if candidates and candidates[0][1] >= self.short_circuit_score:
+            trace.record(stage, started, len(candidates), hit=True)
+            trace.score = candidates[0][1]
+            return index.entry_id_for(candidates[0][0])
+        if rerank_stage:
+            trace.record(stage, started, len(candidates))
+            started = time.perf_counter()
+        if not candidates:
+            if not rerank_stage:
+                trace.record(stage, started, 0)
+            return None
+
+        ranked = index.rerank(question_text, [c[0] for c in candidates], self.lexical_weight)
+        best_key, best_score = ranked[0]
+        hit = best_score >= (self.threshold if threshold is None else threshold)
+        trace.record(rerank_stage or stage, started, len(ranked), hit=hit)
+        if not hit:
+            return None
+        trace.score = best_score
+        return index.entry_id_for(best_key)
+
+    def find_answer(
+        self,
+        question_text: str,
+        fallback: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None,
+        record_hit: bool = True,
+    ) -> Optional[Dict[str, Any]]:
         """
         Find an answer from the KB.
-        - Exact match first
-        - Then fuzzy match using difflib
+        See `find_answer_with_trace` for the retrieval stages.
         """
+        match, trace = self.find_answer_with_trace(question_text, fallback, record_hit)
+        logger.debug(
+            "kb lookup stage=%s total_ms=%.2f stages=%s",
+            trace.matched_stage,
+            trace.total_ms,
+            [(s.stage, round(s.elapsed_ms, 2), s.candidates) for s in trace.stages],
+        )
+        return match
+
+    def find_answer_with_trace(
+        self,
+        question_text: str,
+        fallback: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None,
+        record_hit: bool = True,
+    ) -> Tuple[Optional[Dict[str, Any]], RetrievalTrace]:
+        """
+        Staged retrieval pipeline:
+        - exact: indexed lookup on the normalized question hash (entries, then aliases)
+        - snapshot: fetch the current search index (no database work once it is built; see `_snapshot`)
+        - hot: lexical + rerank over the most-hit entries only, accepted at KB_HOT_TIER_MIN_SCORE
+          (skipped while the tier is empty or being refreshed)
+        - lexical: trigram candidate generation over the full index (short-circuits on a near-exact hit)
+        - rerank: fused edit-distance + TF-IDF cosine score over the candidates
+        - intent: optional `fallback` lookup (e.g. the agent's business-info table), only
+          when the KB has no answer, so answers supervisors taught always win
+        Returns the matched entry (or None) and a per-stage timing trace.
+        A matched KB entry counts as a hit (see `kb_hits`) unless record_hit is False,
+        e.g. for a speculative lookup whose answer may never be used (see `count_hit`).
+        """
+        trace = RetrievalTrace()
         db = self.db_session_factory()
         try:
             # Exact match
-            exact = db.query(KnowledgeBaseEntry).filter(
-                KnowledgeBaseEntry.question_text == question_text
-            ).first()
+            started = time.perf_counter()
+            exact = self._find_by_hash(db, question_hash(question_text))
+            trace.record("exact", started, 1 if exact else 0, hit=bool(exact))
             if exact:
-                return self._row_to_dict(exact)
-
-            # Fuzzy match
-            all_qs = [q.question_text for q in db.query(KnowledgeBaseEntry).all()]
-            if not all_qs:
-                return None
+                trace.score = 1.0
+                if record_hit:
+                    self.hits.record(exact.id)
+                return self._row_to_dict(exact), trace
 
-            matches = difflib.get_close_matches(question_text, all_qs, n=1, cutoff=self.threshold)
-            if matches:
-                row = db.query(KnowledgeBaseEntry).filter(
-                    KnowledgeBaseEntry.question_text == matches[0]
-                ).first()
-                return self._row_to_dict(row)
+            started = time.perf_counter()
+            index = self._snapshot(db).index
+            trace.record("snapshot", started, len(index))
+            # Hot tier first, trusted only on a confident match; otherwise the full
+            # index (which holds the hot entries too) picks the best answer
+            hot = self._hot_index()
+            entry_id = None
+            if hot is not None:
+                entry_id = self._match(hot, question_text, trace, "hot", None, self.hot_tier_min_score)
+            if entry_id is None:
+                entry_id = self._match(index, question_text, trace, "lexical", "rerank")
+            if entry_id is None:
+                return self._fallback(fallback, question_text, trace), trace
 
-            return None
+            if record_hit:
+                self.hits.record(entry_id)
+            return self._load(db, entry_id), trace
         finally:
             db.close()
+
+    def count_hit(self, match: Optional[Dict[str, Any]]):
+        """Count a hit for a match found with record_hit=False once its answer is actually used."""
+        if match and match.get("id") is not None and match.get("source") is None:
+            self.hits.record(match["id"])
+
+    @staticmethod
+    def _fallback(fallback, question_text: str, trace: RetrievalTrace) -> Optional[Dict[str, Any]]:
+        if fallback is None:
+            return None
+        started = time.perf_counter()
+        match = fallback(question_text)
+        trace.record("intent", started, 1 if match else 0, hit=bool(match))
+        if match:
+            trace.score = 1.0
+        return match
+
+    def _load(self, db: Session, entry_id: int) -> Optional[Dict[str, Any]]:
+        row = db.query(*KB_ENTRY.columns).filter(KnowledgeBaseEntry.id == entry_id).first()
+        return KB_ENTRY(row) if row else None
@@ -1,6 +1,8 @@
 import logging
+import queue
+import threading
 import requests
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from ..config import Config
 
 # Configure logger
@@ -12,11 +14,61 @@ handler.setFormatter(formatter)
 logger.addHandler(handler)
 
 
+class WebhookDispatcher:
+    """Posts webhook payloads from a background thread so callers never wait on the network."""
+
+    def __init__(self, url: str, max_queue: int = 1000):
+        self.url = url
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="webhook-dispatch", daemon=True)
+        self._thread.start()
+
+    def submit(self, payload: Dict[str, Any]) -> bool:
+        """Queue a payload; drops it (and logs) if the queue is full."""
+        try:
+            self._queue.put_nowait(payload)
+            return True
+        except queue.Full:
+            logger.error("[NOTIFY] webhook queue full, dropping notification")
+            return False
+
+    def _run(self):
+        while True:
+            payload = self._queue.get()
+            try:
+                requests.post(self.url, json=payload, timeout=3)
+            except Exception as e:
+                logger.error(f"[NOTIFY] webhook failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        """Block until every queued payload has been attempted (tests / shutdown)."""
+        self._queue.join()
+
+
 class NotificationService:
     """Handles customer and supervisor notifications."""
 
     def __init__(self):
         self.webhook = Config.NOTIFICATION_WEBHOOK_URL
+        self.dispatcher: Optional[WebhookDispatcher] = None
+
+    def enable_background_dispatch(self):
+        """Send webhooks from a background thread instead of inline (for event-loop callers)."""
+        if self.webhook and self.dispatcher is None:
+            self.dispatcher = WebhookDispatcher(self.webhook)
+
+    def _post(self, payload: Dict[str, Any]):
+        if not self.webhook:
+            return
+        if self.dispatcher:
+            self.dispatcher.submit(payload)
+            return
+        try:
+            requests.post(self.webhook, json=payload, timeout=3)
+        except Exception as e:
+            logger.error(f"[NOTIFY] webhook failed: {e}")
 
     def notify_customer(self, caller: Dict[str, str], message: str):
         """Notify the customer via webhook or log (simulation)."""
@@ -27,21 +79,22 @@ class NotificationService:
         }
         log = f"[NOTIFY:CUSTOMER] to={payload['to']} message={message}"
         logger.info(log)
+        self._post(payload)
 
-        if self.webhook:
-            try:
-                requests.post(self.webhook, json=payload, timeout=3)
-            except Exception as e:
-                logger.error(f"[NOTIFY] webhook failed: {e}")
+    def notify_customers(self, callers: List[Dict[str, str]], message: str):
+        """Notify several customers with the same message using a single webhook call."""
+        if not callers:
+            return
+        if len(callers) == 1:
+            return self.notify_customer(callers[0], message)
+        recipients = [{"to": c.get("phone"), "name": c.get("name")} for c in callers]
+        for r in recipients:
+            logger.info(f"[NOTIFY:CUSTOMER] to={r['to']} message={message}")
+        self._post({"recipients": recipients, "message": message})
 
     def notify_supervisor(self, help_request):
         """Notify supervisor when escalation is needed."""
         content = f"Hey, I need help answering: '{help_request.question_text}' (request_id={help_request.id})"
         log = f"[NOTIFY:SUPERVISOR] {content}"
         logger.info(log)
-
-        if self.webhook:
-            try:
-                requests.post(self.webhook, json={"message": content}, timeout=3)
-            except Exception as e:
-                logger.error(f"[NOTIFY] webhook failed: {e}")
+        self._post({"message": content})
@@ -0,0 +1,192 @@
+"""
+Retention job for closed help requests.
+
+Resolved and unresolved requests older than RETENTION_DAYS are moved out of
+`help_requests` in batches. Each batch is copied to the archive (the
+`help_requests_archive` table, or one gzip-compressed NDJSON file per batch)
+and deleted from the hot table in its own short transaction, with a pause
+between batches so the job can run next to live traffic.
+"""
+
+import gzip
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from ..config import Config
+from ..db import SessionLocal
+from ..models import HelpRequest, HelpRequestArchive, HelpRequestState, HelpRequestSubscriber
+from . import event_log
+
+logger = logging.getLogger("retention")
+
+CLOSED_STATES = (HelpRequestState.RESOLVED, HelpRequestState.UNRESOLVED)
+SINKS = ("table", "ndjson")
+# One file per batch, named by the id range it covers
+_FILE_RE = re.compile(r"^help_requests-(\d+)-(\d+)\.ndjson\.gz$")
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+class RetentionService:
+    """Moves closed help requests to the archive and reads them back by id."""
+
+    def __init__(
+        self,
+        db_session_factory=SessionLocal,
+        sink: str = Config.RETENTION_SINK,
+        archive_dir: str = Config.RETENTION_ARCHIVE_DIR,
+    ):
+        if sink not in SINKS:
+            raise ValueError(f"unknown retention sink {sink!r} (expected one of {SINKS})")
+        self.db_session_factory = db_session_factory
+        self.sink = sink
+        self.archive_dir = archive_dir
+
+    def archive_closed(
+        self,
+        older_than_days: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        pause_seconds: Optional[float] = None,
+        max_batches: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Archive closed requests created more than `older_than_days` ago,
+        `batch_size` rows per transaction, sleeping `pause_seconds` between batches.
+        Returns a report of what was moved.
+        """
+        older_than_days = Config.RETENTION_DAYS if older_than_days is None else older_than_days
+        batch_size = batch_size or Config.RETENTION_BATCH_SIZE
+        pause_seconds = Config.RETENTION_BATCH_PAUSE_SECONDS if pause_seconds is None else pause_seconds
+        cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+
+        archived = batches = 0
+        while max_batches is None or batches < max_batches:
+            moved = self._archive_batch(cutoff, batch_size)
+            archived += moved
+            if moved:
+                batches += 1
+            if moved < batch_size:
+                break
+            time.sleep(pause_seconds)
+
+        if archived:
+            logger.info(f"archived {archived} help requests in {batches} batches ({self.sink})")
+        return {"archived": archived, "batches": batches, "sink": self.sink, "cutoff": cutoff.isoformat()}
+
+    def _archive_batch(self, cutoff: datetime, batch_size: int) -> int:
+        db = self.db_session_factory()
+        try:
+            rows = (
+                db.query(HelpRequest)
+                .filter(HelpRequest.state.in_(CLOSED_STATES), HelpRequest.created_at < cutoff)
+                .order_by(HelpRequest.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                return 0
+            ids = [r.id for r in rows]
+            subscribers: Dict[int, List[int]] = defaultdict(list)
+            for request_id, customer_id in (
+                db.query(HelpRequestSubscriber.help_request_id, HelpRequestSubscriber.customer_id)
+                .filter(HelpRequestSubscriber.help_request_id.in_(ids))
+                .order_by(HelpRequestSubscriber.id)
+            ):
+                subscribers[request_id].append(customer_id)
+
+            if self.sink == "table":
+                db.add_all(self._archive_row(r, subscribers[r.id]) for r in rows)
+            else:
+                # Written before the delete commits: a crash leaves a duplicate, never a lost row
+                self._write_file(ids, [self._record(r, subscribers[r.id]) for r in rows])
+
+            for r in rows:
+                event_log.record_event(db, r, event_log.ARCHIVED, r.state, sink=self.sink)
+            db.query(HelpRequestSubscriber).filter(
+                HelpRequestSubscriber.help_request_id.in_(ids)
+            ).delete(synchronize_session=False)
+            db.query(HelpRequest).filter(HelpRequest.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+            event_log.publish()
+            return len(rows)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _archive_row(self, r: HelpRequest, subscriber_ids: List[int]) -> HelpRequestArchive:
+        return HelpRequestArchive(
+            id=r.id,
+            tenant_id=r.tenant_id,
+            customer_id=r.customer_id,
+            question_text=r.question_text,
+            created_at=r.created_at,
+            state=r.state,
+            assigned_supervisor_id=r.assigned_supervisor_id,
+            response_text=r.response_text,
+            response_at=r.response_at,
+            timeout_at=r.timeout_at,
+            subscriber_customer_ids=json.dumps(subscriber_ids) if subscriber_ids else None,
+        )
+
+    def _record(self, r, subscriber_ids: List[int], archived_at: Optional[datetime] = None) -> Dict[str, Any]:
+        """Plain-dict form of a help request (or archive row), as stored in NDJSON and returned by reads."""
+        return {
+            "id": r.id,
+            "tenant_id": r.tenant_id,
+            "customer_id": r.customer_id,
+            "question_text": r.question_text,
+            "created_at": _iso(r.created_at),
+            "state": r.state,
+            "assigned_supervisor_id": r.assigned_supervisor_id,
+            "response_text": r.response_text,
+            "response_at": _iso(r.response_at),
+            "timeout_at": _iso(r.timeout_at),
+            "subscriber_customer_ids": subscriber_ids,
+            "archived_at": _iso(archived_at or datetime.utcnow()),
+        }
+
+    def _write_file(self, ids: List[int], records: List[Dict[str, Any]]):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"help_requests-{ids[0]}-{ids[-1]}.ndjson.gz")
+        fd, tmp = tempfile.mkstemp(dir=self.archive_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as f:
+            for record in records:
+                f.write(json.dumps(record).encode("utf-8") + b"\n")
+        os.replace(tmp, path)
+
+    def get_archived(self, request_id: int) -> Optional[Dict[str, Any]]:
+        """An archived request by id (archive table first, then NDJSON files), or None."""
+        db = self.db_session_factory()
+        try:
+            row = db.get(HelpRequestArchive, request_id)
+            if row is not None:
+                subscriber_ids = json.loads(row.subscriber_customer_ids) if row.subscriber_customer_ids else []
+                return self._record(row, subscriber_ids, row.archived_at)
+        finally:
+            db.close()
+        return self._find_in_files(request_id)
+
+    def _find_in_files(self, request_id: int) -> Optional[Dict[str, Any]]:
+        if not os.path.isdir(self.archive_dir):
+            return None
+        for name in sorted(os.listdir(self.archive_dir)):
+            m = _FILE_RE.match(name)
+            if not m or not int(m.group(1)) <= request_id <= int(m.group(2)):
+                continue
+            with gzip.open(os.path.join(self.archive_dir, name), "rt", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record["id"] == request_id:
+                        return record
+        return None
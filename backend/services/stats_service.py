@@ -0,0 +1,182 @@
+"""
+Incrementally maintained analytics rollups.
+
+Outcomes (calls, KB answers, escalations, resolutions, timeouts) are counted
+in memory as they happen and flushed every STATS_FLUSH_SECONDS by a
+background thread into `stats_rollups` rows per tenant and hour/day bucket,
+with one upsert per bucket that adds to the stored counters. Recording an
+outcome never waits on the database, so it is safe on the voice event loop. `GET /api/stats` reads those few
+rows instead of aggregating over `help_requests`. Counts buffered since the
+last flush are lost if the process dies.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from ..config import Config
+from ..db import SessionLocal
+from ..models import DEFAULT_TENANT, StatsRollup
+
+logger = logging.getLogger("stats")
+
+COUNTERS = ("calls", "kb_answered", "escalated", "coalesced", "resolved", "timed_out", "resolution_seconds")
+GRANULARITIES = ("hour", "day")
+
+
+def bucket_start(at: datetime, granularity: str) -> datetime:
+    if granularity == "day":
+        return at.replace(hour=0, minute=0, second=0, microsecond=0)
+    return at.replace(minute=0, second=0, microsecond=0)
+
+
+class StatsRecorder:
+    """Buffers outcome counters per (tenant, hour) and upserts them into the rollup table."""
+
+    def __init__(self, db_session_factory=SessionLocal, flush_interval: float = Config.STATS_FLUSH_SECONDS):
+        self.db_session_factory = db_session_factory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, datetime], Counter] = defaultdict(Counter)
+        self._last_flush = time.monotonic()
+        self._flusher: Optional[threading.Thread] = None
+
+    def add(self, tenant_id: Optional[str] = None, at: Optional[datetime] = None, **counts: float):
+        """Count outcomes, e.g. add(tenant, calls=1, kb_answered=1); the background flusher writes them later."""
+        key = (tenant_id or DEFAULT_TENANT, bucket_start(at or datetime.utcnow(), "hour"))
+        with self._lock:
+            self._pending[key].update(counts)
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, name="stats-flush", daemon=True)
+                self._flusher.start()
+
+    def _run(self):
+        while True:
+            # Floor the wait so a zero interval doesn't spin
+            time.sleep(max(0.1, self._last_flush + self.flush_interval - time.monotonic()))
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def flush(self) -> int:
+        """Write buffered counters. Returns the number of (tenant, hour) buckets written."""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(Counter)
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        db = self.db_session_factory()
+        try:
+            for (tenant_id, hour), counts in pending.items():
+                for granularity in GRANULARITIES:
+                    self._upsert(db, tenant_id, granularity, bucket_start(hour, granularity), counts)
+            db.commit()
+            return len(pending)
+        except Exception:
+            db.rollback()
+            # Keep the counts for the next attempt
+            with self._lock:
+                for key, counts in pending.items():
+                    self._pending[key].update(counts)
+            logger.exception("stats flush failed")
+            return 0
+        finally:
+            db.close()
+
+    def _upsert(self, db: Session, tenant_id: str, granularity: str, start: datetime, counts: Counter):
+        values = {c: counts.get(c, 0) for c in COUNTERS}
+        dialect = db.get_bind().dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            insert = sqlite_insert if dialect == "sqlite" else pg_insert
+            stmt = insert(StatsRollup).values(
+                tenant_id=tenant_id, granularity=granularity, bucket_start=start, **values
+            )
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=["tenant_id", "granularity", "bucket_start"],
+                set_={c: getattr(StatsRollup, c) + stmt.excluded[c] for c in COUNTERS},
+            ))
+            return
+        updated = db.query(StatsRollup).filter(
+            StatsRollup.tenant_id == tenant_id,
+            StatsRollup.granularity == granularity,
+            StatsRollup.bucket_start == start,
+        ).update({getattr(StatsRollup, c): getattr(StatsRollup, c) + v for c, v in values.items()},
+                 synchronize_session=False)
+        if not updated:
+            db.add(StatsRollup(tenant_id=tenant_id, granularity=granularity, bucket_start=start, **values))
+
+
+_recorders: Dict[Any, StatsRecorder] = {}
+_recorders_lock = threading.Lock()
+
+
+def get_stats_recorder(db_session_factory=SessionLocal) -> StatsRecorder:
+    """Process-wide recorder per database (keyed by session factory)."""
+    with _recorders_lock:
+        recorder = _recorders.get(db_session_factory)
+        if recorder is None:
+            recorder = _recorders[db_session_factory] = StatsRecorder(db_session_factory)
+        return recorder
+
+
+def _derived(row: Dict[str, Any]) -> Dict[str, Any]:
+    closed = row["resolved"] + row["timed_out"]
+    row["answer_rate"] = round(row["kb_answered"] / row["calls"], 4) if row["calls"] else None
+    row["timeout_rate"] = round(row["timed_out"] / closed, 4) if closed else None
+    row["avg_resolution_seconds"] = round(row["resolution_seconds"] / row["resolved"], 1) if row["resolved"] else None
+    return row
+
+
+class StatsService:
+    """Read side: rollup rows for a time range, summed across tenants unless one is given."""
+
+    def __init__(self, db_session_factory=SessionLocal):
+        self.db_session_factory = db_session_factory
+        self.recorder = get_stats_recorder(db_session_factory)
+
+    def rollups(
+        self,
+        granularity: str = "hour",
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        tenant_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {GRANULARITIES}")
+        # Include outcomes still buffered in this process
+        self.recorder.flush()
+
+        db = self.db_session_factory()
+        try:
+            q = db.query(StatsRollup).filter(StatsRollup.granularity == granularity)
+            if since:
+                q = q.filter(StatsRollup.bucket_start >= bucket_start(since, granularity))
+            if until:
+                q = q.filter(StatsRollup.bucket_start <= until)
+            if tenant_id:
+                q = q.filter(StatsRollup.tenant_id == tenant_id)
+            buckets: Dict[datetime, Counter] = defaultdict(Counter)
+            for row in q.order_by(StatsRollup.bucket_start):
+                buckets[row.bucket_start].update({c: getattr(row, c) or 0 for c in COUNTERS})
+        finally:
+            db.close()
+
+        series: List[Dict[str, Any]] = [
+            _derived({"bucket_start": start.isoformat(), **{c: counts.get(c, 0) for c in COUNTERS}})
+            for start, counts in sorted(buckets.items())
+        ]
+        totals = Counter()
+        for counts in buckets.values():
+            totals.update(counts)
+        return {
+            "granularity": granularity,
+            "buckets": series,
+            "totals": _derived({c: totals.get(c, 0) for c in COUNTERS}),
+        }
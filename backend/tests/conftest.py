@@ -2,6 +2,12 @@
 import pytest
 import sys
 import os
+import tempfile
+
+# Run tests against a throwaway SQLite file instead of the tracked local.db.
+# Must be set before backend.config is imported (load_dotenv does not override it).
+_test_db_dir = tempfile.mkdtemp(prefix="frontdesk-tests-")
+os.environ["DB_URL"] = os.getenv("TEST_DB_URL", f"sqlite:///{os.path.join(_test_db_dir, 'test.db')}")
 
 # Add project root to path
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
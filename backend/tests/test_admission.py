@@ -0,0 +1,81 @@
+import os
+import sys
+
+# Add project root to path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from sqlalchemy import create_engine, text
+
+from backend.admission import AdmissionController, LatencyTracker, TokenBucketLimiter
+
+
+def test_token_bucket_limits_refills_and_evicts_idle_keys():
+    limiter = TokenBucketLimiter(rate=1.0, burst=2, max_keys=100)
+
+    assert limiter.acquire("+1", now=0.0) == 0.0
+    assert limiter.acquire("+1", now=0.0) == 0.0
+    assert limiter.acquire("+1", now=0.0) == 1.0  # burst spent, next token in 1s
+    assert limiter.acquire("+1", now=1.0) == 0.0
+    # Other keys have their own bucket
+    assert limiter.acquire("+2", now=1.0) == 0.0
+    assert len(limiter) == 2
+
+    # Once a bucket has been idle long enough to refill completely it is forgotten
+    assert limiter.acquire("+3", now=3.5) == 0.0
+    assert len(limiter) == 1
+
+
+def test_token_bucket_caps_tracked_keys():
+    limiter = TokenBucketLimiter(rate=0.01, burst=1, max_keys=3)
+    for i in range(10):
+        limiter.acquire(f"+{i}", now=float(i))
+    assert len(limiter) <= 3
+
+
+def test_admission_rate_limits_and_sheds_load():
+    admission = AdmissionController(
+        per_caller=TokenBucketLimiter(rate=0.1, burst=1),
+        global_limit=TokenBucketLimiter(rate=1.0, burst=2),
+        max_inflight=1,
+        shed_latency_ms=100,
+        shed_retry_after=3,
+    )
+
+    assert admission.check("+1", now=0.0).admitted
+    limited = admission.check("+1", now=0.0)
+    assert (limited.admitted, limited.reason, limited.retry_after) == (False, "caller_rate_limited", 10)
+
+    assert admission.check("+2", now=0.0).admitted
+    assert admission.check("+3", now=0.0).reason == "rate_limited"
+    # The global rejection didn't spend +3's own token
+    assert admission.check("+3", now=1.0).admitted
+
+    with admission.track():
+        shed = admission.check("+4", now=10.0)
+        assert (shed.reason, shed.retry_after) == ("overloaded", 3)
+    assert admission.check("+4", now=10.0).admitted
+
+    admission.latency = LatencyTracker(alpha=1.0, half_life_seconds=1.0)
+    admission.latency.observe(250.0, now=20.0)
+    assert admission.check("+5", now=20.0).reason == "db_slow"
+    # With no statements running while shedding, the average decays and traffic resumes
+    assert admission.check("+5", now=22.0).admitted
+
+
+def test_latency_tracker_times_request_statements_only():
+    engine = create_engine("sqlite://")
+    tracker = LatencyTracker(alpha=1.0, half_life_seconds=0)
+    tracker.attach(engine)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))  # background work: not measured
+        assert tracker.ewma_ms == 0
+        with tracker.measure():
+            conn.execute(text("SELECT 1"))
+            try:
+                conn.execute(text("SELECT * FROM missing_table"))
+            except Exception:
+                pass
+        assert not conn.info["admission_started"]
+    assert tracker.ewma_ms > 0
@@ -0,0 +1,96 @@
+import json
+import os
+import shutil
+import sys
+
+# Add project root to path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from backend.ai_agent import AIAgent, PROMPTS_PATH
+from backend.business_info import BusinessIntents
+from backend.db import engine, SessionLocal
+from backend.models import Base, HelpRequest
+
+
+def setup_module(module):
+    """Ensure database tables exist before running tests."""
+    Base.metadata.create_all(bind=engine)
+
+
+def test_business_intents_and_hot_reload(tmp_path):
+    path = str(tmp_path / "info.json")
+    shutil.copy(PROMPTS_PATH, path)
+    intents = BusinessIntents(path, reload_interval=0)
+
+    assert intents.lookup("How much is a balayage?").answer == "A balayage costs ₹5000 - ₹8000."
+    assert intents.lookup("What are your opening hours?").name == "hours"
+    assert intents.lookup("Can I cancel my appointment?").name == "policy:cancellation"
+    assert intents.lookup("Do you take walk-ins?").name == "policy:walkin"
+    # Not covered by the static info
+    assert intents.lookup("Are you open on the holiday?") is None
+    assert intents.lookup("Are you open on Thanksgiving?") is None
+    assert intents.lookup("Are you open Easter Sunday?") is None
+    assert intents.lookup("Are you open on July 4th?") is None
+    assert intents.lookup("What time do you close on 12/24?") is None
+    assert intents.lookup("Do you have parking?") is None
+
+    with open(path) as f:
+        data = json.load(f)
+    data["hours"] = "Mon-Sun 10:00-20:00"
+    with open(path, "w") as f:
+        json.dump(data, f)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert intents.lookup("When do you close?").answer == "We're open Mon-Sun 10:00-20:00."
+
+
+def test_agent_answers_from_business_info_without_escalating():
+    agent = AIAgent()
+    db = SessionLocal()
+    try:
+        before = db.query(HelpRequest).count()
+    finally:
+        db.close()
+
+    result = agent.handle_incoming({"name": "Price Caller", "phone": "+1000501"}, "What does a pedicure cost?")
+    assert result == {"action": "responded", "answer": "A pedicure costs ₹800."}
+
+    db = SessionLocal()
+    try:
+        assert db.query(HelpRequest).count() == before
+    finally:
+        db.close()
+
+
+def test_agent_uses_per_tenant_business_info(tmp_path):
+    with open(PROMPTS_PATH) as f:
+        data = json.load(f)
+    data["services"] = {"pedicure": "₹950"}
+    with open(tmp_path / "north.json", "w") as f:
+        json.dump(data, f)
+    agent = AIAgent(tenants_dir=str(tmp_path))
+
+    caller = {"name": "Tenant Caller", "phone": "+1000502"}
+    assert agent.handle_incoming(caller, "What does a pedicure cost?", "north")["answer"] == "A pedicure costs ₹950."
+
+    # A tenant without a business-info file escalates, and the request is tagged with the tenant
+    result = agent.handle_incoming(caller, "What does a pedicure cost?", "south")
+    assert result["action"] == "escalated"
+    db = SessionLocal()
+    try:
+        assert db.get(HelpRequest, result["request_id"]).tenant_id == "south"
+    finally:
+        db.close()
+
+
+def test_learned_kb_answers_win_over_business_info(tmp_path):
+    shutil.copy(PROMPTS_PATH, tmp_path / "holiday-test.json")
+    agent = AIAgent(tenants_dir=str(tmp_path))
+    agent.kb_for("holiday-test").create_entry("Are you open on Thanksgiving day?", "No, we're closed on Thanksgiving.")
+
+    match = agent.find_answer("are you open on thanksgiving", "holiday-test")
+    assert match["answer_text"] == "No, we're closed on Thanksgiving."
+    # Questions the KB doesn't know still get the static info
+    assert agent.find_answer("What are your opening hours?", "holiday-test")["source"] == "business_info"
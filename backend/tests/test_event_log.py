@@ -0,0 +1,104 @@
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Add project root to path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from backend.db import engine, SessionLocal
+from backend.models import Base, Customer, HelpRequest, Supervisor
+from backend.services.event_log import EventLogService
+from backend.services.help_request_service import HelpRequestService
+
+
+def setup_module(module):
+    """Ensure database tables exist before running tests."""
+    Base.metadata.create_all(bind=engine)
+
+
+def test_state_transitions_are_logged_in_sequence():
+    tenant = "events-test"
+    db = SessionLocal()
+    try:
+        first = Customer(name="Event One", phone="+1000901", tenant_id=tenant)
+        second = Customer(name="Event Two", phone="+1000902", tenant_id=tenant)
+        sup = Supervisor(name="Event Supervisor")
+        db.add_all([first, second, sup])
+        db.commit()
+        first_id, second_id, sup_id = first.id, second.id, sup.id
+    finally:
+        db.close()
+
+    events = EventLogService()
+    start = max([e["seq"] for e in events.list_events(limit=10**6)] or [0])
+
+    svc = HelpRequestService()
+    hr, _ = svc.create_or_join_help_request(first_id, "Do you sell gift cards events test?", tenant)
+    svc.create_or_join_help_request(second_id, "do you sell gift cards events test", tenant)
+    svc.claim_requests(supervisor_id=sup_id, limit=1, tenant_id=tenant)
+    svc.resolve_request(hr.id, "Yes", supervisor_id=sup_id)
+
+    other = svc.create_help_request(first_id, "Can I bring snacks events test?", tenant)
+    db = SessionLocal()
+    try:
+        db.query(HelpRequest).filter(HelpRequest.id == other.id).update(
+            {"timeout_at": datetime.utcnow() - timedelta(seconds=1)})
+        db.commit()
+    finally:
+        db.close()
+    assert other.id in [r.id for r in svc.check_and_mark_timeouts()]
+
+    log = events.list_events(after=start, tenant_id=tenant)
+    assert [(e["request_id"], e["type"]) for e in log] == [
+        (hr.id, "created"), (hr.id, "joined"), (hr.id, "claimed"), (hr.id, "resolved"),
+        (other.id, "created"), (other.id, "timed_out"),
+    ]
+    assert [e["seq"] for e in log] == sorted(e["seq"] for e in log)
+    assert log[3]["from_state"] == "pending" and log[3]["to_state"] == "resolved"
+    assert log[1]["data"] == {"customer_id": second_id}
+
+    # Tailing resumes strictly after the last seen sequence number
+    assert events.list_events(after=log[3]["seq"], tenant_id=tenant) == log[4:]
+    assert events.list_events(after=log[-1]["seq"], tenant_id=tenant) == []
+
+
+def test_long_poll_wakes_on_new_event():
+    events = EventLogService()
+    last = max([e["seq"] for e in events.list_events(limit=10**6)] or [0])
+    db = SessionLocal()
+    try:
+        cust = Customer(name="Poller", phone="+1000903", tenant_id="poll-test")
+        db.add(cust)
+        db.commit()
+        cust_id = cust.id
+    finally:
+        db.close()
+
+    timer = threading.Timer(0.1, lambda: HelpRequestService().create_help_request(cust_id, "poll test", "poll-test"))
+    timer.start()
+    started = time.perf_counter()
+    got = events.list_events(after=last, wait_seconds=5)
+    timer.join()
+    assert [e["type"] for e in got] == ["created"]
+    assert time.perf_counter() - started < 2
+
+
+def test_event_writers_are_commit_ordered_or_rejected():
+    """seq must become visible in order: SQLite needs nothing, databases without the ordering lock are refused."""
+    import pytest
+    from sqlalchemy import create_mock_engine
+    from sqlalchemy.orm import Session
+    from backend.services.event_log import _order_writers
+
+    db = SessionLocal()
+    try:
+        _order_writers(db)
+    finally:
+        db.close()
+
+    with pytest.raises(RuntimeError):
+        _order_writers(Session(bind=create_mock_engine("mysql://", lambda *args, **kwargs: None)))
@@ -7,9 +7,16 @@ project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(_
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
+import dataclasses
+
+import pytest
+
+from backend.ai_agent import AIAgent
 from backend.db import engine, SessionLocal
 from backend.models import Base, Customer
+from backend.records import CustomerRecord, HelpRequestRecord, KBEntryRecord
 from backend.services.help_request_service import HelpRequestService
+from backend.services.kb_services import KBService
 
 
 def setup_module(module):
@@ -39,3 +46,245 @@ def test_create_help_request_and_resolve():
 
     finally:
         db.close()
+
+
+def test_duplicate_pending_questions_coalesce():
+    """A second caller asking the same pending question subscribes instead of escalating again."""
+    db = SessionLocal()
+    try:
+        first = Customer(name="Caller One", phone="+1000101")
+        second = Customer(name="Caller Two", phone="+1000102")
+        db.add_all([first, second])
+        db.commit()
+        db.refresh(first)
+        db.refresh(second)
+
+        svc = HelpRequestService()
+        hr, created = svc.create_or_join_help_request(first.id, "Are you open on the holiday test?")
+        assert created
+        joined, created = svc.create_or_join_help_request(second.id, "are you open on the holiday test")
+        assert not created
+        assert joined.id == hr.id
+
+        other, created = svc.create_or_join_help_request(second.id, "Do you sell shampoo test?")
+        assert created and other.id != hr.id
+
+        phones = [c["phone"] for c in svc.waiting_callers(hr.id)]
+        assert phones == ["+1000101", "+1000102"]
+
+        # Resolved requests are no longer joinable
+        svc.resolve_request(hr.id, "Closed on holidays", supervisor_id=1)
+        fresh, created = svc.create_or_join_help_request(second.id, "Are you open on the holiday test?")
+        assert created and fresh.id != hr.id
+    finally:
+        db.close()
+
+
+def test_coalescing_narrows_by_hash_and_pending_trigram_index():
+    """Exact duplicates match by hash; near ones via the tenant's pending index, which only reads new rows."""
+    tenant = "coalesce-narrow"
+    db = SessionLocal()
+    try:
+        first = Customer(name="Narrow One", phone="+1000111", tenant_id=tenant)
+        second = Customer(name="Narrow Two", phone="+1000112", tenant_id=tenant)
+        db.add_all([first, second])
+        db.commit()
+        first_id, second_id = first.id, second.id
+    finally:
+        db.close()
+
+    svc = HelpRequestService()
+    hr, _ = svc.create_or_join_help_request(first_id, "Do you offer keratin treatments narrow test?", tenant)
+    # Another worker's service finds it by hash without building an index
+    other = HelpRequestService()
+    joined, created = other.create_or_join_help_request(second_id, "do you offer keratin treatments, narrow test", tenant)
+    assert not created and joined.id == hr.id
+    assert tenant not in other._pending
+
+    near = svc.find_pending_match("Do you offer keratin treatment narrow test?", tenant)
+    assert near is not None and near.id == hr.id
+    pending = svc._pending[tenant]
+    doc = pending.index.docs[hr.id]
+    assert svc.find_pending_match("Is there parking behind the salon narrow test?", tenant) is None
+    assert pending.index.docs[hr.id] is doc  # not re-read
+
+    # Requests that leave PENDING drop out of the index
+    svc.resolve_request(hr.id, "Yes, $150", supervisor_id=1)
+    assert svc.find_pending_match("Do you offer keratin treatment narrow test?", tenant) is None
+    assert hr.id not in pending.index.docs
+
+
+def test_claim_queue_leases_earliest_deadline_first():
+    """Claims hand out disjoint requests by priority, balance load and reclaim expired leases."""
+    from concurrent.futures import ThreadPoolExecutor
+    from datetime import datetime, timedelta
+    from backend.models import HelpRequest, Supervisor
+
+    tenant = "claim-test"
+    db = SessionLocal()
+    try:
+        cust = Customer(name="Queue Caller", phone="+1000701", tenant_id=tenant)
+        sup_a, sup_b = Supervisor(name="A"), Supervisor(name="B")
+        db.add_all([cust, sup_a, sup_b])
+        db.commit()
+        cust_id, a, b = cust.id, sup_a.id, sup_b.id
+    finally:
+        db.close()
+
+    svc = HelpRequestService()
+    now = datetime.utcnow()
+    ids = []
+    # Deadlines hours apart dominate the repeat-caller credit
+    for hours in (5, 1, 3, 2, 4, 6):
+        hr = svc.create_help_request(cust_id, f"queue question {hours}", tenant_id=tenant)
+        db = SessionLocal()
+        try:
+            db.query(HelpRequest).filter(HelpRequest.id == hr.id).update(
+                {"timeout_at": now + timedelta(hours=hours)})
+            db.commit()
+        finally:
+            db.close()
+        ids.append(hr.id)
+    svc.refresh_priorities(ids)
+    by_deadline = [ids[1], ids[3], ids[2], ids[4], ids[0], ids[5]]
+
+    sup, claimed = svc.claim_requests(supervisor_id=a, limit=2, tenant_id=tenant)
+    assert sup == a and [r.id for r in claimed] == by_deadline[:2]
+
+    # Least-loaded supervisor (not A, which holds two) gets the next one
+    sup, claimed = svc.claim_requests(limit=1, tenant_id=tenant)
+    assert sup != a and [r.id for r in claimed] == by_deadline[2:3]
+
+    # Expired leases return to the queue
+    db = SessionLocal()
+    try:
+        db.query(HelpRequest).filter(HelpRequest.id.in_(by_deadline[:2])).update(
+            {"lease_expires_at": now - timedelta(seconds=1)}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    sup, claimed = svc.claim_requests(supervisor_id=b, limit=2, tenant_id=tenant)
+    assert [r.id for r in claimed] == by_deadline[:2]
+
+    assert svc.release_request(by_deadline[0], b)
+    assert not svc.release_request(by_deadline[0], b)
+
+    # Concurrent claimers never receive the same request
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        results = list(pool.map(
+            lambda i: svc.claim_requests(supervisor_id=a, limit=1, tenant_id=tenant)[1], range(6)))
+    got = [r.id for batch in results for r in batch]
+    assert sorted(got) == sorted([by_deadline[0]] + by_deadline[3:])
+
+
+def test_resolve_respects_leases_and_races_with_timeouts():
+    """Only the lease holder (or anyone, once unclaimed/expired) resolves a PENDING request, exactly once."""
+    from datetime import datetime, timedelta
+    from backend.models import HelpRequest, HelpRequestState, Supervisor
+
+    tenant = "resolve-lease-test"
+    db = SessionLocal()
+    try:
+        cust = Customer(name="Lease Caller", phone="+1000751", tenant_id=tenant)
+        sup_a, sup_b = Supervisor(name="Lease A"), Supervisor(name="Lease B")
+        db.add_all([cust, sup_a, sup_b])
+        db.commit()
+        cust_id, a, b = cust.id, sup_a.id, sup_b.id
+    finally:
+        db.close()
+
+    svc = HelpRequestService()
+    hr = svc.create_help_request(cust_id, "lease question", tenant_id=tenant)
+    svc.claim_requests(supervisor_id=a, limit=1, tenant_id=tenant)
+    assert svc.resolve_request(hr.id, "from B", supervisor_id=b) is None
+    assert svc.resolve_request(hr.id, "from A", supervisor_id=a).response_text == "from A"
+    # Already closed: a second answer must not overwrite the first
+    assert svc.resolve_request(hr.id, "again", supervisor_id=a) is None
+    assert svc.get_request(hr.id).response_text == "from A"
+
+    # An expired lease no longer blocks other supervisors
+    hr = svc.create_help_request(cust_id, "expired lease question", tenant_id=tenant)
+    svc.claim_requests(supervisor_id=a, limit=1, tenant_id=tenant)
+    db = SessionLocal()
+    try:
+        db.query(HelpRequest).filter(HelpRequest.id == hr.id).update(
+            {"lease_expires_at": datetime.utcnow() - timedelta(seconds=1)})
+        db.commit()
+    finally:
+        db.close()
+    assert svc.resolve_request(hr.id, "from B", supervisor_id=b) is not None
+
+    # A timed-out request can't be resolved, and a resolved one is never timed out
+    late = svc.create_help_request(cust_id, "late question", tenant_id=tenant)
+    answered = svc.create_help_request(cust_id, "answered question", tenant_id=tenant)
+    svc.resolve_request(answered.id, "done")
+    db = SessionLocal()
+    try:
+        db.query(HelpRequest).filter(HelpRequest.id.in_([late.id, answered.id])).update(
+            {"timeout_at": datetime.utcnow() - timedelta(seconds=1)}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    expired = [r for r in svc.check_and_mark_timeouts() if r.tenant_id == tenant]
+    assert [r.id for r in expired] == [late.id]
+    assert expired[0].state == HelpRequestState.UNRESOLVED
+    assert svc.get_request(answered.id).state == HelpRequestState.RESOLVED
+    assert svc.resolve_request(late.id, "too late") is None
+
+
+def test_priority_favors_waiting_and_repeat_callers():
+    """Pending requests are served by score: deadline, repeat callers and waiting callers."""
+    from backend.services.help_request_service import priority_score
+
+    tenant = "priority-test"
+    db = SessionLocal()
+    try:
+        regular = Customer(name="Regular", phone="+1000801", tenant_id=tenant)
+        newcomer = Customer(name="Newcomer", phone="+1000802", tenant_id=tenant)
+        other = Customer(name="Other", phone="+1000803", tenant_id=tenant)
+        db.add_all([regular, newcomer, other])
+        db.commit()
+        regular_id, newcomer_id, other_id = regular.id, newcomer.id, other.id
+    finally:
+        db.close()
+
+    svc = HelpRequestService()
+    first = svc.create_help_request(newcomer_id, "Do you do bridal packages priority test?", tenant_id=tenant)
+    for i in range(2):
+        svc.resolve_request(svc.create_help_request(regular_id, f"old {i}", tenant_id=tenant).id, "ok")
+    repeat = svc.create_help_request(regular_id, "Can I bring my dog priority test?", tenant_id=tenant)
+
+    # Created later (later deadline) but the caller has asked twice before
+    pending = svc.list_requests(state="pending", tenant_id=tenant)
+    assert [r.id for r in pending] == [repeat.id, first.id]
+    assert priority_score(pending[0]) > priority_score(pending[1])
+
+    # Another caller waiting on the first question moves it back to the top
+    svc.create_or_join_help_request(other_id, "Do you do bridal packages priority test?", tenant_id=tenant)
+    assert [r.id for r in svc.list_requests(state="pending", tenant_id=tenant)] == [first.id, repeat.id]
+    _, claimed = svc.claim_requests(limit=1, tenant_id=tenant)
+    assert [r.id for r in claimed] == [first.id]
+
+
+def test_services_return_detached_immutable_records():
+    """Service results are frozen __slots__ records, readable after their session closed."""
+    agent = AIAgent()
+    customer = agent.get_or_create_customer({"name": "Record Caller", "phone": "+1000701"}, "records-tenant")
+    assert isinstance(customer, CustomerRecord)
+    assert agent.get_or_create_customer({"phone": "+1000701"}, "records-tenant") == customer
+
+    svc = HelpRequestService()
+    hr = svc.create_help_request(customer.id, "Do you have a loyalty card for regulars?", "records-tenant")
+    assert isinstance(hr, HelpRequestRecord)
+    assert not hasattr(hr, "__dict__")
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        hr.state = "resolved"
+
+    listed = svc.list_requests(state="pending", tenant_id="records-tenant")
+    assert listed == [hr]
+    resolved = svc.resolve_request(hr.id, "Yes, every tenth visit is free.")
+    assert (resolved.state, resolved.response_text) == ("resolved", "Yes, every tenth visit is free.")
+    assert svc.get_request(hr.id) == resolved
+
+    entry = KBService(tenant_id="records-tenant").create_entry("Do you have a loyalty card?", "Yes.")
+    assert isinstance(entry, KBEntryRecord) and entry.tenant_id == "records-tenant"
@@ -0,0 +1,83 @@
+import os
+import sys
+
+# Add project root to path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from flask import Flask, jsonify
+
+from backend.db import engine, SessionLocal
+from backend.idempotency import IN_PROGRESS, PROCEED, IdempotencyStore, idempotent
+from backend.models import Base
+
+
+def setup_module(module):
+    """Ensure database tables exist before running tests."""
+    Base.metadata.create_all(bind=engine)
+
+
+def _app(store):
+    app = Flask(__name__)
+    calls = []
+
+    @app.route("/charge", methods=["POST"])
+    @idempotent(store)
+    def charge():
+        calls.append(1)
+        if len(calls) == 1 and app.config.get("FAIL_FIRST"):
+            return jsonify({"error": "boom"}), 500
+        return jsonify({"n": len(calls)})
+
+    return app, calls
+
+
+def test_replays_return_stored_response_without_rerunning_view():
+    app, calls = _app(IdempotencyStore(ttl_seconds=60, max_keys=100))
+    client = app.test_client()
+
+    first = client.post("/charge", json={"a": 1}, headers={"Idempotency-Key": "k1"})
+    replay = client.post("/charge", json={"a": 1}, headers={"Idempotency-Key": "k1"})
+    assert first.get_json() == replay.get_json() == {"n": 1}
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert len(calls) == 1
+
+    # Same key, different body
+    assert client.post("/charge", json={"a": 2}, headers={"Idempotency-Key": "k1"}).status_code == 422
+    # No key, or a new key, runs the view
+    assert client.post("/charge", json={"a": 1}).get_json() == {"n": 2}
+    assert client.post("/charge", json={"a": 1}, headers={"Idempotency-Key": "k2"}).get_json() == {"n": 3}
+
+
+def test_failed_requests_are_not_stored():
+    app, calls = _app(IdempotencyStore(ttl_seconds=60, max_keys=100))
+    app.config["FAIL_FIRST"] = True
+    client = app.test_client()
+
+    assert client.post("/charge", json={}, headers={"Idempotency-Key": "retry"}).status_code == 500
+    assert client.post("/charge", json={}, headers={"Idempotency-Key": "retry"}).get_json() == {"n": 2}
+
+
+def test_keys_expire_and_are_bounded():
+    store = IdempotencyStore(ttl_seconds=0, max_keys=100)
+    assert store.begin("a", "f")[0] == PROCEED
+    assert store.begin("a", "f")[0] == PROCEED  # already expired
+
+    store = IdempotencyStore(ttl_seconds=60, max_keys=2)
+    for key in "abcd":
+        store.begin(key, "f")
+    assert len(store) <= 3
+
+
+def test_table_store_is_shared_between_stores():
+    """Two stores on one database (e.g. two workers) see each other's keys."""
+    one = IdempotencyStore(ttl_seconds=60, max_keys=100, db_session_factory=SessionLocal)
+    two = IdempotencyStore(ttl_seconds=60, max_keys=100, db_session_factory=SessionLocal)
+    key = f"/charge:{os.getpid()}-shared"
+
+    assert one.begin(key, "f")[0] == PROCEED
+    assert two.begin(key, "f")[0] == IN_PROGRESS
+    one.complete(key, 200, b'{"n": 1}')
+    state, entry = two.begin(key, "f")
+    assert (state, entry.status_code, entry.body) == ("replay", 200, b'{"n": 1}')
@@ -1,5 +1,6 @@
 import sys
 import os
+import time
 
 # Add project root to path
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -9,6 +10,7 @@ if project_root not in sys.path:
 from backend.services.kb_services import KBService
 from backend.db import SessionLocal, engine
 from backend.models import KnowledgeBaseEntry, Base
+from backend.services.kb_search import question_hash
 
 
 def test_kb_create_and_find():
@@ -32,3 +34,271 @@ def test_kb_create_and_find():
     assert unique_answer in found["answer_text"], f"Answer text should contain '{unique_answer}', got '{found['answer_text']}'"
     
     print(f"✓ Test passed: Created and found KB entry #{e.id}")
+
+
+def test_kb_pipeline_matches_normalized_and_reports_stages():
+    """Case/punctuation variants and paraphrases resolve through the staged pipeline."""
+    Base.metadata.create_all(bind=engine)
+    # Full-index stages only; the hot tier has its own test
+    svc = KBService(tenant_id="kb-stages")
+    svc.hot_tier_size = 0
+
+    svc.create_entry("Do you validate parking for the garage test?", "Yes, bring your ticket (test answer)", created_by="test")
+
+    found, trace = svc.find_answer_with_trace("do you VALIDATE parking for the garage test")
+    assert found is not None
+    assert found["answer_text"] == "Yes, bring your ticket (test answer)"
+    assert trace.matched_stage == "exact"
+    assert [s.stage for s in trace.stages] == ["exact"]
+
+    found, trace = svc.find_answer_with_trace("do you validate parking for the garage tests")
+    assert found is not None
+    assert trace.matched_stage == "lexical"
+    assert [s.stage for s in trace.stages] == ["exact", "snapshot", "lexical"]
+    assert all(s.elapsed_ms >= 0 for s in trace.stages)
+
+    found, trace = svc.find_answer_with_trace("Is parking validated for the garage test?")
+    assert found is not None
+    assert trace.matched_stage == "rerank"
+    assert trace.stages[-1].candidates > 0
+
+    missing, trace = svc.find_answer_with_trace("zzqx unrelated qqq")
+    assert missing is None
+    assert trace.matched_stage is None
+
+
+def test_kb_update_bumps_version_and_swaps_snapshot():
+    """Re-answering a known question updates the entry; the new snapshot is published without touching the old one."""
+    import gc
+
+    Base.metadata.create_all(bind=engine)
+    svc = KBService()
+    reader = KBService()  # separate instance, same shared snapshot store
+
+    first = svc.create_entry("Is there a student discount test?", "10% off (test answer)", created_by="test")
+    reader.find_answer("warm the snapshot")
+    old_snapshot = reader.snapshots.current
+
+    second = svc.create_entry("is there a STUDENT discount test", "15% off (test answer)", created_by="test")
+    assert second.id == first.id
+    assert second.version == first.version + 1
+    assert reader.find_answer("Is there a student discount test?")["answer_text"] == "15% off (test answer)"
+
+    added = svc.create_entry("Do you sell gift cards test?", "Yes (test answer)", created_by="test")
+    current = reader.snapshots.current
+    assert current.version > old_snapshot.version
+    assert added.id in current.index.docs
+    assert added.id not in old_snapshot.index.docs
+
+    old_version = old_snapshot.version
+    del old_snapshot
+    gc.collect()
+    assert old_version not in reader.snapshots.live_versions()
+
+
+def test_kb_snapshot_picks_up_outside_writes_off_the_read_path():
+    """Lookups never query the table signature; a background check rebuilds after another process writes."""
+    Base.metadata.create_all(bind=engine)
+    svc = KBService(tenant_id="kb-snapshot-check")
+    svc.hot_tier_size = 0
+    svc.create_entry("Do you offer late night appointments?", "Until 10pm on Fridays.")
+    svc.find_answer("warm the snapshot")
+
+    # Written behind the service's back, as another worker process would
+    db = SessionLocal()
+    try:
+        db.add(KnowledgeBaseEntry(tenant_id="kb-snapshot-check", question_text="Is there a loyalty card?",
+                                  answer_text="Every tenth cut is free.", version=1))
+        db.commit()
+    finally:
+        db.close()
+
+    signature_queries = []
+    check = svc._signature
+    svc._signature = lambda db: signature_queries.append(1) or check(db)
+    svc.snapshot_check = 3600
+    svc.snapshots.checked_at = time.monotonic()
+    _, trace = svc.find_answer_with_trace("is there a loyalty card scheme")
+    assert signature_queries == []
+    assert trace.stages[1].stage == "snapshot"
+
+    svc.snapshot_check = 0
+    version = svc.snapshots.current.version
+    svc.find_answer("is there a loyalty card scheme")
+    for _ in range(100):
+        if svc.snapshots.current.version > version:
+            break
+        time.sleep(0.01)
+    assert signature_queries
+    assert svc.find_answer("is there a loyalty card scheme")["answer_text"] == "Every tenth cut is free."
+
+
+def test_kb_near_duplicates_merge_online_and_in_batch():
+    """Near-duplicate questions with the same answer become aliases at insert time; the batch job merges the rest."""
+    from backend.models import KnowledgeBaseAlias
+    from backend.services.kb_search import question_hash
+
+    Base.metadata.create_all(bind=engine)
+    svc = KBService()
+
+    dog = svc.create_entry("Can I bring my dog into the salon test?", "Small dogs only (test answer)", created_by="test")
+    merged = svc.create_entry("can i bring my dogs into the salon test", "Small dogs only, test answer", created_by="test")
+    assert merged.id == dog.id
+    assert merged.answer_text == "Small dogs only (test answer)"
+    assert svc.find_answer("can i bring my dogs into the salon test")["id"] == dog.id
+    cat = svc.create_entry("Can I bring my cat into the salon test?", "No cats (test answer)", created_by="test")
+    assert cat.id != dog.id
+
+    # A similar question with a different answer is its own entry; the original keeps its answer
+    day = svc.create_entry("What is the cancellation fee within 24 hours test?", "50% (test answer)", created_by="test")
+    two_days = svc.create_entry("What is the cancellation fee within 48 hours test?", "No fee (test answer)", created_by="test")
+    assert two_days.id != day.id
+    assert svc.find_answer("What is the cancellation fee within 24 hours test?")["answer_text"] == "50% (test answer)"
+
+    # Legacy duplicates written before online dedup existed
+    db = SessionLocal()
+    try:
+        for q, a in [("Do you do bridal makeup trials test?", "Yes, $80 (test answer)"),
+                     ("Do you do bridal make-up trials test?", "yes, $80 test answer"),
+                     ("Do you do bridal makeups trials test?", "Yes, $90 (test answer)")]:
+            db.add(KnowledgeBaseEntry(question_text=q, question_hash=question_hash(q), answer_text=a))
+        db.commit()
+    finally:
+        db.close()
+
+    report = svc.deduplicate()
+    assert report["entries_merged"] >= 1
+    assert report["entries_after"] == report["entries_before"] - report["entries_merged"]
+    assert any(c["distinct_answers"] == 2 for c in report["conflicts"])
+
+    found = svc.find_answer("Do you do bridal make-up trials test?")
+    assert found["answer_text"] == "Yes, $80 (test answer)"
+    assert svc.find_answer("Do you do bridal makeups trials test?")["answer_text"] == "Yes, $90 (test answer)"
+    db = SessionLocal()
+    try:
+        assert db.query(KnowledgeBaseAlias).filter(KnowledgeBaseAlias.entry_id == found["id"]).count() >= 1
+    finally:
+        db.close()
+    assert svc.deduplicate(dry_run=True)["entries_merged"] == 0
+
+
+def test_kb_batch_dedup_never_merges_different_answers():
+    """Dec 24 vs Dec 25 clear the similarity threshold but answer differently: reported, not merged."""
+    Base.metadata.create_all(bind=engine)
+    svc = KBService(tenant_id="kb-dedup-dates")
+    db = SessionLocal()
+    try:
+        for q, a in [("Are you open on December 24th this year?", "Yes, 9am-2pm on Dec 24."),
+                     ("Are you open on December 25th this year?", "No, we are closed on Christmas Day.")]:
+            db.add(KnowledgeBaseEntry(tenant_id="kb-dedup-dates", question_text=q,
+                                      question_hash=question_hash(q), answer_text=a, version=1))
+        db.commit()
+    finally:
+        db.close()
+
+    preview = svc.deduplicate(dry_run=True)
+    assert preview["entries_merged"] == 0
+    assert len(preview["conflicts"]) == 1 and preview["conflicts"][0]["distinct_answers"] == 2
+
+    report = svc.deduplicate()
+    assert report["entries_merged"] == 0 and report["entries_after"] == 2
+    assert svc.find_answer("Are you open on December 24th this year?")["answer_text"] == "Yes, 9am-2pm on Dec 24."
+    assert svc.find_answer("Are you open on December 25th this year?")["answer_text"] == \
+        "No, we are closed on Christmas Day."
+
+
+def test_kb_tenants_are_isolated_and_indexes_evicted_lru():
+    """Each tenant sees only its own entries; resident indexes stay under the memory budget."""
+    from backend.services.kb_search import SnapshotStoreRegistry
+
+    Base.metadata.create_all(bind=engine)
+    north = KBService(tenant_id="north-test")
+    south = KBService(tenant_id="south-test")
+    north.create_entry("Is there parking behind the north salon?", "Yes, two spots (north)", created_by="test")
+
+    assert north.find_answer("is there parking behind the north salon")["answer_text"] == "Yes, two spots (north)"
+    assert south.find_answer("is there parking behind the north salon") is None
+    assert all(e["question_text"] != "Is there parking behind the north salon?" for e in south.list_entries())
+
+    rows = [(i, f"tenant question number {i} about services") for i in range(1, 30)]
+    one_tenant = SnapshotStoreRegistry(budget_bytes=10**9)
+    one_tenant.get("a").rebuild(lambda: rows, ("sig",))
+    size = one_tenant.get("a").approx_bytes
+    assert size > 0
+
+    registry = SnapshotStoreRegistry(budget_bytes=int(size * 2.5))
+    for key in ("a", "b", "c"):
+        registry.get(key).rebuild(lambda: rows, ("sig",))
+    registry.get("b")  # touch: "a" is now least recently used
+    registry.get("d")  # triggers eviction
+    assert registry.resident() == ["c", "b", "d"]
+    assert registry.stats()["evictions"] == 1
+    # An evicted tenant comes back empty and is rebuilt lazily on its next lookup
+    assert registry.get("a").current.signature is None
+
+    # Lookups of resident stores don't wait for the registry lock
+    import threading
+    with registry._lock:
+        reader = threading.Thread(target=registry.get, args=("b",))
+        reader.start()
+        reader.join(timeout=1)
+        assert not reader.is_alive()
+
+
+def test_kb_hits_are_batched_and_feed_the_hot_tier():
+    """Hits are buffered until flush; the most-hit entries are searched before the rest of the KB."""
+    Base.metadata.create_all(bind=engine)
+    svc = KBService(tenant_id="kb-hits")
+    hot = svc.create_entry("Do you sell hair care products for curly hair?", "Yes, a full curly range.")
+    cold = svc.create_entry("Do you offer keratin treatments for frizzy hair?", "Yes, from ₹3000.")
+
+    for _ in range(3):
+        assert svc.find_answer("Do you sell hair care products for curly hair?")["id"] == hot.id
+    assert svc.hits.pending()[hot.id] == 3
+    db = SessionLocal()
+    try:
+        assert (db.get(KnowledgeBaseEntry, hot.id).hit_count or 0) == 0
+    finally:
+        db.close()
+
+    assert svc.refresh_hot_tier() == [hot.id]
+    assert svc.hits.pending() == {}
+    popular = svc.popular_entries(limit=2)
+    assert [e["id"] for e in popular] == [hot.id, cold.id]
+    assert popular[0]["hit_count"] == 3 and popular[0]["last_hit_at"]
+
+    # A paraphrase of the hot entry is answered by the hot tier alone
+    found, trace = svc.find_answer_with_trace("do you sell hair care product for curly hair")
+    assert found["id"] == hot.id
+    assert trace.matched_stage == "hot"
+    assert [s.stage for s in trace.stages] == ["exact", "snapshot", "hot"]
+
+    # A cold entry is still found once the hot tier misses
+    found, trace = svc.find_answer_with_trace("do you offer keratin treatment for frizzy hair")
+    assert found["id"] == cold.id
+    assert [s.stage for s in trace.stages][:4] == ["exact", "snapshot", "hot", "lexical"]
+
+
+def test_kb_hot_tier_needs_a_confident_match_and_refreshes_in_background():
+    """A weak hot-tier match falls through to the full index; a stale tier never blocks a lookup."""
+    Base.metadata.create_all(bind=engine)
+    svc = KBService(tenant_id="kb-hot-confidence")
+    sunday = svc.create_entry("What time do you close on Sundays?", "We close at 5pm on Sundays.")
+    weekday = svc.create_entry("What time do you close on weekdays and Saturday?", "We close at 7pm.")
+    svc.hits.record(sunday.id)
+    svc.refresh_hot_tier()
+
+    found, trace = svc.find_answer_with_trace("what time do you close on saturday and weekdays please")
+    assert found["id"] == weekday.id
+    assert trace.matched_stage in ("lexical", "rerank")
+    assert trace.stages[2].stage == "hot" and not trace.stages[2].hit
+
+    # A write makes the tier stale: the next lookup skips it and a background refresh recuts it
+    svc.create_entry("Do you have gift vouchers?", "Yes, any amount.")
+    _, trace = svc.find_answer_with_trace("what time do you close on sundays please")
+    assert "hot" not in [s.stage for s in trace.stages]
+    for _ in range(100):
+        if svc.snapshots.hot_index() is not None:
+            break
+        time.sleep(0.01)
+    assert svc.snapshots.hot_index() is not None
@@ -0,0 +1,120 @@
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Add project root to path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+api = pytest.importorskip("livekit.api")
+
+from backend.livekit_integration import LiveKitWrapper
+
+API_KEY = "devkey"
+API_SECRET = "devsecret-devsecret-devsecret"
+
+
+class RoomServiceStandIn(BaseHTTPRequestHandler):
+    """Minimal Twirp protobuf RoomService: ListRooms and DeleteRoom with admin-token auth."""
+
+    rooms = {}
+    calls = []
+
+    def log_message(self, *args):
+        pass
+
+    def _authorized(self, method):
+        """Same grants the LiveKit server checks: roomList to list, roomCreate to delete."""
+        token = self.headers.get("Authorization", "").replace("Bearer ", "")
+        try:
+            video = api.TokenVerifier(API_KEY, API_SECRET).verify(token).video
+        except Exception:
+            return False
+        return bool(video and (video.room_list if method == "ListRooms" else video.room_create))
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        method = self.path.rsplit("/", 1)[-1]
+        self.calls.append(method)
+        if not self._authorized(method):
+            return self._error(401, "unauthenticated", "bad token")
+        if method == "ListRooms":
+            return self._reply(api.ListRoomsResponse(rooms=list(self.rooms.values())))
+        if method == "DeleteRoom":
+            self.rooms.pop(api.DeleteRoomRequest.FromString(body).room, None)
+            return self._reply(api.DeleteRoomResponse())
+        return self._error(404, "bad_route", method)
+
+    def _reply(self, message):
+        self._send(200, "application/protobuf", message.SerializeToString())
+
+    def _error(self, status, code, msg):
+        self._send(status, "application/json", json.dumps({"code": code, "msg": msg}).encode())
+
+    def _send(self, status, content_type, data):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def room_server():
+    RoomServiceStandIn.rooms = {
+        "lobby": api.Room(sid="RM_1", name="lobby", num_participants=2, max_participants=10, creation_time=1),
+        "call-42": api.Room(sid="RM_2", name="call-42", num_participants=1, max_participants=10, creation_time=2),
+    }
+    RoomServiceStandIn.calls = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RoomServiceStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"ws://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_list_and_delete_rooms_against_stand_in(room_server):
+    lk = LiveKitWrapper(API_KEY, API_SECRET, url=room_server)
+    lk.room_cache_seconds = 60
+
+    listed = lk.list_rooms()
+    assert listed["status"] == "success" and not listed["cached"]
+    assert sorted(r["name"] for r in listed["rooms"]) == ["call-42", "lobby"]
+    assert lk.list_rooms()["cached"]
+    assert RoomServiceStandIn.calls == ["ListRooms"]
+
+    assert lk.delete_room("call-42") == {"status": "success", "room_name": "call-42"}
+    relisted = lk.list_rooms()
+    assert not relisted["cached"]
+    assert [r["name"] for r in relisted["rooms"]] == ["lobby"]
+
+    bad = LiveKitWrapper(API_KEY, "wrong-secret", url=room_server)
+    assert "error" in bad.list_rooms()
+
+
+def test_token_cache_reuses_identical_requests():
+    lk = LiveKitWrapper(API_KEY, API_SECRET)
+    first = lk.generate_token("room-a", "caller-1", "Caller")
+    assert first is not None
+    assert lk.generate_token("room-a", "caller-1", "Caller") == first
+    assert lk.generate_token("room-b", "caller-1", "Caller") != first
+    assert lk.generate_token("room-a", "caller-1", "Caller", can_publish=False) != first
+
+    # Never reused past half of a short TTL
+    short = lk.generate_token("room-a", "caller-2", ttl_seconds=0)
+    assert ("room-a", "caller-2", "caller-2", 0, True, True) not in lk._token_cache
+    assert short is not None
+
+    batch = lk.generate_tokens("room-a", [{"participant_id": "caller-1", "participant_name": "Caller"},
+                                          {"participant_id": "caller-3", "room_name": "room-c"},
+                                          {"participant_name": "no id"},
+                                          "caller-4"])
+    assert batch[0]["token"] == first
+    assert batch[1]["room_name"] == "room-c" and batch[1]["token"]
+    assert "error" in batch[2]
+    assert "error" in batch[3]
@@ -0,0 +1,96 @@
+import os
+import sys
+from datetime import datetime
+
+# Add project root to path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from sqlalchemy import create_engine, inspect, text
+
+from backend.migrations import check_schema, schema_revisions, upgrade_database
+from backend.models import Base
+from backend.services.help_request_service import priority_key
+from backend.services.kb_search import question_hash
+
+HOT_PATH_INDEXES = {
+    "ix_help_requests_state_timeout_at", "ix_help_requests_state_created_at",
+    "ix_customers_phone", "ix_knowledge_base_question_hash",
+}
+
+
+def _legacy_database(path):
+    """Tables as created before tenants, hashes, leases, priorities and hit counts existed."""
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE customers (id INTEGER PRIMARY KEY, name VARCHAR(128), phone VARCHAR(64), created_at DATETIME)"))
+        conn.execute(text(
+            "CREATE TABLE help_requests (id INTEGER PRIMARY KEY, customer_id INTEGER, question_text TEXT, "
+            "created_at DATETIME, state VARCHAR(32), assigned_supervisor_id INTEGER, response_text TEXT, "
+            "response_at DATETIME, timeout_at DATETIME)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE knowledge_base (id INTEGER PRIMARY KEY, question_text TEXT, answer_text TEXT, "
+            "source_request_id INTEGER, created_by VARCHAR(128), created_at DATETIME, version INTEGER, "
+            "tags VARCHAR(256), confidence VARCHAR(16))"
+        ))
+        conn.execute(text("INSERT INTO customers (id, name, phone) VALUES (1, 'Old Caller', '+1000001')"))
+        conn.execute(text(
+            "INSERT INTO help_requests (customer_id, question_text, created_at, state, timeout_at) "
+            "VALUES (1, 'Do you do henna?', '2024-01-01 10:00:00', 'pending', '2024-01-01 10:05:00')"
+        ))
+        conn.execute(text(
+            "INSERT INTO help_requests (customer_id, question_text, created_at, state) "
+            "VALUES (1, 'Do you do lashes?', '2024-01-01 11:00:00', 'pending')"
+        ))
+        conn.execute(text("INSERT INTO knowledge_base (question_text, answer_text) VALUES ('What are your hours?', '9-7')"))
+    return engine
+
+
+def test_alembic_chain_adopts_legacy_database(tmp_path):
+    """A pre-Alembic database gets the missing columns, backfills and hot-path indexes, idempotently."""
+    engine = _legacy_database(tmp_path / "legacy.db")
+    assert not check_schema(engine)
+
+    upgrade_database(engine)
+    upgrade_database(engine)  # already at head
+
+    current, heads = schema_revisions(engine)
+    assert current == heads and check_schema(engine)
+    inspector = inspect(engine)
+    indexes = {ix["name"]: ix["column_names"] for t in ("help_requests", "customers", "knowledge_base")
+               for ix in inspector.get_indexes(t)}
+    assert indexes["ix_help_requests_state_timeout_at"] == ["state", "timeout_at"]
+    assert indexes["ix_help_requests_state_created_at"] == ["state", "created_at"]
+    assert indexes["ix_customers_phone"] == ["phone"]
+    assert indexes["ix_knowledge_base_question_hash"] == ["question_hash"]
+    assert indexes["ix_knowledge_base_tenant_hits"] == ["tenant_id", "hit_count"]
+    assert indexes["ix_help_requests_tenant_state_hash"] == ["tenant_id", "state", "question_hash"]
+    with engine.connect() as conn:
+        stored, tenant, hits = conn.execute(text("SELECT question_hash, tenant_id, hit_count FROM knowledge_base")).one()
+        priorities = [p for (p,) in conn.execute(text("SELECT priority FROM help_requests ORDER BY id"))]
+        request_hashes = [h for (h,) in conn.execute(text("SELECT question_hash FROM help_requests ORDER BY id"))]
+    assert stored == question_hash("  what are your HOURS ")
+    assert request_hashes == [question_hash("Do you do henna?"), question_hash("Do you do lashes?")]
+    assert (tenant, hits) == ("default", 0)
+    # Deadline from timeout_at, or created_at + the 30 minute TTL; the caller's second request gets repeat credit
+    assert priorities == [
+        priority_key(datetime(2024, 1, 1, 10, 5), 0, 1),
+        priority_key(datetime(2024, 1, 1, 11, 30), 1, 1),
+    ]
+
+
+def test_baseline_is_frozen_and_head_matches_models(tmp_path):
+    """0001 leaves the hot-path indexes to 0002; at head a fresh database has exactly the models' schema."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    upgrade_database(engine, "0001")
+    inspector = inspect(engine)
+    baseline_indexes = {ix["name"] for t in inspector.get_table_names() for ix in inspector.get_indexes(t)}
+    assert not baseline_indexes & HOT_PATH_INDEXES
+
+    upgrade_database(engine)
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        assert {c["name"] for c in inspector.get_columns(table.name)} == {c.name for c in table.columns}, table.name
+        assert {ix["name"] for ix in inspector.get_indexes(table.name)} == {ix.name for ix in table.indexes}, table.name
@@ -0,0 +1,76 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+# Add project root to path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import pytest
+
+from backend.db import engine, SessionLocal
+from backend.models import Base, Customer, HelpRequest, HelpRequestArchive, HelpRequestState, HelpRequestSubscriber
+from backend.services.retention_service import RetentionService
+
+
+def setup_module(module):
+    """Ensure database tables exist before running tests."""
+    Base.metadata.create_all(bind=engine)
+
+
+def _make_requests(n_old_closed: int):
+    """Old closed requests (one with a subscriber), plus an old pending and a recent resolved one."""
+    db = SessionLocal()
+    try:
+        cust = Customer(name="Retention User", phone="+1000600")
+        db.add(cust)
+        db.commit()
+        old = datetime.utcnow() - timedelta(days=90)
+        closed = [
+            HelpRequest(customer_id=cust.id, question_text=f"old question {i} retention test", created_at=old,
+                        state=HelpRequestState.RESOLVED if i % 2 else HelpRequestState.UNRESOLVED,
+                        response_text="answer" if i % 2 else None)
+            for i in range(n_old_closed)
+        ]
+        pending = HelpRequest(customer_id=cust.id, question_text="old pending retention test", created_at=old,
+                              state=HelpRequestState.PENDING)
+        recent = HelpRequest(customer_id=cust.id, question_text="recent retention test",
+                             state=HelpRequestState.RESOLVED)
+        db.add_all(closed + [pending, recent])
+        db.commit()
+        db.add(HelpRequestSubscriber(help_request_id=closed[0].id, customer_id=cust.id, question_text="same"))
+        db.commit()
+        return [r.id for r in closed], pending.id, recent.id, cust.id
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("sink", ["table", "ndjson"])
+def test_archive_moves_old_closed_requests_in_batches(tmp_path, sink):
+    # Earlier tests may leave old closed rows; archive them first so counts are exact
+    RetentionService(sink="table").archive_closed(older_than_days=30, pause_seconds=0)
+    closed_ids, pending_id, recent_id, cust_id = _make_requests(7)
+    svc = RetentionService(sink=sink, archive_dir=str(tmp_path))
+
+    report = svc.archive_closed(older_than_days=30, batch_size=3, pause_seconds=0)
+    assert report["archived"] == 7 and report["batches"] == 3
+
+    db = SessionLocal()
+    try:
+        remaining = {r.id for r in db.query(HelpRequest.id)}
+        assert not remaining & set(closed_ids)
+        assert {pending_id, recent_id} <= remaining
+        assert db.query(HelpRequestSubscriber).filter(HelpRequestSubscriber.help_request_id == closed_ids[0]).count() == 0
+        in_table = db.query(HelpRequestArchive).filter(HelpRequestArchive.id.in_(closed_ids)).count()
+    finally:
+        db.close()
+    assert in_table == (7 if sink == "table" else 0)
+    if sink == "ndjson":
+        assert len(os.listdir(tmp_path)) == 3
+
+    archived = svc.get_archived(closed_ids[0])
+    assert archived["question_text"] == "old question 0 retention test"
+    assert archived["subscriber_customer_ids"] == [cust_id]
+    assert svc.get_archived(closed_ids[1])["state"] == HelpRequestState.RESOLVED
+    assert svc.get_archived(pending_id) is None
@@ -0,0 +1,76 @@
+import json
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+# Add project root to path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from flask import Flask, jsonify
+
+from backend.db import engine, SessionLocal
+from backend.models import Base, HelpRequest
+from backend.serializers import HELP_REQUEST, OrjsonProvider
+
+
+def setup_module(module):
+    """Ensure database tables exist before running tests."""
+    Base.metadata.create_all(bind=engine)
+
+
+def test_row_serializer_matches_for_orm_objects_and_projected_rows():
+    db = SessionLocal()
+    try:
+        hr = HelpRequest(
+            tenant_id="serializer-tenant", customer_id=1, question_text="Do you do nail art?",
+            created_at=datetime(2026, 1, 2, 3, 4, 5), state="pending",
+        )
+        db.add(hr)
+        db.commit()
+        row = db.query(*HELP_REQUEST.columns).filter(HelpRequest.id == hr.id).one()
+        assert not isinstance(row, HelpRequest)
+        assert HELP_REQUEST(row) == HELP_REQUEST(hr) == {
+            "id": hr.id,
+            "tenant_id": "serializer-tenant",
+            "customer_id": 1,
+            "question_text": "Do you do nail art?",
+            "created_at": "2026-01-02T03:04:05",
+            "state": "pending",
+            "response_text": None,
+        }
+    finally:
+        db.close()
+
+
+def test_orjson_provider_matches_default_output():
+    pytest.importorskip("orjson")
+    payload = {"b": [1, 2.5, None], "a": "₹800", "nested": {"z": True, "y": "x"}}
+
+    default_app = Flask(__name__)
+    fast_app = Flask(__name__)
+    fast_app.json = OrjsonProvider(fast_app)
+    with default_app.app_context():
+        expected = jsonify(payload).get_data()
+    with fast_app.app_context():
+        body = jsonify(payload).get_data()
+    assert json.loads(body) == json.loads(expected)
+    assert list(json.loads(body)) == ["a", "b", "nested"]
+    assert fast_app.json.loads(fast_app.json.dumps(payload)) == payload
+
+
+def test_orjson_provider_honours_dumps_arguments():
+    pytest.importorskip("orjson")
+    payload = {"b": 1, "a": {"d": [1, 2], "c": None}}
+    app = Flask(__name__)
+    app.json = OrjsonProvider(app)
+
+    assert app.json.dumps(payload, indent=2) == json.dumps(payload, indent=2, sort_keys=True)
+    assert list(json.loads(app.json.dumps(payload, sort_keys=False))) == ["b", "a"]
+    # Arguments orjson has no option for go through the stdlib encoder
+    assert app.json.dumps(payload, indent=4) == json.dumps(payload, indent=4, sort_keys=True)
+    assert app.json.dumps(payload, separators=(",", ":")) == json.dumps(payload, separators=(",", ":"), sort_keys=True)
+    assert app.json.loads('{"x": 1.5}', parse_float=str) == {"x": "1.5"}
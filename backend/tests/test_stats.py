@@ -0,0 +1,98 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+# Add project root to path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from backend.ai_agent import AIAgent
+from backend.db import engine, SessionLocal
+from backend.models import Base, HelpRequest
+from backend.services.help_request_service import HelpRequestService
+from backend.services.stats_service import StatsRecorder, StatsService, get_stats_recorder
+
+
+def setup_module(module):
+    """Ensure database tables exist before running tests."""
+    Base.metadata.create_all(bind=engine)
+
+
+def test_outcomes_roll_up_per_tenant():
+    tenant = "stats-tenant"
+    agent = AIAgent()
+    svc = HelpRequestService()
+    caller = {"name": "Stats Caller", "phone": "+1000901"}
+
+    agent.kb_for(tenant).create_entry("Do you offer bridal makeup?", "Yes, book a trial first.")
+
+    # Answered from the KB, escalated, then coalesced onto the same request
+    assert agent.handle_incoming(caller, "Do you offer bridal makeup?", tenant)["action"] == "responded"
+    first = agent.handle_incoming(caller, "Is there parking behind the salon?", tenant)
+    other = {"name": "Stats Caller 2", "phone": "+1000902"}
+    second = agent.handle_incoming(other, "Is there parking behind the salon?", tenant)
+    assert first["action"] == "escalated" and second["request_id"] == first["request_id"]
+
+    svc.resolve_request(first["request_id"], "Yes, free parking.", supervisor_id=None)
+    # Resolving again must not count twice
+    svc.resolve_request(first["request_id"], "Yes, free parking.", supervisor_id=None)
+
+    timed_out = agent.handle_incoming(caller, "Do you sell gift cards for spa days?", tenant)
+    db = SessionLocal()
+    try:
+        db.get(HelpRequest, timed_out["request_id"]).timeout_at = datetime.utcnow() - timedelta(seconds=1)
+        db.commit()
+    finally:
+        db.close()
+    svc.check_and_mark_timeouts()
+
+    result = StatsService().rollups("day", tenant_id=tenant)
+    totals = result["totals"]
+    assert totals["calls"] == 4
+    assert totals["kb_answered"] == 1
+    assert totals["escalated"] == 2
+    assert totals["coalesced"] == 1
+    assert totals["resolved"] == 1
+    assert totals["timed_out"] == 1
+    assert totals["answer_rate"] == 0.25
+    assert totals["timeout_rate"] == 0.5
+    assert len(result["buckets"]) == 1
+
+    # Hourly buckets add up to the same totals, and other tenants are excluded
+    hourly = StatsService().rollups("hour", since=datetime.utcnow() - timedelta(hours=2), tenant_id=tenant)
+    assert sum(b["calls"] for b in hourly["buckets"]) == 4
+    assert StatsService().rollups("day", tenant_id="stats-nobody")["totals"]["calls"] == 0
+
+
+def test_flush_adds_to_existing_rows():
+    tenant = "stats-upsert"
+    recorder = get_stats_recorder()
+    recorder.add(tenant, calls=2, kb_answered=1)
+    recorder.flush()
+    recorder.add(tenant, calls=3)
+    recorder.flush()
+    totals = StatsService().rollups("hour", tenant_id=tenant)["totals"]
+    assert (totals["calls"], totals["kb_answered"]) == (5, 1)
+
+
+def test_add_never_writes_on_the_callers_thread():
+    """Counting an outcome only touches memory; the stats-flush thread does the upsert."""
+    import threading
+    import time
+
+    writers = []
+
+    def session_factory():
+        writers.append(threading.current_thread().name)
+        return SessionLocal()
+
+    recorder = StatsRecorder(session_factory, flush_interval=0)
+    recorder.add("stats-background", calls=1)
+    assert writers == []
+    for _ in range(100):
+        if StatsService().rollups("day", tenant_id="stats-background")["totals"]["calls"] == 1:
+            break
+        time.sleep(0.01)
+    assert StatsService().rollups("day", tenant_id="stats-background")["totals"]["calls"] == 1
+    assert set(writers) == {"stats-flush"}
@@ -0,0 +1,294 @@
+import asyncio
+import os
+import sys
+import time
+
+# Add project root to path
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from backend.db import engine, SessionLocal
+from backend.models import Base, KnowledgeBaseEntry
+from backend.ai_agent import AIAgent, AsyncAIAgent
+from backend.voice_ai_agent import KBVoiceTools
+
+
+class StubLLM:
+    """Records the questions it was asked instead of calling a model."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def reply(self, question):
+        self.calls.append(question)
+        return "stub llm reply"
+
+
+def test_voice_turn_answers_from_kb_without_llm():
+    Base.metadata.create_all(bind=engine)
+    agent = AIAgent()
+    agent.kb.create_entry("Do you have parking for voice test?", "Free parking out back (test answer)", created_by="test")
+    tools = KBVoiceTools(AsyncAIAgent(agent), {"name": "Voice Caller", "phone": "+1000201"})
+    stub = StubLLM()
+
+    known = asyncio.run(tools.respond("do you have parking for voice test", stub.reply))
+    assert known == {"source": "kb", "text": "Free parking out back (test answer)"}
+    assert stub.calls == []
+
+    unknown = asyncio.run(tools.respond("Can I pay in bitcoin voice test?", stub.reply))
+    assert unknown["source"] == "llm"
+    assert stub.calls == ["Can I pay in bitcoin voice test?"]
+
+    # The LLM's escalate tool creates a pending help request
+    assert "supervisor" in asyncio.run(tools.escalate("Can I pay in bitcoin voice test?"))
+    assert agent.help_svc.find_pending_match("Can I pay in bitcoin voice test?") is not None
+
+
+def test_voice_model_pool_loads_once_and_records_setup():
+    from concurrent.futures import ThreadPoolExecutor
+    from backend.voice_pool import VoiceModelPool
+
+    loads = {"vad": 0, "agent": 0}
+
+    def load_vad():
+        loads["vad"] += 1
+        return object()
+
+    def make_agent():
+        loads["agent"] += 1
+        return object()
+
+    pool = VoiceModelPool(
+        vad_loader=load_vad,
+        stt_factory=object,
+        llm_factory=object,
+        tts_factory=object,
+        agent_factory=make_agent,
+    )
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        sessions = list(ex.map(lambda _: pool.components(), range(32)))
+
+    assert loads == {"vad": 1, "agent": 1}
+    assert all(s["vad"] is sessions[0]["vad"] and s["tts"] is sessions[0]["tts"] for s in sessions)
+
+    pool.metrics.record(12.0)
+    pool.metrics.record(8.0)
+    stats = pool.stats()
+    assert stats["prewarmed"] and stats["session_setup"]["count"] == 2
+    assert stats["session_setup"]["max_ms"] == 12.0
+
+
+def test_tts_phrase_cache_serves_repeats_and_evicts_lru(tmp_path):
+    from backend.tts_cache import LocalWaveTTS, TTSPhraseCache
+    from backend.voice_ai_agent import VoiceCallHandler
+
+    engine_ = LocalWaveTTS()
+    cache = TTSPhraseCache(engine=engine_, cache_dir=str(tmp_path), max_bytes=10 * 1024 * 1024)
+    handler = VoiceCallHandler(ai_agent=AIAgent(), tts_cache=cache)
+
+    first = handler.generate_voice_response("We are open Mon-Sat 9am-7pm")
+    second = handler.generate_voice_response("We are open Mon-Sat 9am-7pm")
+    assert not first["cache_hit"] and second["cache_hit"]
+    assert engine_.calls == 1
+    assert first["duration_ms"] == second["duration_ms"] > 0
+
+    # A fresh process adopts files already on disk
+    reopened = TTSPhraseCache(engine=engine_, cache_dir=str(tmp_path))
+    assert reopened.get("We are open Mon-Sat 9am-7pm", handler.voice, handler.format) is not None
+
+    # Size cap evicts the least recently used phrase
+    one = len(engine_.synthesize("x" * 20, "nova", "wav"))
+    small = TTSPhraseCache(engine=engine_, cache_dir=str(tmp_path / "small"), max_bytes=one * 2)
+    small.prewarm(["a" * 20, "b" * 20], "nova", "wav")
+    small.get("a" * 20, "nova", "wav")
+    small.prewarm(["c" * 20], "nova", "wav")
+    assert small.get("b" * 20, "nova", "wav") is None
+    assert small.get("a" * 20, "nova", "wav") is not None
+    assert small.stats()["bytes"] <= one * 2
+
+    # An evicted phrase's mapping is closed once its last reader lets go
+    held = small.get("a" * 20, "nova", "wav")
+    small.prewarm(["d" * 20, "e" * 20], "nova", "wav")
+    assert small.get("a" * 20, "nova", "wav") is None
+    assert small.stats()["retired_maps"] == 1
+    held.release()
+    small.prewarm(["f" * 20], "nova", "wav")
+    assert small.stats()["retired_maps"] == 0
+    assert small.stats()["mapped"] <= small.stats()["entries"]
+
+
+def test_concurrent_voice_transcripts_do_not_stall_event_loop(tmp_path):
+    """Many simultaneous transcripts with slow lookups keep the loop responsive."""
+    import time
+    from backend.tts_cache import LocalWaveTTS, TTSPhraseCache
+    from backend.voice_ai_agent import VoiceCallHandler
+
+    agent = AIAgent()
+    agent.kb.create_entry("What is the wifi password loop test?", "salon-guest (test answer)", created_by="test")
+    real_find = agent.find_answer
+
+    def slow_find(question, *args):
+        time.sleep(0.05)  # blocking DB / CPU-bound scoring
+        return real_find(question, *args)
+
+    agent.find_answer = slow_find
+    handler = VoiceCallHandler(async_agent=AsyncAIAgent(agent), tts_cache=TTSPhraseCache(engine=LocalWaveTTS(), cache_dir=str(tmp_path)))
+
+    async def scenario():
+        lags = []
+        stop = asyncio.Event()
+
+        async def heartbeat():
+            while not stop.is_set():
+                before = time.perf_counter()
+                await asyncio.sleep(0.005)
+                lags.append(time.perf_counter() - before - 0.005)
+
+        beat = asyncio.create_task(heartbeat())
+        results = await asyncio.gather(*[
+            handler.process_voice_input({"name": f"Caller {i}", "phone": f"+1000300{i}"}, "what is the wifi password loop test")
+            for i in range(40)
+        ])
+        stop.set()
+        await beat
+        return results, lags
+
+    started = time.perf_counter()
+    results, lags = asyncio.run(scenario())
+    elapsed = time.perf_counter() - started
+
+    assert all(r["action"] == "responded" for r in results)
+    # 40 sequential 50ms lookups would take 2s and block the loop for all of it
+    assert elapsed < 1.5
+    assert max(lags) < 0.1
+
+
+def test_interim_transcripts_prefetch_kb_answer(tmp_path):
+    from backend.tts_cache import LocalWaveTTS, TTSPhraseCache
+    from backend.voice_ai_agent import VoiceCallHandler
+
+    agent = AIAgent()
+    entry = agent.kb.create_entry("Do you take walk ins on weekends prefetch test?", "Yes until 5pm (test answer)", created_by="test")
+    lookups = []
+    real_find = agent.find_answer
+
+    def counting_find(question, *args):
+        lookups.append(question)
+        return real_find(question, *args)
+
+    agent.find_answer = counting_find
+    cache = TTSPhraseCache(engine=LocalWaveTTS(), cache_dir=str(tmp_path))
+    handler = VoiceCallHandler(async_agent=AsyncAIAgent(agent), tts_cache=cache)
+    caller = {"name": "Prefetch Caller", "phone": "+1000401"}
+
+    async def call():
+        for partial in ["do you", "do you take walk ins", "do you take walk ins on weekends prefetch test"]:
+            await handler.process_interim_transcript(caller, partial)
+        await asyncio.sleep(0.2)
+        looked_up = len(lookups)
+        result = await handler.process_voice_input(caller, "Do you take walk-ins on weekends, prefetch test?")
+        return looked_up, result
+
+    looked_up, result = asyncio.run(call())
+    assert result["action"] == "responded" and result["prefetched"]
+    assert result["answer"] == "Yes until 5pm (test answer)"
+    assert len(lookups) == looked_up == 2  # "do you" is below the minimum length; no lookup on final
+    assert cache.get("Yes until 5pm (test answer)", handler.voice, handler.format) is not None
+    # Only the answer actually used counts as a KB hit, not each speculative lookup
+    agent.kb.hits.flush()
+    db = SessionLocal()
+    try:
+        assert db.get(KnowledgeBaseEntry, entry.id).hit_count == 1
+    finally:
+        db.close()
+
+
+def test_ended_call_without_final_turn_releases_speculations(tmp_path):
+    from backend.tts_cache import LocalWaveTTS, TTSPhraseCache
+    from backend.voice_ai_agent import VoiceCallHandler
+
+    agent = AIAgent()
+    lookups = []
+    real_find = agent.find_answer
+
+    def slow_find(question, *args):
+        lookups.append(question)
+        time.sleep(0.2)
+        return real_find(question, *args)
+
+    agent.find_answer = slow_find
+    handler = VoiceCallHandler(async_agent=AsyncAIAgent(agent), tts_cache=TTSPhraseCache(engine=LocalWaveTTS(), cache_dir=str(tmp_path)))
+    prefetcher = handler.prefetcher
+    first = {"name": "Hang Up Caller", "phone": "+1000403"}
+    second = {"name": "Barge In Caller", "phone": "+1000404"}
+
+    async def call():
+        await handler.process_interim_transcript(first, "do you sell gift cards hangup test")
+        # The same words from another caller share the in-flight lookup
+        await handler.process_interim_transcript(second, "Do you sell gift cards, hangup test?")
+        await handler.process_interim_transcript(first, "do you sell gift cards online hangup test")
+        tasks = [t for _, h in prefetcher._pending.values() for t in h.values()]
+        handler.end_call(first)
+        handler.end_call(second)
+        await asyncio.sleep(0)
+        return tasks
+
+    tasks = asyncio.run(call())
+    assert len(tasks) == 3 and tasks[0] is tasks[1]
+    assert prefetcher._pending == {} and prefetcher._inflight == {} and prefetcher._refs == {}
+    assert all(t.cancelled() for t in tasks)
+    assert len(lookups) <= 2
+
+
+def test_prewarm_tts_uses_the_tenants_kb(tmp_path):
+    from backend.tts_cache import LocalWaveTTS, TTSPhraseCache
+    from backend.voice_ai_agent import VoiceCallHandler
+
+    agent = AIAgent()
+    agent.kb_for("voice-prewarm").create_entry("Do you do kids cuts prewarm test?", "Yes, under 12s are $20 (prewarm)")
+    cache = TTSPhraseCache(engine=LocalWaveTTS(), cache_dir=str(tmp_path))
+    handler = VoiceCallHandler(async_agent=AsyncAIAgent(agent), tts_cache=cache)
+
+    assert handler.prewarm_tts(tenant_id="voice-prewarm") == 1
+    assert cache.get("Yes, under 12s are $20 (prewarm)", handler.voice, handler.format) is not None
+
+
+def test_idle_callers_expire_from_prefetcher():
+    from backend.voice_ai_agent import TranscriptPrefetcher
+
+    agent = AIAgent()
+    prefetcher = TranscriptPrefetcher(AsyncAIAgent(agent), max_callers=2, ttl_seconds=60)
+
+    async def interims():
+        for phone in ["+1000405", "+1000406", "+1000407"]:
+            prefetcher.on_interim(("default", phone), "what time do you open expiry test")
+        kept = list(prefetcher._pending)
+        prefetcher.ttl_seconds = 0
+        prefetcher.on_interim(("default", "+1000408"), "what time do you close expiry test")
+        return kept
+
+    kept = asyncio.run(interims())
+    assert kept == [("default", "+1000406"), ("default", "+1000407")]
+    assert list(prefetcher._pending) == [("default", "+1000408")]
+
+
+def test_voice_calls_use_the_callers_tenant(tmp_path):
+    from backend.tts_cache import LocalWaveTTS, TTSPhraseCache
+    from backend.voice_ai_agent import VoiceCallHandler
+
+    agent = AIAgent()
+    agent.kb_for("voice-north").create_entry("Is the north salon step free voice test?", "Yes, ramp at the side door (north)")
+    handler = VoiceCallHandler(async_agent=AsyncAIAgent(agent), tts_cache=TTSPhraseCache(engine=LocalWaveTTS(), cache_dir=str(tmp_path)))
+    caller = {"name": "Tenant Voice Caller", "phone": "+1000402"}
+
+    async def call(tenant_id):
+        await handler.process_interim_transcript(caller, "is the north salon step free voice test", tenant_id)
+        await asyncio.sleep(0.1)
+        return await handler.process_voice_input(caller, "Is the north salon step free, voice test?", tenant_id=tenant_id)
+
+    north = asyncio.run(call("voice-north"))
+    assert north["prefetched"] and north["answer"] == "Yes, ramp at the side door (north)"
+    # The same question for another location doesn't get the north salon's answer
+    other = asyncio.run(call("voice-south"))
+    assert other["action"] == "escalated"
@@ -0,0 +1,288 @@
+"""
+Content-addressed cache of synthesized speech for frequently spoken answers.
+
+Audio is keyed by sha256(voice, format, text) and stored as one file per
+phrase on local disk. Reads are memory-mapped, and total size is capped with
+least-recently-used eviction. The TTS engine is pluggable: `OpenAITTS`
+(the default, TTS_ENGINE=openai) calls OpenAI's speech endpoint with the same
+voices the LiveKit agent speaks with; `LocalWaveTTS` (TTS_ENGINE=local) is an
+offline tone generator for tests and demos without API keys.
+"""
+
+import hashlib
+import io
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import wave
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Protocol, Tuple
+
+import requests
+
+from .config import Config
+
+logger = logging.getLogger("tts_cache")
+
+
+class TTSEngine(Protocol):
+    def synthesize(self, text: str, voice: str, fmt: str) -> bytes:
+        ...
+
+
+class LocalWaveTTS:
+    """
+    Offline TTS stand-in: a deterministic tone whose length tracks the text
+    (~50ms per character, matching the old duration estimate).
+    """
+
+    sample_rate = 16000
+
+    def __init__(self):
+        self.calls = 0
+
+    def synthesize(self, text: str, voice: str, fmt: str) -> bytes:
+        if fmt != "wav":
+            raise ValueError(f"LocalWaveTTS only produces wav, not {fmt}")
+        self.calls += 1
+        n_frames = int(self.sample_rate * len(text) * 0.05)
+        pitch = 180 + (int(hashlib.md5(voice.encode()).hexdigest(), 16) % 120)
+        frames = b"".join(
+            struct.pack("<h", int(3000 * math.sin(2 * math.pi * pitch * i / self.sample_rate)))
+            for i in range(n_frames)
+        )
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(self.sample_rate)
+            w.writeframes(frames)
+        return buf.getvalue()
+
+
+class OpenAITTS:
+    """Speech synthesized by OpenAI's /v1/audio/speech endpoint."""
+
+    url = "https://api.openai.com/v1/audio/speech"
+
+    def __init__(
+        self,
+        api_key: str = Config.OPENAI_API_KEY,
+        model: str = Config.TTS_MODEL,
+        timeout: float = Config.TTS_TIMEOUT_SECONDS,
+    ):
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+        self.calls = 0
+        self._http = requests.Session()
+        if not api_key:
+            logger.warning("OPENAI_API_KEY not set; speech synthesis will fail (set TTS_ENGINE=local for the offline stand-in)")
+
+    def synthesize(self, text: str, voice: str, fmt: str) -> bytes:
+        if not self.api_key:
+            raise RuntimeError("OPENAI_API_KEY is not set")
+        self.calls += 1
+        r = self._http.post(
+            self.url,
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            json={"model": self.model, "input": text, "voice": voice, "response_format": fmt},
+            timeout=self.timeout,
+        )
+        r.raise_for_status()
+        return r.content
+
+
+def default_engine() -> TTSEngine:
+    """The engine named by TTS_ENGINE."""
+    if Config.TTS_ENGINE == "local":
+        return LocalWaveTTS()
+    if Config.TTS_ENGINE != "openai":
+        raise ValueError(f"unknown TTS_ENGINE {Config.TTS_ENGINE!r} (expected 'openai' or 'local')")
+    return OpenAITTS()
+
+
+def phrase_key(text: str, voice: str, fmt: str) -> str:
+    return hashlib.sha256(f"{voice}\0{fmt}\0{text}".encode("utf-8")).hexdigest()
+
+
+def audio_duration_ms(audio: Any, fmt: str, text: str) -> int:
+    """Exact duration for wav audio; otherwise the rough per-character estimate."""
+    if fmt == "wav":
+        try:
+            with wave.open(io.BytesIO(bytes(audio)), "rb") as w:
+                return int(w.getnframes() * 1000 / w.getframerate())
+        except (wave.Error, EOFError):
+            pass
+    return len(text) * 50
+
+
+class TTSPhraseCache:
+    """Disk-backed LRU of synthesized phrases with memory-mapped reads."""
+
+    def __init__(
+        self,
+        engine: Optional[TTSEngine] = None,
+        cache_dir: str = Config.TTS_CACHE_DIR,
+        max_bytes: int = Config.TTS_CACHE_MAX_BYTES,
+    ):
+        self.engine = engine or default_engine()
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> (path, size), least recently used first
+        self._entries: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._maps: Dict[str, mmap.mmap] = {}
+        # Mappings of evicted or replaced files that a reader still had a view of
+        self._retired: List[mmap.mmap] = []
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_existing()
+
+    def _load_existing(self):
+        """Adopt files left by a previous process, oldest access first."""
+        found = []
+        for name in os.listdir(self.cache_dir):
+            key, _, ext = name.partition(".")
+            if len(key) != 64 or not ext:
+                continue
+            path = os.path.join(self.cache_dir, name)
+            st = os.stat(path)
+            found.append((st.st_atime, key, path, st.st_size))
+        for _, key, path, size in sorted(found):
+            self._entries[key] = (path, size)
+            self.total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        self._close_retired()
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, (path, size) = self._entries.popitem(last=False)
+            self._unmap(key)
+            self.total_bytes -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _unmap(self, key: str):
+        """Close the mapping for `key`, or retire it while a reader still holds a view of it."""
+        mapped = self._maps.pop(key, None)
+        if mapped is None:
+            return
+        try:
+            mapped.close()
+        except BufferError:
+            self._retired.append(mapped)
+
+    def _close_retired(self):
+        still_read = []
+        for mapped in self._retired:
+            try:
+                mapped.close()
+            except BufferError:
+                still_read.append(mapped)
+        self._retired = still_read
+
+    def _read(self, key: str, path: str):
+        mapped = self._maps.get(key)
+        if mapped is None:
+            with open(path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[key] = mapped
+        return mapped
+
+    def get(self, text: str, voice: str, fmt: str):
+        """
+        Cached audio (a read-only memoryview over the mmap) or None.
+        The mapping is closed once the phrase is evicted and the view released.
+        """
+        key = phrase_key(text, voice, fmt)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            try:
+                return memoryview(self._read(key, entry[0]))
+            except (OSError, ValueError):
+                # File vanished or is empty; forget it
+                self._entries.pop(key, None)
+                self._unmap(key)
+                self.total_bytes -= entry[1]
+                return None
+
+    def put(self, text: str, voice: str, fmt: str, audio: bytes):
+        key = phrase_key(text, voice, fmt)
+        path = os.path.join(self.cache_dir, f"{key}.{fmt}")
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(audio)
+        os.replace(tmp, path)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old:
+                self.total_bytes -= old[1]
+                self._unmap(key)
+            self._entries[key] = (path, len(audio))
+            self.total_bytes += len(audio)
+            self._evict()
+
+    def get_or_synthesize(self, text: str, voice: str, fmt: str) -> Tuple[Any, bool, str]:
+        """Return (audio, cache_hit, path), synthesizing and storing on a miss."""
+        audio = self.get(text, voice, fmt)
+        if audio is not None:
+            self.hits += 1
+            return audio, True, self.path_for(text, voice, fmt)
+        self.misses += 1
+        audio = self.engine.synthesize(text, voice, fmt)
+        self.put(text, voice, fmt, audio)
+        return audio, False, self.path_for(text, voice, fmt)
+
+    def path_for(self, text: str, voice: str, fmt: str) -> str:
+        return os.path.join(self.cache_dir, f"{phrase_key(text, voice, fmt)}.{fmt}")
+
+    def prewarm(self, texts: Iterable[str], voice: str, fmt: str) -> int:
+        """Synthesize any of `texts` not already cached. Returns how many were synthesized."""
+        synthesized = 0
+        for text in texts:
+            if text and self.get(text, voice, fmt) is None:
+                self.put(text, voice, fmt, self.engine.synthesize(text, voice, fmt))
+                synthesized += 1
+        return synthesized
+
+    def prewarm_from_kb(self, kb_service, voice: str, fmt: str, limit: int = 50) -> int:
+        """Pre-synthesize answers of the KB's most used entries."""
+        return self.prewarm((e["answer_text"] for e in kb_service.popular_entries(limit)), voice, fmt)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "mapped": len(self._maps),
+                "retired_maps": len(self._retired),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_default_cache: Optional[TTSPhraseCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_tts_cache() -> TTSPhraseCache:
+    """Process-wide phrase cache."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = TTSPhraseCache()
+        return _default_cache
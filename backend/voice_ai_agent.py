@@ -3,28 +3,105 @@ Voice AI Agent with LiveKit integration for real-time voice conversations.
 Handles speech-to-text, AI processing, and text-to-speech.
 """
 
+from __future__ import annotations
+
 import asyncio
+import json
 import logging
-from typing import Dict, Any, Optional
-from livekit import agents, rtc
-from livekit.agents import AutoSubscribe, JobContext, WorkerOptions, cli, llm
-from livekit.agents.voice_assistant import VoiceAssistant
-from livekit.plugins import deepgram, openai, silero
-
-from .ai_agent import AIAgent
+import os
+import time
+from collections import OrderedDict
+from typing import Annotated, Any, Awaitable, Callable, Dict, Optional, Tuple
+
+try:
+    from livekit import agents, rtc
+    from livekit.agents import AutoSubscribe, JobContext, WorkerOptions, cli, llm
+    from livekit.agents.voice_assistant import VoiceAssistant
+    from livekit.plugins import deepgram, openai, silero
+    LIVEKIT_AGENTS_AVAILABLE = True
+except ImportError:
+    LIVEKIT_AGENTS_AVAILABLE = False
+    logging.warning("LiveKit agents SDK not installed. Voice worker cannot run; KB voice tools still work.")
+
+from .ai_agent import AIAgent, AsyncAIAgent
+from .business_info import valid_tenant_id
 from .config import Config
+from .models import DEFAULT_TENANT
+from .voice_pool import VoiceModelPool, get_voice_pool
+from .tts_cache import TTSPhraseCache, audio_duration_ms, get_tts_cache
+from .services.kb_search import normalize_question
 
 logger = logging.getLogger("voice_ai_agent")
 
 
+class KBVoiceTools:
+    """
+    KB lookup and escalation for a single voice caller.
+    Independent of LiveKit so the turn logic can be driven by a stub LLM.
+    """
+
+    NO_ANSWER = "NO_KB_ANSWER"
+
+    def __init__(self, agent: AsyncAIAgent, caller: Dict[str, str], tenant_id: str = DEFAULT_TENANT):
+        self.agent = agent
+        self.caller = caller
+        self.tenant_id = tenant_id
+
+    async def lookup_kb(self, question: str) -> Optional[str]:
+        """Answer from the KB fast matcher, or None."""
+        match = await self.agent.find_answer(question, self.tenant_id)
+        return match["answer_text"] if match else None
+
+    async def escalate(self, question: str) -> str:
+        """Create (or join) a help request and return what to tell the caller."""
+        result = await self.agent.escalate(self.caller, question, self.tenant_id)
+        logger.info(f"Voice escalation for {self.caller.get('phone')}: request_id={result['request_id']}")
+        return "Let me check with my supervisor and get back to you."
+
+    async def respond(self, question: str, llm_reply: Callable[[str], Awaitable[str]]) -> Dict[str, Any]:
+        """
+        Answer one user turn: a KB hit is returned directly (no LLM call);
+        otherwise the LLM produces the reply (and may call the tools itself).
+        """
+        answer = await self.lookup_kb(question)
+        if answer:
+            return {"source": "kb", "text": answer}
+        return {"source": "llm", "text": await llm_reply(question)}
+
+
+if LIVEKIT_AGENTS_AVAILABLE:
+
+    class KBFunctionContext(llm.FunctionContext):
+        """LLM-callable wrappers around KBVoiceTools."""
+
+        def __init__(self, tools: KBVoiceTools):
+            super().__init__()
+            self.tools = tools
+
+        @llm.ai_callable(description="Look up the salon knowledge base for an answer to the customer's question.")
+        async def lookup_knowledge_base(
+            self,
+            question: Annotated[str, llm.TypeInfo(description="The customer's question")],
+        ):
+            return await self.tools.lookup_kb(question) or KBVoiceTools.NO_ANSWER
+
+        @llm.ai_callable(description="Escalate a question you cannot answer to a human supervisor.")
+        async def escalate_to_supervisor(
+            self,
+            question: Annotated[str, llm.TypeInfo(description="The customer's question")],
+        ):
+            return await self.tools.escalate(question)
+
+
 class VoiceAIAgent:
     """
     LiveKit-based Voice AI Agent that handles real-time voice conversations.
     Integrates with the existing AIAgent for knowledge base lookups and escalations.
     """
 
-    def __init__(self):
-        self.ai_agent = AIAgent()
+    def __init__(self, pool: Optional[VoiceModelPool] = None):
+        self.pool = pool or get_voice_pool()
+        self.ai_agent = self.pool.ai_agent
         self.logger = logger
 
     async def entrypoint(self, ctx: JobContext):
@@ -48,20 +125,24 @@ class VoiceAIAgent:
 
     async def _start_voice_assistant(self, ctx: JobContext, participant: rtc.Participant):
         """Initialize and start the voice assistant for a participant."""
-        
-        # Configure the AI model with business context
-        initial_ctx = self._build_initial_context()
+        started = time.perf_counter()
+        models = self.pool.components()
+        caller = {"name": participant.name or participant.identity, "phone": participant.identity}
+        tenant_id = self._room_tenant(ctx)
+        tools = KBVoiceTools(self.pool.async_agent, caller, tenant_id)
+
+        # Configure the AI model with a compact prompt; facts come from the KB tools
+        initial_ctx = self._build_initial_context(tenant_id)
 
-        # Create assistant with STT, LLM, and TTS
+        # Create assistant with the worker's shared STT, LLM, TTS and VAD
         assistant = VoiceAssistant(
-            vad=silero.VAD.load(),  # Voice Activity Detection
-            stt=deepgram.STT(),      # Speech-to-Text
-            llm=openai.LLM(
-                model="gpt-4-turbo-preview",
-                temperature=0.7,
-            ),
-            tts=openai.TTS(voice="nova"),  # Text-to-Speech
+            vad=models["vad"],  # Voice Activity Detection
+            stt=models["stt"],  # Speech-to-Text
+            llm=models["llm"],
+            tts=models["tts"],  # Text-to-Speech
             chat_ctx=initial_ctx,
+            fnc_ctx=KBFunctionContext(tools),
+            before_llm_cb=lambda a, chat_ctx: self._answer_from_kb(a, chat_ctx, tools),
         )
 
         # Hook into the assistant's chat flow
@@ -70,37 +151,47 @@ class VoiceAIAgent:
         # Start the assistant
         await assistant.start(ctx.room, participant)
 
-        self.logger.info(f"Voice assistant started for {participant.identity}")
-
-    def _build_initial_context(self) -> llm.ChatContext:
-        """Build the initial chat context with business information."""
-        import json
-        
-        # Load business info
-        with open(self.ai_agent.business_info, "r") as f:
-            business_data = json.load(f)
-
-        system_prompt = f"""You are a professional AI receptionist for {business_data['name']}.
+        setup_ms = (time.perf_counter() - started) * 1000.0
+        self.pool.metrics.record(setup_ms)
+        self.logger.info(f"Voice assistant started for {participant.identity} in {setup_ms:.1f}ms")
 
-Business Information:
-- Address: {business_data['address']}
-- Phone: {business_data['phone']}
-- Hours: {business_data['hours']}
-
-Services and Pricing:
-{json.dumps(business_data['services'], indent=2)}
-
-Policies:
-{json.dumps(business_data['policies'], indent=2)}
+    async def _answer_from_kb(self, assistant: VoiceAssistant, chat_ctx: llm.ChatContext, tools: KBVoiceTools):
+        """
+        before_llm_cb: speak a known KB answer directly and skip the LLM round-trip.
+        Returning None lets the assistant fall through to the LLM (with tools).
+        """
+        user_msgs = [m for m in chat_ctx.messages if m.role == "user"]
+        if not user_msgs:
+            return None
+
+        answer = await tools.lookup_kb(user_msgs[-1].content)
+        if not answer:
+            return None
+
+        self.logger.info("Answered voice turn from KB without LLM")
+        spoken = assistant.say(answer, allow_interruptions=True)
+        if asyncio.iscoroutine(spoken):
+            asyncio.ensure_future(spoken)
+        return False
+
+    def _room_tenant(self, ctx: JobContext) -> str:
+        """Tenant of the room, from its JSON metadata ({"tenant_id": ...}); default if absent or invalid."""
+        try:
+            tenant_id = json.loads(ctx.room.metadata or "{}").get("tenant_id")
+        except (ValueError, AttributeError):
+            tenant_id = None
+        return tenant_id if tenant_id and valid_tenant_id(tenant_id) else DEFAULT_TENANT
+
+    def _build_initial_context(self, tenant_id: str = DEFAULT_TENANT) -> llm.ChatContext:
+        """Build a compact system prompt; business facts are fetched on demand via the KB tools."""
+        business_name = self.ai_agent.business_for(tenant_id).data.get("name") or self.ai_agent.business_info["name"]
+        system_prompt = f"""You are a professional AI receptionist for {business_name}.
 
 Your role:
 1. Answer customer questions politely and professionally
-2. Use the provided business information
-3. If you're unsure or the question requires human expertise, politely escalate to a supervisor
+2. Call lookup_knowledge_base for any factual question (hours, services, prices, policies)
+3. If it returns {KBVoiceTools.NO_ANSWER}, call escalate_to_supervisor and tell the customer you'll follow up
 4. Keep responses concise and natural for voice conversation
-5. Offer helpful follow-up suggestions
-
-When you need to check the knowledge base or escalate, use the available functions.
 """
 
         return llm.ChatContext(
@@ -109,10 +200,12 @@ When you need to check the knowledge base or escalate, use the available functio
             ]
         )
 
-    async def _on_function_calls_finished(self, ctx: Any):
-        """Handle custom function calls from the LLM."""
-        # This can be extended to handle custom functions like KB lookup
-        pass
+    async def _on_function_calls_finished(self, called_functions: Any):
+        """Log KB tool calls made by the LLM."""
+        for call in called_functions or []:
+            info = getattr(call, "call_info", None)
+            name = getattr(getattr(info, "function_info", None), "name", None)
+            self.logger.info(f"Voice tool call finished: {name}")
 
     def handle_voice_query(self, caller: Dict[str, str], audio_data: bytes) -> Dict[str, Any]:
         """
@@ -127,21 +220,193 @@ When you need to check the knowledge base or escalate, use the available functio
         }
 
 
+def _forget(futures: Dict[Any, asyncio.Future], key: Any, future: asyncio.Future) -> None:
+    """Done callback: drop `key` unless a newer future has taken its place."""
+    if futures.get(key) is future:
+        del futures[key]
+
+
+class TranscriptPrefetcher:
+    """
+    Speculative KB matching on interim STT hypotheses.
+    Each hypothesis (per caller, keyed by its normalized text) starts a lookup
+    in the caller's tenant,
+    and the answer's TTS audio is warmed too, so when the final transcript matches
+    a hypothesis the answer is often ready before it is asked for.
+    Speculative lookups don't count KB hits; `take`'s caller records the hit
+    only for the answer it actually uses.
+
+    Identical hypotheses in a tenant share one in-flight lookup, and one answer
+    is synthesized once however many lookups land on it. Callers are kept in
+    LRU order: idle ones expire after `ttl_seconds`, the least recent are
+    dropped beyond `max_callers`, and `end_session` drops a caller that hung up.
+    Dropped speculations no other caller shares are cancelled.
+    """
+
+    def __init__(
+        self,
+        agent: AsyncAIAgent,
+        tts_cache: Optional[TTSPhraseCache] = None,
+        voice: str = Config.TTS_VOICE,
+        fmt: str = Config.TTS_FORMAT,
+        min_chars: int = Config.VOICE_PREFETCH_MIN_CHARS,
+        max_hypotheses: int = Config.VOICE_PREFETCH_MAX_HYPOTHESES,
+        max_callers: int = Config.VOICE_PREFETCH_MAX_CALLERS,
+        ttl_seconds: float = Config.VOICE_PREFETCH_TTL_SECONDS,
+    ):
+        self.agent = agent
+        self.tts_cache = tts_cache
+        self.voice = voice
+        self.format = fmt
+        self.min_chars = min_chars
+        self.max_hypotheses = max_hypotheses
+        self.max_callers = max_callers
+        self.ttl_seconds = ttl_seconds
+        # caller_key -> (last interim time, hypotheses), least recently active first
+        self._pending: "OrderedDict[Any, Tuple[float, OrderedDict[str, asyncio.Future]]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._refs: Dict[asyncio.Future, int] = {}
+        self._warming: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def on_interim(
+        self, caller_key: Any, hypothesis: str, tenant_id: str = DEFAULT_TENANT
+    ) -> Optional[asyncio.Future]:
+        """Start (or reuse) a speculative lookup for an interim hypothesis."""
+        key = normalize_question(hypothesis)
+        if len(key) < self.min_chars:
+            return None
+        now = time.monotonic()
+        self._expire(now)
+        entry = self._pending.pop(caller_key, None)
+        hypotheses = entry[1] if entry else OrderedDict()
+        self._pending[caller_key] = (now, hypotheses)
+        if key in hypotheses:
+            hypotheses.move_to_end(key)
+            return hypotheses[key]
+
+        task = self._inflight.get((tenant_id, key))
+        if task is None:
+            task = asyncio.ensure_future(self._speculate(hypothesis, tenant_id))
+            self._inflight[(tenant_id, key)] = task
+            task.add_done_callback(lambda t, k=(tenant_id, key): _forget(self._inflight, k, t))
+        self._refs[task] = self._refs.get(task, 0) + 1
+        hypotheses[key] = task
+        while len(hypotheses) > self.max_hypotheses:
+            # Oldest hypotheses are unlikely to be final
+            self._release(hypotheses.popitem(last=False)[1])
+        while len(self._pending) > self.max_callers:
+            self._drop(self._pending.popitem(last=False)[1][1])
+        return task
+
+    def end_session(self, caller_key: Any) -> None:
+        """Forget a caller whose call ended, cancelling speculations nobody else awaits."""
+        entry = self._pending.pop(caller_key, None)
+        if entry:
+            self._drop(entry[1])
+
+    def _expire(self, now: float) -> None:
+        while self._pending:
+            caller_key, (seen, hypotheses) = next(iter(self._pending.items()))
+            if now - seen < self.ttl_seconds:
+                break
+            del self._pending[caller_key]
+            self._drop(hypotheses)
+
+    def _drop(self, hypotheses: Dict[str, asyncio.Future]) -> None:
+        for task in hypotheses.values():
+            self._release(task)
+
+    def _release(self, task: asyncio.Future) -> None:
+        refs = self._refs.get(task, 0) - 1
+        if refs > 0:
+            self._refs[task] = refs
+            return
+        self._refs.pop(task, None)
+        if not task.done():
+            task.cancel()
+
+    async def _speculate(self, hypothesis: str, tenant_id: str) -> Optional[Dict[str, Any]]:
+        match = await self.agent.find_answer(hypothesis, tenant_id, False)
+        if match and self.tts_cache:
+            text = match["answer_text"]
+            warming = self._warming.get(text)
+            if warming is None:
+                loop = asyncio.get_running_loop()
+                warming = loop.run_in_executor(
+                    None, self.tts_cache.get_or_synthesize, text, self.voice, self.format
+                )
+                self._warming[text] = warming
+                warming.add_done_callback(lambda f, t=text: _forget(self._warming, t, f))
+            # Shielded: cancelling one speculation must not cancel audio others await
+            await asyncio.shield(warming)
+        return match
+
+    async def take(self, caller_key: Any, transcript: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Consume the speculation for a final transcript.
+        Returns (found, match); found is False when no hypothesis matched the
+        final text and the caller must do a normal lookup.
+        """
+        entry = self._pending.pop(caller_key, None)
+        hypotheses = entry[1] if entry else OrderedDict()
+        task = hypotheses.pop(normalize_question(transcript), None)
+        # The turn is final; the other hypotheses will never be used
+        self._drop(hypotheses)
+        if task is None:
+            self.misses += 1
+            return False, None
+        try:
+            match = await asyncio.shield(task)
+        except Exception:
+            logger.exception("Speculative KB lookup failed")
+            self.misses += 1
+            return False, None
+        finally:
+            self._release(task)
+        self.hits += 1
+        return True, match
+
+
 class VoiceCallHandler:
     """
     Handler for incoming voice calls that integrates with the main AI agent.
     Bridges voice input/output with the existing help request system.
     """
 
-    def __init__(self):
-        self.ai_agent = AIAgent()
+    def __init__(
+        self,
+        ai_agent: Optional[AIAgent] = None,
+        tts_cache: Optional[TTSPhraseCache] = None,
+        async_agent: Optional[AsyncAIAgent] = None,
+    ):
+        if async_agent is None:
+            async_agent = AsyncAIAgent(ai_agent) if ai_agent else get_voice_pool().async_agent
+        self.async_agent = async_agent
+        self.ai_agent = async_agent.agent
+        self.tts_cache = tts_cache or get_tts_cache()
+        self.voice = Config.TTS_VOICE
+        self.format = Config.TTS_FORMAT
+        self.prefetcher = TranscriptPrefetcher(self.async_agent, self.tts_cache, self.voice, self.format)
         self.logger = logger
 
+    async def process_interim_transcript(
+        self, caller: Dict[str, str], hypothesis: str, tenant_id: str = DEFAULT_TENANT
+    ):
+        """Accept an interim STT hypothesis and start matching it speculatively."""
+        self.prefetcher.on_interim((tenant_id, caller.get("phone")), hypothesis, tenant_id)
+
+    def end_call(self, caller: Dict[str, str], tenant_id: str = DEFAULT_TENANT) -> None:
+        """Release the caller's pending speculations when the call ends, final turn or not."""
+        self.prefetcher.end_session((tenant_id, caller.get("phone")))
+
     async def process_voice_input(
         self,
         caller: Dict[str, str],
         transcript: str,
-        audio_metadata: Optional[Dict[str, Any]] = None
+        audio_metadata: Optional[Dict[str, Any]] = None,
+        tenant_id: str = DEFAULT_TENANT,
     ) -> Dict[str, Any]:
         """
         Process transcribed voice input and generate response.
@@ -150,14 +415,22 @@ class VoiceCallHandler:
             caller: Caller information (name, phone)
             transcript: Transcribed text from speech
             audio_metadata: Optional metadata about the audio
+            tenant_id: Business location the call is for (its KB, business info and help requests)
             
         Returns:
             Response with action taken and reply text/audio
         """
-        self.logger.info(f"Processing voice input from {caller.get('phone')}: {transcript}")
-
-        # Use existing AI agent logic
-        result = self.ai_agent.handle_incoming(caller, transcript)
+        self.logger.info(f"Processing voice input from {caller.get('phone')} ({tenant_id}): {transcript}")
+
+        # Use a speculative lookup from the interim hypotheses when one matches
+        prefetched, match = await self.prefetcher.take((tenant_id, caller.get("phone")), transcript)
+        if prefetched:
+            self.ai_agent.record_kb_hit(match, tenant_id)
+            result = await self.async_agent.complete(caller, transcript, match, tenant_id)
+        else:
+            # Existing AI agent logic, off the event loop
+            result = await self.async_agent.handle_incoming(caller, transcript, tenant_id)
+        result["prefetched"] = prefetched
 
         # Enhance with voice-specific metadata
         result["voice_metadata"] = audio_metadata or {}
@@ -168,25 +441,47 @@ class VoiceCallHandler:
     def generate_voice_response(self, text: str) -> Dict[str, Any]:
         """
         Generate voice response from text.
-        In production, this would call TTS service.
+        Repeated answers are served from the TTS phrase cache.
         """
+        audio, cache_hit, path = self.tts_cache.get_or_synthesize(text, self.voice, self.format)
         return {
             "text": text,
-            "audio_url": None,  # Would be generated by TTS service
-            "format": "mp3",
-            "duration_ms": len(text) * 50,  # Rough estimate
+            "audio_url": f"file://{os.path.abspath(path)}",
+            "format": self.format,
+            "duration_ms": audio_duration_ms(audio, self.format, text),
+            "cache_hit": cache_hit,
         }
 
+    def prewarm_tts(self, limit: int = 50, tenant_id: str = DEFAULT_TENANT) -> int:
+        """Pre-synthesize the tenant's most used KB answers into the phrase cache."""
+        return self.tts_cache.prewarm_from_kb(self.ai_agent.kb_for(tenant_id), self.voice, self.format, limit)
+
 
 # Worker configuration for LiveKit
+def prewarm(proc: Any):
+    """Worker prewarm stage: load VAD, plugin clients and the AIAgent once per process."""
+    pool = get_voice_pool().prewarm()
+    proc.userdata["voice_pool"] = pool
+    proc.userdata["voice_agent"] = VoiceAIAgent(pool)
+
+
+async def entrypoint(ctx: JobContext):
+    """Per-job entrypoint reusing the prewarmed agent."""
+    agent = ctx.proc.userdata.get("voice_agent")
+    if agent is None:
+        agent = ctx.proc.userdata["voice_agent"] = VoiceAIAgent()
+    await agent.entrypoint(ctx)
+
+
 def create_worker_options() -> WorkerOptions:
     """Create worker options for LiveKit agent."""
     return WorkerOptions(
-        entrypoint_fnc=lambda ctx: VoiceAIAgent().entrypoint(ctx),
+        entrypoint_fnc=entrypoint,
+        prewarm_fnc=prewarm,
         request_fnc=None,  # Optional: handle custom requests
     )
 
 
 # For running as standalone LiveKit worker
-if __name__ == "__main__":
+if __name__ == "__main__" and LIVEKIT_AGENTS_AVAILABLE:
     cli.run_app(create_worker_options())
@@ -0,0 +1,157 @@
+"""
+Worker-level pool of voice models and clients shared across LiveKit sessions.
+
+Loading the Silero VAD model and constructing STT/LLM/TTS clients and the
+AIAgent (which re-reads the prompt files) on every call adds directly to
+time-to-first-word. The pool builds them once per worker process, in the
+LiveKit prewarm stage, and every session reuses them.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+from .ai_agent import AIAgent, AsyncAIAgent
+
+logger = logging.getLogger("voice_pool")
+
+
+def _load_vad():
+    from livekit.plugins import silero
+    return silero.VAD.load()
+
+
+def _make_stt():
+    from livekit.plugins import deepgram
+    return deepgram.STT()
+
+
+def _make_llm():
+    from livekit.plugins import openai
+    return openai.LLM(model="gpt-4-turbo-preview", temperature=0.7)
+
+
+def _make_tts():
+    from livekit.plugins import openai
+    return openai.TTS(voice="nova")
+
+
+class SetupMetrics:
+    """Rolling window of voice session setup times (milliseconds)."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def record(self, elapsed_ms: float):
+        with self._lock:
+            self._samples.append(elapsed_ms)
+            self.count += 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            last = self._samples[-1] if self._samples else None
+            samples = sorted(self._samples)
+            count = self.count
+        if not samples:
+            return {"count": count}
+        return {
+            "count": count,
+            "last_ms": round(last, 2),
+            "avg_ms": round(sum(samples) / len(samples), 2),
+            "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+            "max_ms": round(samples[-1], 2),
+        }
+
+
+class VoiceModelPool:
+    """
+    Loads VAD/STT/LLM/TTS and the AIAgent once and hands the same instances
+    to every session. Factories are injectable for local testing.
+    """
+
+    def __init__(
+        self,
+        vad_loader: Callable[[], Any] = _load_vad,
+        stt_factory: Callable[[], Any] = _make_stt,
+        llm_factory: Callable[[], Any] = _make_llm,
+        tts_factory: Callable[[], Any] = _make_tts,
+        agent_factory: Callable[[], AIAgent] = AIAgent,
+    ):
+        self._vad_loader = vad_loader
+        self._stt_factory = stt_factory
+        self._llm_factory = llm_factory
+        self._tts_factory = tts_factory
+        self._agent_factory = agent_factory
+
+        self._lock = threading.Lock()
+        self._ai_agent: Optional[AIAgent] = None
+        self._async_agent: Optional[AsyncAIAgent] = None
+        self._models: Optional[Dict[str, Any]] = None
+        self.prewarm_ms: Optional[float] = None
+        self.metrics = SetupMetrics()
+
+    @property
+    def ai_agent(self) -> AIAgent:
+        """Shared AIAgent (built on first use; does not require the voice models)."""
+        if self._ai_agent is None:
+            with self._lock:
+                if self._ai_agent is None:
+                    self._ai_agent = self._agent_factory()
+        return self._ai_agent
+
+    @property
+    def async_agent(self) -> AsyncAIAgent:
+        """Shared async facade (bounded executors) over the pooled AIAgent."""
+        if self._async_agent is None:
+            agent = self.ai_agent
+            with self._lock:
+                if self._async_agent is None:
+                    self._async_agent = AsyncAIAgent(agent)
+        return self._async_agent
+
+    def prewarm(self) -> "VoiceModelPool":
+        """Load every model/client once; later calls are no-ops."""
+        if self._models is not None:
+            return self
+        agent = self.ai_agent
+        with self._lock:
+            if self._models is None:
+                started = time.perf_counter()
+                self._models = {
+                    "vad": self._vad_loader(),
+                    "stt": self._stt_factory(),
+                    "llm": self._llm_factory(),
+                    "tts": self._tts_factory(),
+                    "ai_agent": agent,
+                }
+                self.prewarm_ms = (time.perf_counter() - started) * 1000.0
+                logger.info(f"Voice models prewarmed in {self.prewarm_ms:.1f}ms")
+        return self
+
+    def components(self) -> Dict[str, Any]:
+        """Shared components for a new session (prewarms lazily if the worker skipped it)."""
+        return self.prewarm()._models
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "prewarmed": self._models is not None,
+            "prewarm_ms": round(self.prewarm_ms, 2) if self.prewarm_ms is not None else None,
+            "session_setup": self.metrics.summary(),
+        }
+
+
+_default_pool: Optional[VoiceModelPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_voice_pool() -> VoiceModelPool:
+    """Process-wide pool used by the LiveKit worker and VoiceCallHandler."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = VoiceModelPool()
+        return _default_pool
@@ -15,10 +15,10 @@ print("Initializing backend database and models...")
 
 try:
     from backend.db import engine
-    from backend.models import Base
+    from backend.migrations import upgrade_database
 
-    # Create all tables if they don't exist
-    Base.metadata.create_all(bind=engine)
+    # Create all tables if they don't exist and apply schema migrations (Alembic chain)
+    upgrade_database(engine)
     print("Database tables created successfully.")
 except Exception as e:
     print("Error initializing backend:", e)
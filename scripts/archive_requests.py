@@ -0,0 +1,44 @@
+"""
+Move closed help requests older than the retention window to the archive.
+
+Usage: python scripts/archive_requests.py [--days 30] [--batch-size 500] [--pause 0.2] [--sink table|ndjson]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+# Add project root to path so `python scripts/<name>.py` finds the backend package
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from backend.config import Config
+from backend.db import engine
+from backend.migrations import check_schema
+from backend.services.retention_service import SINKS, RetentionService
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=None, help="archive requests created more than this many days ago")
+    parser.add_argument("--batch-size", type=int, default=None, help="rows moved per transaction")
+    parser.add_argument("--pause", type=float, default=None, help="seconds to sleep between batches")
+    parser.add_argument("--max-batches", type=int, default=None, help="stop after this many batches")
+    parser.add_argument("--sink", choices=SINKS, default=Config.RETENTION_SINK)
+    parser.add_argument("--archive-dir", default=Config.RETENTION_ARCHIVE_DIR, help="directory for NDJSON files")
+    args = parser.parse_args()
+
+    check_schema(engine)
+    report = RetentionService(sink=args.sink, archive_dir=args.archive_dir).archive_closed(
+        older_than_days=args.days,
+        batch_size=args.batch_size,
+        pause_seconds=args.pause,
+        max_batches=args.max_batches,
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Micro-benchmark for help-request listing serialization.
+
+Compares the old path (full ORM objects, dict built by hand, stdlib json)
+against column-projected rows through the shared `RowSerializer`, each
+encoded with the stdlib encoder and with orjson. Runs against a throwaway
+in-memory SQLite database.
+
+Usage: python scripts/bench_serialization.py [--rows 5000] [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add project root to path so `python scripts/<name>.py` finds the backend package
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from backend.models import Base, HelpRequest
+from backend.serializers import HELP_REQUEST, ORJSON_AVAILABLE
+
+if ORJSON_AVAILABLE:
+    import orjson
+
+
+def seed(Session, n):
+    now = datetime.utcnow()
+    with Session() as db:
+        db.add_all(
+            HelpRequest(
+                customer_id=i, question_text=f"Do you offer service number {i} on weekends?",
+                created_at=now - timedelta(seconds=i), state="resolved", response_text="Yes, all weekend.",
+            )
+            for i in range(n)
+        )
+        db.commit()
+
+
+def by_hand(db):
+    return [{
+        "id": r.id,
+        "tenant_id": r.tenant_id,
+        "customer_id": r.customer_id,
+        "question_text": r.question_text,
+        "created_at": r.created_at.isoformat(),
+        "state": r.state,
+        "response_text": r.response_text,
+    } for r in db.query(HelpRequest).all()]
+
+
+def projected(db):
+    return HELP_REQUEST.many(db.query(*HELP_REQUEST.columns).all())
+
+
+def best_ms(Session, repeat, build, encode):
+    best = float("inf")
+    for _ in range(repeat):
+        with Session() as db:
+            started = time.perf_counter()
+            encode(build(db))
+            best = min(best, (time.perf_counter() - started) * 1000.0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    seed(Session, args.rows)
+
+    encoders = [("json", lambda obj: json.dumps(obj).encode("utf-8"))]
+    if ORJSON_AVAILABLE:
+        encoders.append(("orjson", orjson.dumps))
+    else:
+        print("orjson is not installed; measuring the stdlib encoder only.")
+
+    print(f"{args.rows} rows, best of {args.repeat}")
+    for build_name, build in (("ORM + hand-built dict", by_hand), ("projected + RowSerializer", projected)):
+        for enc_name, encode in encoders:
+            print(f"{build_name:28s} {enc_name:7s} {best_ms(Session, args.repeat, build, encode):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
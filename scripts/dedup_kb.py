@@ -0,0 +1,34 @@
+"""
+Merge near-duplicate Knowledge Base entries into canonical entries with aliases.
+
+Usage: python scripts/dedup_kb.py [--dry-run] [--threshold 0.85]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+# Add project root to path so `python scripts/<name>.py` finds the backend package
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from backend.db import engine
+from backend.migrations import check_schema
+from backend.services.kb_services import KBService
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dry-run", action="store_true", help="report clusters without merging")
+    parser.add_argument("--threshold", type=float, default=None, help="trigram Jaccard similarity to merge at")
+    args = parser.parse_args()
+
+    check_schema(engine)
+    report = KBService().deduplicate(threshold=args.threshold, dry_run=args.dry_run)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
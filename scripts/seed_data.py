@@ -2,13 +2,23 @@
 Seed sample supervisors, customers, and KB entries for local demo.
 """
 
+import os
+import sys
+
+# Add project root to path so `python scripts/<name>.py` finds the backend package
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
 from backend.db import engine, SessionLocal
-from backend.models import Base, Supervisor, Customer, KnowledgeBaseEntry
+from backend.migrations import upgrade_database
+from backend.models import Supervisor, Customer, KnowledgeBaseEntry
+from backend.services.kb_search import question_hash
 
 
 def seed():
-    """Create tables and seed initial data."""
-    Base.metadata.create_all(bind=engine)
+    """Bring the schema to the Alembic head and seed initial data."""
+    upgrade_database(engine)
     db = SessionLocal()
     try:
         # Seed Supervisor
@@ -25,6 +35,7 @@ def seed():
         if db.query(KnowledgeBaseEntry).count() == 0:
             kb = KnowledgeBaseEntry(
                 question_text="What are your hours?",
+                question_hash=question_hash("What are your hours?"),
                 answer_text="We are open Mon-Sat 9am-7pm",
                 created_by="seed"
             )
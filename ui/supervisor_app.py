@@ -1,3 +1,5 @@
+import uuid
+
 import streamlit as st
 import requests
 
@@ -29,8 +31,14 @@ with tabs[0]:
 
             if st.button("Submit Answer", key=f"submit_{r['id']}"):
                 payload = {"answer": ans, "supervisor_id": sup_id or None}
+                # Same key for every submit of this request in this session, so double-clicks are replays
+                idem_key = st.session_state.setdefault(f"idem_{r['id']}", str(uuid.uuid4()))
                 try:
-                    pr = requests.post(f"{API_BASE}/api/requests/{r['id']}/respond", json=payload)
+                    pr = requests.post(
+                        f"{API_BASE}/api/requests/{r['id']}/respond",
+                        json=payload,
+                        headers={"Idempotency-Key": idem_key},
+                    )
                     if pr.status_code == 200:
                         st.success("Submitted and customer notified.")
                     else: